@@ -0,0 +1,280 @@
+"""
+Import en masse des élèves (CSV ou Excel), en flux.
+
+Le fichier est lu ligne à ligne (csv, ou openpyxl en mode read_only) et
+traité par lots : validation du lot en mémoire, une requête pour les
+matricules déjà utilisés, puis un bulk_create dans une transaction par lot.
+Les matricules manquants sont préalloués sans requête par ligne et la limite
+Ecole.max_eleves est vérifiée avant chaque insertion. Chaque ligne reçoit un
+statut dans le rapport retourné.
+"""
+import csv
+import re
+import unicodedata
+from datetime import date, datetime
+from io import TextIOWrapper
+
+import openpyxl
+from django.db import IntegrityError, transaction
+
+from core import cache_vues
+from .models import Eleve
+
+TAILLE_LOT = 500
+
+# En-têtes normalisés (voir normaliser_entete) -> champ du modèle Eleve
+ALIAS_COLONNES = {
+    'nom_tuteur': 'tuteur',
+    'date_de_naissance': 'date_naissance',
+    'lieu_de_naissance': 'lieu_naissance',
+}
+
+CHAMPS_TEXTE = [
+    'lieu_naissance', 'telephone_eleve', 'email', 'adresse',
+    'nom_pere', 'telephone_pere', 'nom_mere', 'telephone_mere',
+    'tuteur', 'telephone_tuteur',
+]
+
+
+class LigneInvalide(ValueError):
+    """Ligne rejetée (message destiné au rapport d'import)"""
+
+
+def normaliser_entete(entete):
+    """'Prénom*' -> 'prenom', 'Date Naissance (AAAA-MM-JJ)' -> 'date_naissance'"""
+    texte = re.sub(r'\(.*?\)', '', str(entete or '')).replace('*', '')
+    texte = unicodedata.normalize('NFKD', texte).encode('ascii', 'ignore').decode('ascii')
+    texte = re.sub(r'[^a-z0-9]+', '_', texte.strip().lower()).strip('_')
+    return ALIAS_COLONNES.get(texte, texte)
+
+
+def _est_ignoree(valeurs):
+    """Ligne vide ou de commentaire (modèles d'import)"""
+    premiere = next((v for v in valeurs if v not in (None, '')), None)
+    return premiere is None or str(premiere).lstrip().startswith('#')
+
+
+def lire_lignes(fichier, colonne_requise='nom'):
+    """
+    Produit (numéro de ligne, dict) pour chaque ligne de données d'un fichier
+    CSV ou Excel, sans le charger entièrement en mémoire.
+
+    La ligne d'en-tête est la première contenant la colonne requise ; les
+    lignes vides et de commentaire (#) sont ignorées.
+    """
+    nom = fichier.name.lower()
+    if nom.endswith('.csv'):
+        brut = getattr(fichier, 'file', fichier)
+        brut.seek(0)
+        lignes = enumerate(csv.reader(TextIOWrapper(brut, encoding='utf-8-sig', newline='')), start=1)
+        classeur = None
+    elif nom.endswith('.xlsx'):
+        classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+        lignes = enumerate(classeur.active.iter_rows(values_only=True), start=1)
+    else:
+        raise LigneInvalide("Format non supporté : utilisez un fichier .csv ou .xlsx")
+
+    try:
+        entetes = None
+        for numero, valeurs in lignes:
+            if _est_ignoree(valeurs):
+                continue
+            if entetes is None:
+                normalises = [normaliser_entete(v) for v in valeurs]
+                if colonne_requise in normalises:
+                    entetes = normalises
+                continue
+            yield numero, {
+                entete: valeur for entete, valeur in zip(entetes, valeurs) if entete
+            }
+        if entetes is None:
+            raise LigneInvalide(f"En-tête introuvable (colonne '{colonne_requise}' requise)")
+    finally:
+        if classeur is not None:
+            classeur.close()
+
+
+def texte_cellule(valeur):
+    """Texte d'une cellule CSV ou Excel (12.0 -> '12', None -> '')"""
+    if valeur is None:
+        return ''
+    if isinstance(valeur, float) and valeur.is_integer():
+        valeur = int(valeur)
+    return str(valeur).strip()
+
+
+def date_cellule(valeur, libelle):
+    """Date d'une cellule (date Excel, AAAA-MM-JJ ou JJ/MM/AAAA) ; libelle nomme le champ dans les erreurs"""
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    texte = texte_cellule(valeur)
+    if not texte:
+        raise LigneInvalide(f"{libelle} manquante")
+    for format_date in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texte, format_date).date()
+        except ValueError:
+            continue
+    raise LigneInvalide(f"{libelle} invalide '{texte}' (format AAAA-MM-JJ)")
+
+
+def preparer_eleve(row):
+    """
+    Valide une ligne et retourne les champs de l'élève (sans classe ni école).
+    Le matricule vaut '' s'il doit être généré.
+    """
+    nom = texte_cellule(row.get('nom'))
+    prenom = texte_cellule(row.get('prenom'))
+    if not nom or not prenom:
+        raise LigneInvalide("nom et prénom obligatoires")
+
+    sexe = (texte_cellule(row.get('sexe')) or 'M').upper()[:1]
+    if sexe not in ('M', 'F'):
+        raise LigneInvalide(f"sexe invalide '{row.get('sexe')}' (M ou F)")
+
+    champs = {
+        'matricule': texte_cellule(row.get('matricule')),
+        'nom': nom.upper(),
+        'prenom': prenom.title(),
+        'sexe': sexe,
+        'date_naissance': date_cellule(row.get('date_naissance'), 'date de naissance'),
+    }
+    for champ in CHAMPS_TEXTE:
+        champs[champ] = texte_cellule(row.get(champ))
+    if len(champs['matricule']) > Eleve._meta.get_field('matricule').max_length:
+        raise LigneInvalide("matricule trop long")
+    return champs
+
+
+class GenerateurMatricules:
+    """
+    Matricules 'EL00042' préalloués à partir du plus grand id, sans requête par
+    élève. Les matricules 'EL…' déjà pris dans l'école sont lus une fois (au
+    premier matricule à générer) et sautés, comme ceux fournis par le fichier.
+    """
+
+    def __init__(self, ecole=None):
+        self.ecole = ecole
+        self.suivant = None
+        self.pris = set()
+
+    def reserver(self, matricules):
+        """Matricules fournis explicitement : jamais générés"""
+        self.pris.update(matricules)
+
+    def _charger(self):
+        dernier = Eleve.objects.order_by('-id').values_list('id', flat=True).first()
+        self.suivant = (dernier or 0) + 1
+        pris = Eleve.objects.filter(matricule__startswith='EL')
+        if self.ecole is not None:
+            pris = pris.filter(ecole=self.ecole)
+        self.pris.update(pris.values_list('matricule', flat=True))
+
+    def prochain(self):
+        if self.suivant is None:
+            self._charger()
+        matricule = f"EL{self.suivant:05d}"
+        while matricule in self.pris:
+            self.suivant += 1
+            matricule = f"EL{self.suivant:05d}"
+        self.suivant += 1
+        self.pris.add(matricule)
+        return matricule
+
+
+class ImportEleves:
+    """
+    Import d'élèves dans une classe, par lots.
+
+    rapport : une entrée par ligne {'ligne', 'statut' ('importe'/'erreur'),
+    'matricule', 'message'} ; importes : nombre d'élèves créés.
+    """
+
+    def __init__(self, classe, ecole, taille_lot=TAILLE_LOT):
+        self.classe = classe
+        self.ecole = ecole
+        self.taille_lot = taille_lot
+        self.matricules = GenerateurMatricules(ecole)
+        self.places = None
+        if ecole is not None:
+            self.places = ecole.max_eleves - Eleve.objects.filter(ecole=ecole, statut='actif').count()
+        self.vus = set()
+        self.importes = 0
+        self.rapport = []
+
+    @property
+    def erreurs(self):
+        return [f"Ligne {l['ligne']}: {l['message']}" for l in self.rapport if l['statut'] == 'erreur']
+
+    def _erreur(self, numero, message, matricule=''):
+        self.rapport.append({'ligne': numero, 'statut': 'erreur', 'matricule': matricule, 'message': message})
+
+    def importer(self, lignes):
+        """Importe un itérable de (numéro de ligne, dict) ; retourne self"""
+        lot = []
+        for numero, row in lignes:
+            lot.append((numero, row))
+            if len(lot) >= self.taille_lot:
+                self.importer_lot(lot)
+                lot = []
+        if lot:
+            self.importer_lot(lot)
+        self.rapport.sort(key=lambda l: l['ligne'])
+        return self
+
+    def importer_lot(self, lot):
+        """Valide puis insère un lot de lignes (une transaction) ; retourne le nombre d'élèves créés"""
+        valides = []
+        for numero, row in lot:
+            try:
+                valides.append((numero, preparer_eleve(row)))
+            except LigneInvalide as e:
+                self._erreur(numero, str(e), texte_cellule(row.get('matricule')))
+
+        # Matricules préalloués, puis une requête pour ceux déjà pris dans l'école
+        self.matricules.reserver(champs['matricule'] for _, champs in valides if champs['matricule'])
+        for _, champs in valides:
+            if not champs['matricule']:
+                champs['matricule'] = self.matricules.prochain()
+        existants = set(
+            Eleve.objects.filter(
+                ecole=self.ecole, matricule__in=[champs['matricule'] for _, champs in valides]
+            ).values_list('matricule', flat=True)
+        )
+
+        eleves = []
+        numeros = []
+        for numero, champs in valides:
+            matricule = champs['matricule']
+            if matricule in existants or matricule in self.vus:
+                self._erreur(numero, f"matricule {matricule} déjà utilisé", matricule)
+                continue
+            if self.places is not None and len(eleves) >= self.places:
+                self._erreur(
+                    numero, f"limite de {self.ecole.max_eleves} élèves atteinte pour l'école", matricule
+                )
+                continue
+            self.vus.add(matricule)
+            eleves.append(Eleve(**champs, classe=self.classe, ecole=self.ecole, statut='actif'))
+            numeros.append(numero)
+
+        if not eleves:
+            return 0
+        try:
+            with transaction.atomic():
+                Eleve.objects.bulk_create(eleves)
+        except IntegrityError as e:
+            for numero, eleve in zip(numeros, eleves):
+                self._erreur(numero, f"lot rejeté par la base ({e})", eleve.matricule)
+            return 0
+
+        # bulk_create n'émet pas post_save : effectif des classes en cache périmé
+        cache_vues.invalider(self.ecole.id, cache_vues.CLASSES)
+        if self.places is not None:
+            self.places -= len(eleves)
+        for numero, eleve in zip(numeros, eleves):
+            self.rapport.append({'ligne': numero, 'statut': 'importe', 'matricule': eleve.matricule, 'message': ''})
+        self.importes += len(eleves)
+        return len(eleves)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0005_alter_classe_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eleve',
+            index=models.Index(fields=['classe', 'statut', 'nom', 'prenom'], name='eleve_classe_statut_nom'),
+        ),
+        migrations.AddIndex(
+            model_name='eleve',
+            index=models.Index(fields=['ecole', 'statut'], name='eleve_ecole_statut'),
+        ),
+    ]
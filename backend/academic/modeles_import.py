@@ -0,0 +1,243 @@
+"""
+Modèles d'import des élèves (CSV et Excel), construits une seule fois.
+
+Le contenu des modèles ne dépend que de leur version et de la langue : chaque
+artefact est construit au premier téléchargement, écrit dans
+MODELES_IMPORT_CACHE_DIR (partagé entre processus, conservé au redémarrage)
+et gardé en mémoire. Son empreinte sert d'ETag et la date du fichier de
+Last-Modified, pour que les téléchargements répétés reçoivent un 304.
+"""
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import openpyxl
+from django.conf import settings
+from django.utils import translation
+from openpyxl.styles import Font, PatternFill, Alignment
+
+# À incrémenter à chaque modification du contenu des modèles
+VERSION_MODELES = 1
+
+Artefact = namedtuple('Artefact', ['contenu', 'etag', 'modifie_le', 'content_type', 'nom_fichier'])
+
+_artefacts = {}
+_verrou = threading.Lock()
+
+
+def _modele_csv():
+    """Contenu du modèle CSV"""
+    sortie = io.StringIO()
+
+    # Ajouter BOM pour Excel
+    sortie.write('\ufeff')
+
+    writer = csv.writer(sortie)
+
+    # Ligne d'instructions
+    writer.writerow(['# TEMPLATE IMPORT ÉLÈVES - Remplissez les lignes suivantes avec vos données'])
+    writer.writerow(['# Format date: AAAA-MM-JJ | Sexe: M ou F | Les champs vides sont autorisés'])
+    writer.writerow([])  # Ligne vide
+
+    # En-têtes avec descriptions
+    writer.writerow([
+        'Matricule*', 
+        'Nom*', 
+        'Prénom*', 
+        'Sexe* (M/F)', 
+        'Date Naissance (AAAA-MM-JJ)', 
+        'Lieu Naissance',
+        'Téléphone Élève', 
+        'Email', 
+        'Adresse',
+        'Nom Père', 
+        'Téléphone Père', 
+        'Nom Mère', 
+        'Téléphone Mère',
+        'Nom Tuteur', 
+        'Téléphone Tuteur'
+    ])
+
+    # Exemples avec différents cas
+    writer.writerow([
+        'EL2024001', 'DIOP', 'Amadou', 'M', '2012-03-15', 'Dakar',
+        '77 123 45 67', 'amadou.diop@email.com', 'Parcelles Assainies, Villa 123',
+        'Moussa DIOP', '77 111 11 11', 'Fatou DIOP', '77 222 22 22',
+        '', ''
+    ])
+
+    writer.writerow([
+        'EL2024002', 'NDIAYE', 'Awa', 'F', '2011-08-22', 'Thiès',
+        '78 234 56 78', '', 'Cité Keur Gorgui, Maison 45',
+        'Ibrahima NDIAYE', '78 333 33 33', 'Aissatou NDIAYE', '78 444 44 44',
+        '', ''
+    ])
+
+    writer.writerow([
+        'EL2024003', 'FALL', 'Cheikh', 'M', '2013-01-10', 'Saint-Louis',
+        '', '', 'Médina, Rue 15',
+        'Omar FALL', '70 555 55 55', '', '',
+        'Khadija SARR', '70 666 66 66'
+    ])
+
+    writer.writerow([])  # Ligne vide
+    writer.writerow(['# (*) Champs obligatoires | Autres champs optionnels'])
+    writer.writerow(['# Supprimez ces lignes de commentaires avant import'])
+
+    return sortie.getvalue().encode('utf-8')
+
+
+def _modele_excel():
+    """Contenu du modèle Excel (mise en forme, cellules fusionnées, largeurs)"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Template Élèves"
+
+    # Styles
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(color="FFFFFF", bold=True, size=11)
+    instruction_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+    instruction_font = Font(italic=True, size=10)
+    example_fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
+
+    # Instructions
+    ws.merge_cells('A1:O1')
+    ws['A1'] = "📋 TEMPLATE IMPORT ÉLÈVES - Remplissez les lignes 5 et suivantes avec vos données"
+    ws['A1'].fill = instruction_fill
+    ws['A1'].font = Font(bold=True, size=12)
+    ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
+
+    ws.merge_cells('A2:O2')
+    ws['A2'] = "Format date: AAAA-MM-JJ | Sexe: M ou F | (*) = Champs obligatoires"
+    ws['A2'].fill = instruction_fill
+    ws['A2'].font = instruction_font
+    ws['A2'].alignment = Alignment(horizontal='center')
+
+    # En-têtes (ligne 4)
+    headers = [
+        'Matricule*', 'Nom*', 'Prénom*', 'Sexe*', 'Date Naissance', 
+        'Lieu Naissance', 'Téléphone Élève', 'Email', 'Adresse',
+        'Nom Père', 'Téléphone Père', 'Nom Mère', 'Téléphone Mère',
+        'Nom Tuteur', 'Téléphone Tuteur'
+    ]
+
+    for col_num, header in enumerate(headers, 1):
+        cell = ws.cell(row=4, column=col_num, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+    # Exemples
+    examples = [
+        ['EL2024001', 'DIOP', 'Amadou', 'M', '2012-03-15', 'Dakar',
+         '77 123 45 67', 'amadou.diop@email.com', 'Parcelles Assainies, Villa 123',
+         'Moussa DIOP', '77 111 11 11', 'Fatou DIOP', '77 222 22 22', '', ''],
+
+        ['EL2024002', 'NDIAYE', 'Awa', 'F', '2011-08-22', 'Thiès',
+         '78 234 56 78', '', 'Cité Keur Gorgui, Maison 45',
+         'Ibrahima NDIAYE', '78 333 33 33', 'Aissatou NDIAYE', '78 444 44 44', '', ''],
+
+        ['EL2024003', 'FALL', 'Cheikh', 'M', '2013-01-10', 'Saint-Louis',
+         '', '', 'Médina, Rue 15',
+         'Omar FALL', '70 555 55 55', '', '', 'Khadija SARR', '70 666 66 66']
+    ]
+
+    for row_num, example in enumerate(examples, 5):
+        for col_num, value in enumerate(example, 1):
+            cell = ws.cell(row=row_num, column=col_num, value=value)
+            cell.fill = example_fill
+
+    # Ajuster largeur colonnes
+    column_widths = [12, 15, 15, 8, 15, 15, 15, 25, 30, 15, 15, 15, 15, 15, 15]
+    for col_num, width in enumerate(column_widths, 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(col_num)].width = width
+
+    # Fixer hauteur lignes
+    ws.row_dimensions[1].height = 25
+    ws.row_dimensions[4].height = 35
+
+    # Note en bas
+    ws.merge_cells('A10:O10')
+    ws['A10'] = "💡 Supprimez les exemples (lignes 5-7) et ajoutez vos propres élèves à partir de la ligne 5"
+    ws['A10'].fill = instruction_fill
+    ws['A10'].font = instruction_font
+    ws['A10'].alignment = Alignment(horizontal='center')
+
+    # Sauvegarder
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+MODELES = {
+    'csv': (_modele_csv, 'text/csv; charset=utf-8', 'template_import_eleves.csv'),
+    'excel': (
+        _modele_excel,
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'template_import_eleves.xlsx',
+    ),
+}
+
+
+def _cle(nom, langue):
+    return f"{nom}_v{VERSION_MODELES}_{langue}"
+
+
+def _lire_ou_construire(nom, langue):
+    """Contenu du modèle depuis le disque, ou construit puis écrit (écriture atomique)"""
+    construire, _, nom_fichier = MODELES[nom]
+    os.makedirs(settings.MODELES_IMPORT_CACHE_DIR, exist_ok=True)
+    chemin = os.path.join(
+        settings.MODELES_IMPORT_CACHE_DIR, f"{_cle(nom, langue)}{os.path.splitext(nom_fichier)[1]}"
+    )
+    try:
+        with open(chemin, 'rb') as fichier:
+            return fichier.read(), chemin
+    except FileNotFoundError:
+        pass
+
+    contenu = construire()
+    descripteur, temporaire = tempfile.mkstemp(dir=settings.MODELES_IMPORT_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as fichier:
+            fichier.write(contenu)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+    return contenu, chemin
+
+
+def artefact(nom):
+    """Artefact du modèle 'csv' ou 'excel' pour la langue active"""
+    langue = translation.get_language() or settings.LANGUAGE_CODE
+    cle = _cle(nom, langue)
+    trouve = _artefacts.get(cle)
+    if trouve is not None:
+        return trouve
+
+    with _verrou:
+        trouve = _artefacts.get(cle)
+        if trouve is None:
+            contenu, chemin = _lire_ou_construire(nom, langue)
+            _, content_type, nom_fichier = MODELES[nom]
+            trouve = Artefact(
+                contenu=contenu,
+                etag='"%s"' % hashlib.sha256(contenu).hexdigest()[:32],
+                modifie_le=datetime.fromtimestamp(int(os.path.getmtime(chemin)), tz=timezone.utc),
+                content_type=content_type,
+                nom_fichier=nom_fichier,
+            )
+            _artefacts[cle] = trouve
+    return trouve
+
+
+def vider_cache():
+    """Oublie les artefacts gardés en mémoire (les fichiers sur disque restent)"""
+    _artefacts.clear()
@@ -156,6 +156,9 @@ class Classe(models.Model):
     
     @property
     def effectif_actuel(self):
+        # Annoté par ClasseSerializer.precharger : pas de requête par classe
+        if hasattr(self, 'effectif'):
+            return self.effectif
         return self.eleves.count()
 
 
@@ -251,6 +254,11 @@ class Eleve(models.Model):
         verbose_name_plural = 'Élèves'
         ordering = ['nom', 'prenom']
         unique_together = ['matricule', 'ecole']  # Matricule unique par école
+        indexes = [
+            # Élèves actifs d'une classe, dans l'ordre alphabétique (listes, classements, exports)
+            models.Index(fields=['classe', 'statut', 'nom', 'prenom'], name='eleve_classe_statut_nom'),
+            models.Index(fields=['ecole', 'statut'], name='eleve_ecole_statut'),
+        ]
     
     def __str__(self):
         return f"{self.nom} {self.prenom} - {self.matricule}"
@@ -290,3 +298,46 @@ class MatiereClasse(models.Model):
     def __str__(self):
         prof = f" - Prof. {self.professeur.user.get_full_name()}" if self.professeur else ""
         return f"{self.matiere.nom} en {self.classe.nom}{prof}"
+
+
+# Cache des réponses de lecture de l'API (core.cache_vues) : nouvelle version des groupes touchés
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core import cache_vues
+
+
+@receiver(post_save, sender=Ecole)
+def invalider_vues_ecole(sender, instance, **kwargs):
+    cache_vues.invalider(
+        instance.pk, cache_vues.CLASSES, cache_vues.MATIERES, cache_vues.PERIODES, cache_vues.MOYENNES
+    )
+
+
+@receiver(post_save, sender=Classe)
+@receiver(post_delete, sender=Classe)
+@receiver(post_save, sender=MatiereClasse)
+@receiver(post_delete, sender=MatiereClasse)
+def invalider_vues_classes(sender, instance, **kwargs):
+    cache_vues.invalider(instance.ecole_id, cache_vues.CLASSES)
+
+
+@receiver(post_save, sender=Eleve)
+@receiver(post_delete, sender=Eleve)
+def invalider_vues_eleve(sender, instance, **kwargs):
+    """Effectif des classes, identité de l'élève dans ses moyennes"""
+    cache_vues.invalider(instance.ecole_id, cache_vues.CLASSES, cache_vues.MOYENNES)
+
+
+@receiver(post_save, sender=Matiere)
+@receiver(post_delete, sender=Matiere)
+def invalider_vues_matiere(sender, instance, **kwargs):
+    cache_vues.invalider(instance.ecole_id, cache_vues.MATIERES, cache_vues.CLASSES, cache_vues.MOYENNES)
+
+
+@receiver(post_save, sender=AnneeScolaire)
+@receiver(post_delete, sender=AnneeScolaire)
+def invalider_vues_annee(sender, instance, **kwargs):
+    # Activer une année désactive les autres par update() (sans signal) : toutes les écoles
+    ecoles = Ecole.objects.values_list('id', flat=True) if instance.active else [instance.ecole_id]
+    for ecole_id in ecoles:
+        cache_vues.invalider(ecole_id, cache_vues.CLASSES, cache_vues.PERIODES, cache_vues.MOYENNES)
@@ -1,3 +1,5 @@
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 from .models import Ecole, AnneeScolaire, Classe, Matiere, Eleve, MatiereClasse
 from users.models import Professeur
@@ -30,6 +32,9 @@ class AnneeScolaireSerializer(serializers.ModelSerializer):
         fields = ['id', 'libelle', 'date_debut', 'date_fin', 'active', 'nombre_classes']
     
     def get_nombre_classes(self, obj):
+        # Annoté par ClasseSerializer.precharger : pas de requête par année
+        if hasattr(obj, 'nombre_classes'):
+            return obj.nombre_classes
         return obj.classes.count()
 
 
@@ -92,6 +97,31 @@ class ClasseSerializer(serializers.ModelSerializer):
             'matieres_enseignees', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at', 'effectif_actuel']
+    
+    @staticmethod
+    def precharger(queryset):
+        """
+        Charge avec les classes tout ce que le serializer affiche, en un nombre
+        fixe de requêtes quel que soit le nombre de classes : effectif et
+        nombre de classes de l'année annotés, professeurs (et leur utilisateur)
+        joints, matières enseignées préchargées.
+        """
+        return queryset.select_related(
+            'professeur_principal__user__ecole'
+        ).prefetch_related(
+            Prefetch('annee_scolaire', queryset=AnneeScolaire.objects.annotate(nombre_classes=Count('classes'))),
+            Prefetch('matieres_enseignees', queryset=MatiereClasse.objects.select_related(
+                'matiere', 'professeur__user__ecole'
+            )),
+        ).annotate(
+            # Sous-requête plutôt que jointure + GROUP BY : l'ordre des classes est conservé
+            effectif=Coalesce(Subquery(
+                Eleve.objects.filter(classe=OuterRef('pk')).order_by().values('classe').annotate(
+                    nombre=Count('pk')
+                ).values('nombre'),
+                output_field=IntegerField(),
+            ), 0)
+        )
 
 
 class EleveSerializer(serializers.ModelSerializer):
@@ -138,10 +168,14 @@ class EleveImportSerializer(serializers.Serializer):
     """Serializer pour l'import CSV d'élèves"""
     file = serializers.FileField()
     classe_id = serializers.IntegerField()
+    asynchrone = serializers.BooleanField(
+        required=False, default=False, help_text="Traiter l'import en tâche de fond"
+    )
     
     def validate_file(self, value):
-        if not value.name.endswith(('.csv', '.xlsx', '.xls')):
+        # Mêmes formats que academic.imports.lire_lignes (pas de .xls)
+        if not value.name.lower().endswith(('.csv', '.xlsx')):
             raise serializers.ValidationError(
-                "Le fichier doit être au format CSV ou Excel (.xlsx, .xls)"
+                "Le fichier doit être au format CSV ou Excel (.xlsx)"
             )
         return value
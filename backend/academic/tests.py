@@ -31,3 +31,303 @@ class AcademicEndpointsTests(APITestCase):
         url = reverse('classe-list')
         resp = self.client.get(url, {"search": "A"})
         self.assertIn(resp.status_code, (status.HTTP_200_OK, status.HTTP_204_NO_CONTENT))
+
+
+class ImportElevesTests(APITestCase):
+    def setUp(self):
+        from datetime import date
+        from .models import Ecole, AnneeScolaire, Classe
+
+        self.ecole = Ecole.objects.create(
+            nom='École Test', code='TEST', directrice='Mme Test',
+            adresse='Dakar', telephone='770000000', email='ecole@test.sn', max_eleves=50
+        )
+        annee = AnneeScolaire.objects.create(
+            libelle='2024-2025', date_debut=date(2024, 10, 1), date_fin=date(2025, 7, 31),
+            active=True, ecole=self.ecole
+        )
+        self.classe = Classe.objects.create(niveau='cm2', section='A', annee_scolaire=annee, ecole=self.ecole)
+        self.admin = User.objects.create_user(username='admin', password='StrongPass123!', role='admin', ecole=self.ecole)
+        login = self.client.post(reverse('login'), {"username": "admin", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+
+    def importer(self, nom, contenu):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        fichier = SimpleUploadedFile(nom, contenu)
+        return self.client.post(
+            reverse('eleve-import-csv'), {'file': fichier, 'classe_id': self.classe.id}, format='multipart'
+        )
+
+    def csv(self, lignes):
+        entete = "# TEMPLATE IMPORT ÉLÈVES\n\nMatricule*,Nom*,Prénom*,Sexe* (M/F),Date Naissance (AAAA-MM-JJ),Lieu Naissance,Adresse\n"
+        return ('﻿' + entete + ''.join(f"{ligne}\n" for ligne in lignes)).encode('utf-8')
+
+    def test_import_csv_modele_et_rapport(self):
+        from .models import Eleve
+
+        r = self.importer('eleves.csv', self.csv([
+            'EL2024001,diop,amadou,M,2012-03-15,Dakar,Parcelles',
+            ',ndiaye,awa,F,2011-08-22,Thiès,Keur Gorgui',
+            'EL2024003,fall,cheikh,M,10/01/2013,Saint-Louis,Médina',
+            'EL2024001,sarr,moussa,M,2012-01-01,Dakar,',
+            'EL2024005,ba,,M,2012-01-01,Dakar,',
+            'EL2024006,sy,omar,X,2012-01-01,Dakar,',
+            'EL2024007,kane,ali,M,2012-13-45,Dakar,',
+        ]))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['imported'], 3)
+        self.assertEqual([l['statut'] for l in r.data['rapport']], ['importe'] * 3 + ['erreur'] * 4)
+        self.assertEqual([l['ligne'] for l in r.data['rapport']], list(range(4, 11)))
+        self.assertIn('Ligne 7: matricule EL2024001 déjà utilisé', r.data['errors'])
+
+        awa = Eleve.objects.get(nom='NDIAYE')
+        self.assertTrue(awa.matricule.startswith('EL'))
+        self.assertEqual((awa.prenom, awa.classe, awa.ecole), ('Awa', self.classe, self.ecole))
+        self.assertEqual(Eleve.objects.get(matricule='EL2024003').date_naissance.isoformat(), '2013-01-10')
+
+    def test_matricules_generes_evitent_ceux_deja_pris(self):
+        from datetime import date
+        from .models import Eleve
+
+        # Le prochain matricule préalloué (EL + id suivant) est déjà attribué
+        existant = Eleve.objects.create(
+            matricule='TMP', nom='DIOP', prenom='Amadou', sexe='M', date_naissance=date(2012, 3, 15),
+            classe=self.classe, ecole=self.ecole
+        )
+        existant.matricule = f'EL{existant.id + 1:05d}'
+        existant.save()
+        fourni = f'EL{existant.id + 3:05d}'
+
+        r = self.importer('eleves.csv', self.csv([
+            ',ndiaye,awa,F,2011-08-22,Thiès,',
+            f'{fourni},fall,cheikh,M,2013-01-10,Saint-Louis,',
+            ',sarr,moussa,M,2012-01-01,Dakar,',
+        ]))
+        self.assertEqual(r.data['imported'], 3, r.data['errors'])
+        self.assertEqual(
+            [l['matricule'] for l in r.data['rapport']],
+            [f'EL{existant.id + 2:05d}', fourni, f'EL{existant.id + 4:05d}'],
+        )
+
+    def test_format_xls_refuse(self):
+        # Refusé dès la validation, comme par lire_lignes
+        r = self.importer('eleves.xls', b'ancien format')
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', r.data)
+
+    def test_import_excel_et_limite_ecole(self):
+        import io
+        import openpyxl
+        from .models import Eleve
+
+        self.ecole.max_eleves = 2
+        self.ecole.save()
+        classeur = openpyxl.Workbook()
+        feuille = classeur.active
+        feuille.append(['📋 TEMPLATE IMPORT ÉLÈVES'])
+        feuille.append([])
+        feuille.append(['Matricule*', 'Nom*', 'Prénom*', 'Sexe*', 'Date Naissance'])
+        for i in range(3):
+            feuille.append([f'EL{i}', f'nom{i}', f'prenom{i}', 'F', '2012-03-15'])
+        contenu = io.BytesIO()
+        classeur.save(contenu)
+
+        r = self.importer('eleves.xlsx', contenu.getvalue())
+        self.assertEqual(r.data['imported'], 2)
+        self.assertIn("limite de 2 élèves", r.data['errors'][0])
+        self.assertEqual(Eleve.objects.count(), 2)
+
+    def test_budget_requetes_independant_du_nombre_de_lignes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from users.cache_principaux import principal
+
+        self.ecole.max_eleves = 1000
+        self.ecole.save()
+        budgets = []
+        for debut, nombre in ((0, 5), (100, 30)):
+            lignes = [f'M{i},nom{i},prenom{i},M,2012-03-15,Dakar,' for i in range(debut, debut + nombre)]
+            principal(User, self.admin.pk)  # utilisateur du jeton en cache pour les deux mesures
+            with CaptureQueriesContext(connection) as requetes:
+                r = self.importer('eleves.csv', self.csv(lignes))
+            self.assertEqual(r.data['imported'], len(lignes))
+            budgets.append(len(requetes))
+        self.assertEqual(budgets[0], budgets[1])
+
+    def test_import_asynchrone(self):
+        import tempfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from grades.taches import traiter_prochaine
+        from .models import Eleve
+
+        contenu = self.csv(['EL2024001,diop,amadou,M,2012-03-15,Dakar,', 'EL2024002,ndiaye,awa,F,2011,Thiès,'])
+        with tempfile.TemporaryDirectory() as depot, override_settings(IMPORTS_DIR=depot):
+            r = self.client.post(reverse('eleve-import-csv'), {
+                'file': SimpleUploadedFile('eleves.csv', contenu), 'classe_id': self.classe.id, 'asynchrone': True,
+            }, format='multipart')
+            self.assertEqual(r.status_code, status.HTTP_202_ACCEPTED)
+            self.assertFalse(Eleve.objects.exists())
+
+            tache = traiter_prochaine()
+        self.assertEqual(tache.statut, 'terminee')
+        self.assertEqual((tache.traites, tache.total), (2, 2))
+        self.assertEqual(tache.resultat['importes'], 1)
+        self.assertEqual(len(tache.erreurs), 1)
+        self.assertEqual(Eleve.objects.get().classe, self.classe)
+
+
+class ModelesImportTests(APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        from . import modeles_import
+
+        self.cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache, ignore_errors=True)
+        reglages = override_settings(MODELES_IMPORT_CACHE_DIR=self.cache)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        modeles_import.vider_cache()
+        self.addCleanup(modeles_import.vider_cache)
+
+        User.objects.create_user(username='admin', password='StrongPass123!', role='admin')
+        login = self.client.post(reverse('login'), {"username": "admin", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+
+    def test_modele_csv_reimportable(self):
+        from .imports import lire_lignes
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        r = self.client.get(reverse('eleve-template-csv'))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertIn('template_import_eleves.csv', r['Content-Disposition'])
+        lignes = list(lire_lignes(SimpleUploadedFile('modele.csv', r.content)))
+        self.assertEqual([row['matricule'] for _, row in lignes], ['EL2024001', 'EL2024002', 'EL2024003'])
+
+    def test_requetes_conditionnelles(self):
+        import os
+        from unittest import mock
+        from . import modeles_import
+
+        url = reverse('eleve-template-excel')
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertTrue(r.content.startswith(b'PK'))
+        etag, modifie = r['ETag'], r['Last-Modified']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=modifie).status_code, status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"autre"').status_code, status.HTTP_200_OK)
+
+        # Construit une seule fois : un autre processus relit le fichier sur disque
+        modeles_import.vider_cache()
+        with mock.patch.dict(modeles_import.MODELES, {'excel': (None,) + modeles_import.MODELES['excel'][1:]}):
+            r = self.client.get(url)
+        self.assertEqual(r['ETag'], etag)
+        self.assertEqual(len(os.listdir(self.cache)), 1)
+
+
+class ClasseSerializerRequetesTests(APITestCase):
+    def setUp(self):
+        from datetime import date
+        from .models import Ecole, AnneeScolaire, Matiere
+
+        self.ecole = Ecole.objects.create(
+            nom='École Test', code='TEST', directrice='Mme Test',
+            adresse='Dakar', telephone='770000000', email='ecole@test.sn'
+        )
+        self.annee = AnneeScolaire.objects.create(
+            libelle='2024-2025', date_debut=date(2024, 10, 1), date_fin=date(2025, 7, 31),
+            active=True, ecole=self.ecole
+        )
+        self.matieres = [
+            Matiere.objects.create(nom=nom, code=nom[:4].upper(), ecole=self.ecole) for nom in ('Calcul', 'Lecture')
+        ]
+        User.objects.create_user(username='admin', password='StrongPass123!', role='admin', ecole=self.ecole)
+        login = self.client.post(reverse('login'), {"username": "admin", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+
+    def creer_classe(self, i, nb_eleves):
+        from datetime import date
+        from users.models import Professeur
+        from .models import Classe, Eleve, MatiereClasse
+
+        user = User.objects.create_user(username=f'prof{i}', password='x', role='professeur', ecole=self.ecole)
+        professeur = Professeur.objects.create(user=user, matricule=f'PR{i:03d}', ecole=self.ecole)
+        classe = Classe.objects.create(
+            niveau='cm2', section=chr(ord('A') + i), annee_scolaire=self.annee,
+            professeur_principal=professeur, ecole=self.ecole
+        )
+        for matiere in self.matieres:
+            MatiereClasse.objects.create(classe=classe, matiere=matiere, professeur=professeur, ecole=self.ecole)
+        for j in range(nb_eleves):
+            Eleve.objects.create(
+                matricule=f'EL{i:02d}{j:03d}', nom='NOM', prenom='Prenom', sexe='M',
+                date_naissance=date(2013, 1, 1), lieu_naissance='Dakar', adresse='Dakar',
+                classe=classe, ecole=self.ecole
+            )
+        return classe
+
+    def requetes_liste(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as requetes:
+            r = self.client.get(reverse('classe-list'))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r['X-Cache'], 'MISS')
+        return r, len(requetes)
+
+    def test_nombre_de_requetes_independant_du_nombre_de_classes(self):
+        self.creer_classe(0, nb_eleves=2)
+        self.requetes_liste()  # utilisateur du jeton mis en cache
+        self.creer_classe(1, nb_eleves=1)
+        _, avec_deux = self.requetes_liste()
+        for i in range(2, 6):
+            self.creer_classe(i, nb_eleves=3)
+
+        r, avec_six = self.requetes_liste()
+        self.assertEqual(avec_six, avec_deux)
+        # Utilisateur du jeton (rechargé : la création des classes invalide son cache),
+        # validateurs ETag, comptage, classes, années, matières enseignées
+        self.assertEqual(avec_six, 6)
+
+        classes = r.data['results']
+        self.assertEqual([c['effectif_actuel'] for c in classes], [2, 1, 3, 3, 3, 3])
+        self.assertEqual({c['annee_scolaire']['nombre_classes'] for c in classes}, {6})
+        self.assertEqual(classes[0]['professeur_principal']['user']['ecole_code'], 'TEST')
+        self.assertEqual(
+            [m['matiere']['nom'] for m in classes[0]['matieres_enseignees']], ['Calcul', 'Lecture']
+        )
+        self.assertEqual(classes[0]['matieres_enseignees'][0]['professeur']['matricule'], 'PR000')
+
+        # Détail : mêmes données, sans requête par relation
+        with self.assertNumQueries(4):
+            r = self.client.get(reverse('classe-detail', args=[classes[1]['id']]))
+        self.assertEqual(r.data['effectif_actuel'], 1)
+
+    def test_listes_imbriquees_sans_requete_par_ligne(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def requetes(url, params=None):
+            with CaptureQueriesContext(connection) as capture:
+                r = self.client.get(url, params or {})
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+            return len(capture)
+
+        classe = self.creer_classe(0, nb_eleves=2)
+        eleve = classe.eleves.first()
+        urls = [reverse('eleve-list'), reverse('matiere-classe-list'), reverse('professeur-list')]
+        requetes(urls[0])  # utilisateur du jeton mis en cache
+        avant = [requetes(url) for url in urls] + [requetes(reverse('eleve-detail', args=[eleve.id]))]
+        for i in range(1, 4):
+            self.creer_classe(i, nb_eleves=3)
+        requetes(urls[0])
+        apres = [requetes(url) for url in urls] + [requetes(reverse('eleve-detail', args=[eleve.id]))]
+        self.assertEqual(apres, avant)
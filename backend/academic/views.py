@@ -4,21 +4,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import ValidationError
 from django.http import HttpResponse
+from django.db import transaction
 from django.db.models import Q
-import csv
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
-from io import TextIOWrapper, BytesIO
-from datetime import datetime
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.http import http_date
 
 from .models import AnneeScolaire, Classe, Matiere, Eleve, MatiereClasse
+from .imports import ImportEleves, LigneInvalide, lire_lignes
+from . import modeles_import
 from .serializers import (
     AnneeScolaireSerializer, ClasseSerializer, MatiereSerializer,
     EleveSerializer, EleveListSerializer, EleveImportSerializer,
     MatiereClasseSerializer
 )
-from users.models import Professeur
+from users.acces import contexte_acces
 from users.permissions import IsAdminUser, IsTeacherOrAdmin, IsReadOnlyOrAdmin
+from core import cache_vues
+from core.cache_vues import CacheVueMixin, CLASSES, MATIERES
+from core.conditionnel import ConditionnelMixin
 
 
 class BaseEcoleViewSet(viewsets.ModelViewSet):
@@ -89,29 +93,24 @@ class AnneeScolaireViewSet(BaseEcoleViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ClasseViewSet(BaseEcoleViewSet):
+class ClasseViewSet(ConditionnelMixin, CacheVueMixin, BaseEcoleViewSet):
     """ViewSet pour la gestion des classes - Admin: tout, Enseignant: sa classe uniquement"""
     queryset = Classe.objects.all()
     serializer_class = ClasseSerializer
     permission_classes = [IsTeacherOrAdmin]
+    cache_groupes = (CLASSES,)
     
     def get_queryset(self):
         # Filtrage par école automatique via BaseEcoleViewSet
         queryset = super().get_queryset()
         
-        user = self.request.user
-        if user.is_admin():
-            return queryset  # Admin voit toutes les classes de son école
+        acces = contexte_acces(self.request)
+        if not acces.est_admin:
+            # Les professeurs ne voient que leurs classes (titulaire ou matière enseignée)
+            queryset = queryset.filter(id__in=acces.classes_titulaires | acces.classes_enseignees)
         
-        # Les professeurs ne voient que leurs classes
-        try:
-            professeur = user.professeur_profile
-            return queryset.filter(
-                Q(professeur_principal=professeur) |
-                Q(matieres_enseignees__professeur=professeur)
-            ).distinct()
-        except:
-            return queryset.none()
+        # Admin : toutes les classes de son école ; relations chargées en bloc
+        return ClasseSerializer.precharger(queryset)
     
     @action(detail=True, methods=['get'])
     def eleves(self, request, pk=None):
@@ -142,16 +141,17 @@ class ClasseViewSet(BaseEcoleViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class MatiereViewSet(BaseEcoleViewSet):
+class MatiereViewSet(ConditionnelMixin, CacheVueMixin, BaseEcoleViewSet):
     """ViewSet pour la gestion des matières - Admin: tout, Enseignant: lecture seule"""
     queryset = Matiere.objects.all()
     serializer_class = MatiereSerializer
     permission_classes = [IsReadOnlyOrAdmin]
+    cache_groupes = (MATIERES,)
     
     # Le filtrage par école est automatique via BaseEcoleViewSet
 
 
-class EleveViewSet(BaseEcoleViewSet):
+class EleveViewSet(ConditionnelMixin, BaseEcoleViewSet):
     """
     ViewSet pour la gestion des élèves
     - Admin: Peut tout faire (CRUD complet)
@@ -159,6 +159,7 @@ class EleveViewSet(BaseEcoleViewSet):
     """
     queryset = Eleve.objects.all()
     permission_classes = [IsTeacherOrAdmin]
+    cache_groupes = (CLASSES,)  # classe imbriquée (validateurs ETag uniquement)
     
     def get_permissions(self):
         """
@@ -196,7 +197,14 @@ class EleveViewSet(BaseEcoleViewSet):
                 Q(matricule__icontains=search)
             )
         
-        return queryset
+        # Classe imbriquée : nom seul en liste, complète (ClasseSerializer) en détail
+        if self.action == 'list':
+            return queryset.select_related('classe')
+        return queryset.select_related(
+            'classe__professeur_principal__user__ecole', 'classe__annee_scolaire'
+        ).prefetch_related(
+            'classe__matieres_enseignees__matiere', 'classe__matieres_enseignees__professeur__user__ecole'
+        )
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -234,242 +242,66 @@ class EleveViewSet(BaseEcoleViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        imported = 0
-        errors = []
-        
-        try:
-            if file.name.endswith('.csv'):
-                # Import CSV
-                decoded_file = TextIOWrapper(file.file, encoding='utf-8')
-                reader = csv.DictReader(decoded_file)
-                
-                for row_num, row in enumerate(reader, start=2):
-                    try:
-                        self._create_eleve_from_row(row, classe)
-                        imported += 1
-                    except Exception as e:
-                        errors.append(f"Ligne {row_num}: {str(e)}")
-            
-            elif file.name.endswith(('.xlsx', '.xls')):
-                # Import Excel
-                wb = openpyxl.load_workbook(file)
-                ws = wb.active
-                headers = [cell.value for cell in ws[1]]
-                
-                for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                    try:
-                        row_dict = dict(zip(headers, row))
-                        self._create_eleve_from_row(row_dict, classe)
-                        imported += 1
-                    except Exception as e:
-                        errors.append(f"Ligne {row_num}: {str(e)}")
-            
+        if serializer.validated_data['asynchrone']:
+            # Fichier stocké puis traité par lots par le worker (reprise possible après coupure)
+            from grades.serializers import TacheSerializer
+            from grades.taches import soumettre, stocker_fichier
+            chemin, empreinte = stocker_fichier(file, request.user.ecole.id)
+            tache, creee = soumettre(
+                'import_eleves',
+                {'classe_id': classe.id},
+                cle=f'import_eleves:{classe.id}:{empreinte}',
+                ecole=request.user.ecole,
+                utilisateur=request.user,
+                fichier=chemin,
+            )
             return Response({
                 'success': True,
-                'imported': imported,
-                'errors': errors
-            })
+                'message': 'Import programmé' if creee else 'Ce fichier est déjà en cours d\'import',
+                'tache': TacheSerializer(tache).data
+            }, status=status.HTTP_202_ACCEPTED)
         
+        # Lecture en flux, validation et insertion par lots (une transaction par lot)
+        try:
+            import_eleves = ImportEleves(classe, request.user.ecole).importer(lire_lignes(file))
+        except LigneInvalide as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {'error': f'Erreur lors de l\'import: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-    
-    def _create_eleve_from_row(self, row, classe):
-        """Créer un élève à partir d'une ligne de données"""
-        # Parse date de naissance
-        date_naissance_str = row.get('date_naissance', '')
-        if isinstance(date_naissance_str, str):
-            date_naissance = datetime.strptime(date_naissance_str, '%Y-%m-%d').date()
-        else:
-            date_naissance = date_naissance_str
         
-        # Générer matricule si non fourni
-        matricule = row.get('matricule')
-        if not matricule:
-            last_eleve = Eleve.objects.order_by('-id').first()
-            next_id = (last_eleve.id + 1) if last_eleve else 1
-            matricule = f"EL{next_id:05d}"
-        
-        # Cloisonnement: la classe doit appartenir à l'école de l'utilisateur
-        if not getattr(self.request.user, 'ecole', None) or getattr(classe, 'ecole', None) != self.request.user.ecole:
-            raise ValidationError('Non autorisé: classe hors de votre école')
-        
-        eleve = Eleve.objects.create(
-            matricule=matricule,
-            nom=row.get('nom', '').upper(),
-            prenom=row.get('prenom', '').title(),
-            sexe=row.get('sexe', 'M'),
-            date_naissance=date_naissance,
-            lieu_naissance=row.get('lieu_naissance', ''),
-            telephone_eleve=row.get('telephone_eleve', ''),
-            email=row.get('email', ''),
-            adresse=row.get('adresse', ''),
-            nom_pere=row.get('nom_pere', ''),
-            telephone_pere=row.get('telephone_pere', ''),
-            nom_mere=row.get('nom_mere', ''),
-            telephone_mere=row.get('telephone_mere', ''),
-            tuteur=row.get('tuteur', ''),
-            telephone_tuteur=row.get('telephone_tuteur', ''),
-            classe=classe,
-            statut='actif',
-            ecole=self.request.user.ecole
+        return Response({
+            'success': True,
+            'imported': import_eleves.importes,
+            'errors': import_eleves.erreurs,
+            'rapport': import_eleves.rapport,
+        })
+    
+    def _servir_modele(self, request, nom):
+        """Modèle d'import pré-construit, avec ETag/Last-Modified (304 si inchangé)"""
+        modele = modeles_import.artefact(nom)
+        response = get_conditional_response(
+            request, etag=modele.etag, last_modified=modele.modifie_le.timestamp()
         )
-        return eleve
+        if response is None:
+            response = HttpResponse(modele.contenu, content_type=modele.content_type)
+            response['Content-Disposition'] = f'attachment; filename="{modele.nom_fichier}"'
+        response['ETag'] = modele.etag
+        response['Last-Modified'] = http_date(modele.modifie_le.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
     
     @action(detail=False, methods=['get'])
     def template_csv(self, request):
         """Télécharger un modèle CSV pour l'import"""
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="template_import_eleves.csv"'
-        
-        # Ajouter BOM pour Excel
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
-        
-        # Ligne d'instructions
-        writer.writerow(['# TEMPLATE IMPORT ÉLÈVES - Remplissez les lignes suivantes avec vos données'])
-        writer.writerow(['# Format date: AAAA-MM-JJ | Sexe: M ou F | Les champs vides sont autorisés'])
-        writer.writerow([])  # Ligne vide
-        
-        # En-têtes avec descriptions
-        writer.writerow([
-            'Matricule*', 
-            'Nom*', 
-            'Prénom*', 
-            'Sexe* (M/F)', 
-            'Date Naissance (AAAA-MM-JJ)', 
-            'Lieu Naissance',
-            'Téléphone Élève', 
-            'Email', 
-            'Adresse',
-            'Nom Père', 
-            'Téléphone Père', 
-            'Nom Mère', 
-            'Téléphone Mère',
-            'Nom Tuteur', 
-            'Téléphone Tuteur'
-        ])
-        
-        # Exemples avec différents cas
-        writer.writerow([
-            'EL2024001', 'DIOP', 'Amadou', 'M', '2012-03-15', 'Dakar',
-            '77 123 45 67', 'amadou.diop@email.com', 'Parcelles Assainies, Villa 123',
-            'Moussa DIOP', '77 111 11 11', 'Fatou DIOP', '77 222 22 22',
-            '', ''
-        ])
-        
-        writer.writerow([
-            'EL2024002', 'NDIAYE', 'Awa', 'F', '2011-08-22', 'Thiès',
-            '78 234 56 78', '', 'Cité Keur Gorgui, Maison 45',
-            'Ibrahima NDIAYE', '78 333 33 33', 'Aissatou NDIAYE', '78 444 44 44',
-            '', ''
-        ])
-        
-        writer.writerow([
-            'EL2024003', 'FALL', 'Cheikh', 'M', '2013-01-10', 'Saint-Louis',
-            '', '', 'Médina, Rue 15',
-            'Omar FALL', '70 555 55 55', '', '',
-            'Khadija SARR', '70 666 66 66'
-        ])
-        
-        writer.writerow([])  # Ligne vide
-        writer.writerow(['# (*) Champs obligatoires | Autres champs optionnels'])
-        writer.writerow(['# Supprimez ces lignes de commentaires avant import'])
-        
-        return response
+        return self._servir_modele(request, 'csv')
     
     @action(detail=False, methods=['get'])
     def template_excel(self, request):
         """Télécharger un modèle Excel pour l'import"""
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Template Élèves"
-        
-        # Styles
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True, size=11)
-        instruction_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-        instruction_font = Font(italic=True, size=10)
-        example_fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
-        
-        # Instructions
-        ws.merge_cells('A1:O1')
-        ws['A1'] = "📋 TEMPLATE IMPORT ÉLÈVES - Remplissez les lignes 5 et suivantes avec vos données"
-        ws['A1'].fill = instruction_fill
-        ws['A1'].font = Font(bold=True, size=12)
-        ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
-        
-        ws.merge_cells('A2:O2')
-        ws['A2'] = "Format date: AAAA-MM-JJ | Sexe: M ou F | (*) = Champs obligatoires"
-        ws['A2'].fill = instruction_fill
-        ws['A2'].font = instruction_font
-        ws['A2'].alignment = Alignment(horizontal='center')
-        
-        # En-têtes (ligne 4)
-        headers = [
-            'Matricule*', 'Nom*', 'Prénom*', 'Sexe*', 'Date Naissance', 
-            'Lieu Naissance', 'Téléphone Élève', 'Email', 'Adresse',
-            'Nom Père', 'Téléphone Père', 'Nom Mère', 'Téléphone Mère',
-            'Nom Tuteur', 'Téléphone Tuteur'
-        ]
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col_num, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        # Exemples
-        examples = [
-            ['EL2024001', 'DIOP', 'Amadou', 'M', '2012-03-15', 'Dakar',
-             '77 123 45 67', 'amadou.diop@email.com', 'Parcelles Assainies, Villa 123',
-             'Moussa DIOP', '77 111 11 11', 'Fatou DIOP', '77 222 22 22', '', ''],
-            
-            ['EL2024002', 'NDIAYE', 'Awa', 'F', '2011-08-22', 'Thiès',
-             '78 234 56 78', '', 'Cité Keur Gorgui, Maison 45',
-             'Ibrahima NDIAYE', '78 333 33 33', 'Aissatou NDIAYE', '78 444 44 44', '', ''],
-            
-            ['EL2024003', 'FALL', 'Cheikh', 'M', '2013-01-10', 'Saint-Louis',
-             '', '', 'Médina, Rue 15',
-             'Omar FALL', '70 555 55 55', '', '', 'Khadija SARR', '70 666 66 66']
-        ]
-        
-        for row_num, example in enumerate(examples, 5):
-            for col_num, value in enumerate(example, 1):
-                cell = ws.cell(row=row_num, column=col_num, value=value)
-                cell.fill = example_fill
-        
-        # Ajuster largeur colonnes
-        column_widths = [12, 15, 15, 8, 15, 15, 15, 25, 30, 15, 15, 15, 15, 15, 15]
-        for col_num, width in enumerate(column_widths, 1):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col_num)].width = width
-        
-        # Fixer hauteur lignes
-        ws.row_dimensions[1].height = 25
-        ws.row_dimensions[4].height = 35
-        
-        # Note en bas
-        ws.merge_cells('A10:O10')
-        ws['A10'] = "💡 Supprimez les exemples (lignes 5-7) et ajoutez vos propres élèves à partir de la ligne 5"
-        ws['A10'].fill = instruction_fill
-        ws['A10'].font = instruction_font
-        ws['A10'].alignment = Alignment(horizontal='center')
-        
-        # Sauvegarder
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="template_import_eleves.xlsx"'
-        
-        return response
+        return self._servir_modele(request, 'excel')
     
     @action(detail=True, methods=['patch'])
     def proposer_passage(self, request, pk=None):
@@ -481,9 +313,9 @@ class EleveViewSet(BaseEcoleViewSet):
         nouveau_statut = request.data.get('statut')
         
         # Vérifier que c'est le prof principal de la classe de l'élève
-        if request.user.is_professeur() and not request.user.is_admin():
-            prof = Professeur.objects.get(user=request.user)
-            if eleve.classe.professeur_principal != prof:
+        acces = contexte_acces(request)
+        if acces.est_professeur:
+            if not acces.est_titulaire(eleve.classe_id):
                 return Response(
                     {'error': 'Vous n\'êtes pas le professeur principal de cet élève'},
                     status=status.HTTP_403_FORBIDDEN
@@ -540,21 +372,21 @@ class EleveViewSet(BaseEcoleViewSet):
                     status=status.HTTP_403_FORBIDDEN
                 )
             # Restreindre les élèves à l'école de l'utilisateur
-            eleves = Eleve.objects.filter(id__in=eleves_ids, ecole=request.user.ecole)
+            eleves = list(Eleve.objects.filter(id__in=eleves_ids, ecole=request.user.ecole))
             
-            # Mise à jour
-            eleves_mis_a_jour = 0
-            for eleve in eleves:
-                # Vérifier cohérence école de l'élève et de la nouvelle classe
-                if getattr(eleve, 'ecole', None) != request.user.ecole:
-                    return Response(
-                        {'error': f"Élève {eleve.id} hors de votre école"},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                eleve.classe = nouvelle_classe
-                eleve.statut = nouveau_statut
-                eleve.save()
-                eleves_mis_a_jour += 1
+            # Mise à jour en une requête ; update() n'émet pas post_save :
+            # classements et caches actualisés en bloc
+            from grades.models import actualiser_classements_eleves
+            with transaction.atomic():
+                Eleve.objects.filter(pk__in=[eleve.pk for eleve in eleves]).update(
+                    classe=nouvelle_classe, statut=nouveau_statut, updated_at=timezone.now()
+                )
+                for eleve in eleves:
+                    eleve.classe = nouvelle_classe
+                    eleve.statut = nouveau_statut
+                actualiser_classements_eleves(eleves)
+            cache_vues.invalider(request.user.ecole_id, cache_vues.CLASSES, cache_vues.MOYENNES)
+            eleves_mis_a_jour = len(eleves)
             
             return Response({
                 'success': True,
@@ -588,4 +420,5 @@ class MatiereClasseViewSet(BaseEcoleViewSet):
         if classe_id:
             queryset = queryset.filter(classe_id=classe_id)
         
-        return queryset
+        # Matière et professeur (avec son utilisateur) imbriqués : joints en une requête
+        return queryset.select_related('matiere', 'professeur__user__ecole')
@@ -3,8 +3,9 @@ Script pour vérifier le classement et les ex-aequo
 Exécuter avec: python manage.py shell < check_rangs.py
 """
 
-from academic.models import Classe, Eleve
-from grades.models import Periode, Note, MoyenneEleve
+from academic.models import Classe
+from grades.models import Periode
+from grades.classement import classement_classe
 
 # Paramètres à ajuster
 CLASSE_ID = 7  # ID de la classe à vérifier (6ème A)
@@ -22,37 +23,19 @@ try:
     print(f"📅 Période: {periode.get_nom_display()}")
     print(f"👥 Effectif: {classe.eleves.filter(statut='actif').count()} élèves\n")
     
-    # Récupérer tous les élèves avec leurs moyennes
-    eleves = Eleve.objects.filter(classe=classe, statut='actif')
-    
-    resultats = []
-    for eleve in eleves:
-        # Calculer la moyenne générale
-        moyenne_gen = MoyenneEleve.calculer_moyenne_generale(eleve, periode)
-        
-        if moyenne_gen is not None:
-            resultats.append({
-                'id': eleve.id,
-                'nom': eleve.nom,
-                'prenom': eleve.prenom,
-                'matricule': eleve.matricule,
-                'moyenne': round(moyenne_gen, 2)
-            })
-    
-    # Trier par moyenne décroissante
-    resultats_tries = sorted(resultats, key=lambda x: x['moyenne'], reverse=True)
-    
-    # Calculer les rangs
-    rang_actuel = 0
-    moyenne_precedente = None
-    
-    for i, eleve in enumerate(resultats_tries):
-        # Si la moyenne est différente de la précédente, nouveau rang
-        if i == 0 or eleve['moyenne'] != moyenne_precedente:
-            rang_actuel = i + 1
-        
-        eleve['rang'] = rang_actuel
-        moyenne_precedente = eleve['moyenne']
+    # Classement calculé par le moteur partagé avec l'API (grades.classement)
+    resultats_tries = [
+        {
+            'id': ligne['eleve_id'],
+            'nom': ligne['nom'],
+            'prenom': ligne['prenom'],
+            'matricule': ligne['matricule'],
+            'moyenne': ligne['moyenne_generale'],
+            'rang': ligne['rang'],
+        }
+        for ligne in classement_classe(classe, periode)
+        if ligne['moyenne_generale'] is not None
+    ]
     
     # Détecter les ex-aequo
     rangs_count = {}
@@ -0,0 +1,142 @@
+"""
+Cache des réponses de lecture des ViewSets DRF (list, retrieve).
+
+La clé d'une réponse dépend de l'école, du rôle de l'utilisateur, de son
+profil enseignant, de l'action, de l'objet demandé et des paramètres de la
+requête, ainsi que de la version de chaque groupe d'invalidation dont dépend
+la vue (cache_groupes) :
+
+    vues:<basename>:<action>:<ecole>:<role>:<professeur>:<pk>:<versions>:<paramètres>
+
+Les signaux des modèles (dans chaque app) et les écritures groupées sans
+signal (bulk_create) appellent ``invalider(ecole_id, *groupes)``, qui
+incrémente la version des groupes : les réponses périmées ne sont plus lues.
+
+Avec le cache 'memoire' (défaut), chaque processus a son propre cache : en
+déploiement multi-processus, utiliser CACHE_BACKEND=fichier ou redis pour que
+les invalidations soient vues de tous.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+# Groupes d'invalidation
+CLASSES = 'classes'
+MATIERES = 'matieres'
+PERIODES = 'periodes'
+MOYENNES = 'moyennes'
+
+
+def _cache():
+    return caches[settings.VUES_CACHE]
+
+
+def _cle_version(groupe, ecole_id):
+    return f'vues:version:{groupe}:{ecole_id}'
+
+
+def versions(ecole_id, groupes):
+    """Versions courantes des groupes pour une école (initialisées à l'horloge si absentes)"""
+    cache = _cache()
+    cles = [_cle_version(groupe, ecole_id) for groupe in groupes]
+    trouvees = cache.get_many(cles)
+    for cle in cles:
+        if cle not in trouvees:
+            cache.add(cle, time.time_ns(), timeout=None)
+            trouvees[cle] = cache.get(cle)
+    return [trouvees[cle] for cle in cles]
+
+
+def _incrementer_versions(ecole_id, groupes):
+    cache = _cache()
+    for groupe in groupes:
+        cle = _cle_version(groupe, ecole_id)
+        # Horodatage (ns) de la dernière invalidation, toujours croissant :
+        # sert aussi de date de modification (core.conditionnel)
+        cache.set(cle, max(time.time_ns(), (cache.get(cle) or 0) + 1), timeout=None)
+
+
+def invalider(ecole_id, *groupes):
+    """
+    Périme les réponses en cache des groupes pour une école, immédiatement
+    puis à nouveau au commit (une lecture concurrente a pu remettre en cache
+    l'état non encore validé).
+    """
+    if ecole_id is None or not groupes:
+        return
+    _incrementer_versions(ecole_id, groupes)
+    transaction.on_commit(lambda: _incrementer_versions(ecole_id, groupes))
+
+
+def cle_vue(request, vue, **kwargs):
+    """Clé de cache de la réponse d'une vue, ou None si la requête ne doit pas être mise en cache"""
+    user = request.user
+    ecole_id = getattr(user, 'ecole_id', None)
+    if not getattr(user, 'is_authenticated', False) or not ecole_id:
+        return None
+
+    # Professeur identifié par son utilisateur (profil 1-1) : pas de requête par appel
+    professeur = user.pk if user.is_professeur() and not user.is_admin() else '-'
+    nom = getattr(vue, 'basename', None) or type(vue).__name__
+
+    parametres = hashlib.sha256(
+        '&'.join(
+            f'{cle}={",".join(sorted(request.query_params.getlist(cle)))}'
+            for cle in sorted(request.query_params)
+        ).encode('utf-8')
+    ).hexdigest()[:16]
+    version = '.'.join(str(v) for v in versions(ecole_id, vue.cache_groupes))
+    return (
+        f'vues:{nom}:{vue.action}:{ecole_id}:{user.role}:{professeur}:'
+        f'{kwargs.get(vue.lookup_url_kwarg or vue.lookup_field, "-")}:{version}:{parametres}'
+    )
+
+
+def en_cache(methode):
+    """
+    Décorateur d'une action de lecture d'un ViewSet : la réponse (200) est
+    mise en cache selon cle_vue ; en-tête X-Cache HIT ou MISS.
+    Les permissions sont vérifiées par DRF avant l'appel, même en cas de HIT.
+    """
+    @wraps(methode)
+    def vue(self, request, *args, **kwargs):
+        cle = cle_vue(request, self, **kwargs)
+        if cle is None:
+            return methode(self, request, *args, **kwargs)
+
+        cache = _cache()
+        donnees = cache.get(cle)
+        if donnees is not None:
+            response = Response(donnees)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = methode(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(cle, response.data, timeout=self.cache_timeout or settings.VUES_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+    return vue
+
+
+class CacheVueMixin:
+    """
+    Met en cache les réponses list et retrieve d'un ViewSet.
+    cache_groupes : groupes d'invalidation dont dépendent les réponses.
+    """
+    cache_groupes = ()
+    cache_timeout = None
+
+    @en_cache
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @en_cache
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
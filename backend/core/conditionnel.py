@@ -0,0 +1,87 @@
+"""
+Requêtes conditionnelles (ETag, If-None-Match, If-Modified-Since) pour les
+lectures des ViewSets DRF.
+
+Les validateurs sont calculés par une seule agrégation sur le queryset
+filtré de la vue (nombre de lignes et max du champ de modification), sans
+sérialiser :
+
+    ETag = empreinte(école, utilisateur, URL complète, nombre, dernière modification,
+                     versions des groupes core.cache_vues de la vue)
+
+Les versions des groupes (cache_groupes) couvrent les données imbriquées
+(élèves d'une classe, matière d'une moyenne...) dont la modification ne
+touche pas updated_at ; une suppression change le nombre de lignes. Si rien
+n'a changé, la réponse est 304 sans corps.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .cache_vues import versions
+
+
+class ConditionnelMixin:
+    """
+    ETag et Last-Modified sur list et retrieve ; 304 si la ressource est inchangée.
+    champ_modification : date de dernière modification des lignes du queryset.
+    """
+    champ_modification = 'updated_at'
+    cache_groupes = ()
+
+    def validateurs(self, request, queryset):
+        """(etag, last_modified en secondes ou None, nombre de lignes) de la réponse à venir"""
+        etat = queryset.order_by().aggregate(
+            derniere=Max(self.champ_modification), nombre=Count('pk')
+        )
+        ecole_id = getattr(request.user, 'ecole_id', None)
+        versions_groupes = versions(ecole_id, self.cache_groupes) if ecole_id else []
+
+        dates = [version / 1e9 for version in versions_groupes]
+        if etat['derniere'] is not None:
+            dates.append(etat['derniere'].timestamp())
+        empreinte = hashlib.sha256(':'.join(str(valeur) for valeur in (
+            ecole_id, request.user.pk, request.user.role, request.get_full_path(),
+            etat['nombre'], etat['derniere'] and etat['derniere'].isoformat(), *versions_groupes,
+        )).encode('utf-8')).hexdigest()[:32]
+        # Seconde entière : celle de Last-Modified, comparée à If-Modified-Since
+        return f'"{empreinte}"', int(max(dates)) if dates else None, etat['nombre']
+
+    def _conditionnel(self, request, queryset, servir, detail=False):
+        etag, last_modified, nombre = self.validateurs(request, queryset)
+        if detail and not nombre:
+            # Objet absent ou hors de portée : réponse habituelle (404)
+            return servir()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = servir()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditionnel(
+            request, self.filter_queryset(self.get_queryset()),
+            lambda: super(ConditionnelMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError):
+            # Identifiant invalide : réponse habituelle (404)
+            return super().retrieve(request, *args, **kwargs)
+        return self._conditionnel(
+            request, queryset,
+            lambda: super(ConditionnelMixin, self).retrieve(request, *args, **kwargs),
+            detail=True
+        )
@@ -87,3 +87,21 @@ class TenantSecurityMiddleware(MiddlewareMixin):
                     )
         
         return None
+
+
+class RecalculDiffereMiddleware:
+    """
+    Middleware qui regroupe les recalculs de moyennes déclenchés pendant la requête
+    (signaux de Note) et les exécute une seule fois, dédoublonnés, avant la réponse.
+    Les écritures de la vue sont déjà validées : un recalcul en échec est journalisé
+    et mis en file (traiter_recalculs) sans changer la réponse en erreur 500.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        from grades.recalcul import differer
+        
+        with differer(tolerant=True):
+            return self.get_response(request)
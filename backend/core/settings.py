@@ -60,6 +60,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.TenantMiddleware',  # Multi-tenant : Injecte l'école
     'core.middleware.TenantSecurityMiddleware',  # Multi-tenant : Sécurité
+    'core.middleware.RecalculDiffereMiddleware',  # Recalcul des moyennes groupé par requête
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -190,6 +191,54 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache : 'memoire' (défaut, par processus), 'fichier' (partagé entre processus)
+# ou 'redis' (tout serveur compatible Redis, nécessite le paquet redis)
+CACHE_BACKEND = config('CACHE_BACKEND', default='memoire')
+_BACKENDS_CACHE = {
+    'memoire': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecole',
+    },
+    'fichier': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'django')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_REDIS_URL', default='redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES = {
+    'default': {**_BACKENDS_CACHE[CACHE_BACKEND], 'TIMEOUT': 300},
+}
+
+# Référentiel des écoles (matières, périodes, types d'évaluation) : grades.referentiel
+REFERENTIEL_CACHE = 'default'
+REFERENTIEL_CACHE_TIMEOUT = config('REFERENTIEL_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Réponses de lecture de l'API (list/retrieve) : core.cache_vues
+VUES_CACHE = 'default'
+VUES_CACHE_TIMEOUT = config('VUES_CACHE_TIMEOUT', default=300, cast=int)
+
+# Utilisateurs authentifiés (JWT) en mémoire du processus : users.cache_principaux
+PRINCIPAUX_CACHE = 'default'  # versions partagées (invalidation)
+PRINCIPAUX_CACHE_TTL = config('PRINCIPAUX_CACHE_TTL', default=30, cast=int)
+PRINCIPAUX_CACHE_TAILLE = config('PRINCIPAUX_CACHE_TAILLE', default=1000, cast=int)
+
+# Recalcul des moyennes après saisie de notes
+# 'synchrone' : en fin de requête/transaction ; 'file' : via la commande traiter_recalculs
+RECALCUL_MOYENNES_MODE = config('RECALCUL_MOYENNES_MODE', default='synchrone')
+
+# Cache disque des bulletins PDF (taille maximale en octets, éviction LRU)
+BULLETINS_CACHE_DIR = config('BULLETINS_CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'bulletins'))
+BULLETINS_CACHE_TAILLE_MAX = config('BULLETINS_CACHE_TAILLE_MAX', default=500 * 1024 * 1024, cast=int)
+
+# Modèles d'import (CSV/Excel) construits une fois et servis avec ETag
+MODELES_IMPORT_CACHE_DIR = config('MODELES_IMPORT_CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'modeles'))
+
+# Fichiers d'import déposés pour traitement en tâche de fond (traiter_taches)
+IMPORTS_DIR = config('IMPORTS_DIR', default=os.path.join(BASE_DIR, 'imports'))
+
 # drf-spectacular settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'School Management API',
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Periode, TypeEvaluation, Note, MoyenneEleve
+from .models import Periode, TypeEvaluation, Note, MoyenneEleve, MoyenneGenerale, Tache
 
 
 @admin.register(Periode)
@@ -102,3 +102,23 @@ class MoyenneEleveAdmin(admin.ModelAdmin):
             'fields': ('calculated_at',)
         }),
     )
+
+
+@admin.register(MoyenneGenerale)
+class MoyenneGeneraleAdmin(admin.ModelAdmin):
+    list_display = ['eleve', 'classe', 'periode', 'moyenne', 'rang', 'est_exaequo', 'moyenne_annuelle', 'calculated_at']
+    list_filter = ['periode', 'classe']
+    search_fields = ['eleve__nom', 'eleve__prenom', 'eleve__matricule']
+    raw_id_fields = ['eleve', 'classe', 'periode']
+    readonly_fields = [
+        'moyenne', 'moyenne_annuelle', 'nombre_trimestres', 'nombre_notes', 'nombre_matieres',
+        'rang', 'rang_dense', 'est_exaequo', 'effectif_classe', 'moyenne_classe', 'calculated_at'
+    ]
+
+
+@admin.register(Tache)
+class TacheAdmin(admin.ModelAdmin):
+    list_display = ['id', 'type', 'statut', 'traites', 'total', 'ecole', 'created_at', 'terminee_le']
+    list_filter = ['type', 'statut']
+    search_fields = ['cle']
+    readonly_fields = ['created_at', 'demarree_le', 'terminee_le']
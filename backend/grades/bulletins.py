@@ -0,0 +1,72 @@
+"""
+Assemblage des bulletins d'une classe pour une période.
+
+Moyennes générales, rangs et moyennes annuelles sont lus dans la table
+MoyenneGenerale ; les moyennes par matière de la classe sont chargées en une
+seule requête. Le nombre de requêtes ne dépend donc pas de l'effectif.
+"""
+from collections import defaultdict
+
+from academic.models import Eleve
+from .models import MoyenneEleve, MoyenneGenerale
+from .serializers import MoyenneEleveSerializer
+
+
+def assembler_bulletins_classe(classe, periode):
+    """
+    Construit le contenu de l'endpoint bulletins_classe.
+
+    Requêtes : élèves actifs, lignes MoyenneGenerale de la classe,
+    moyennes par matière de la classe pour la période.
+    """
+    eleves = list(Eleve.objects.filter(classe=classe, statut='actif'))
+    generales = {g.eleve_id: g for g in MoyenneGenerale.pour_classe(classe, periode)}
+
+    moyennes_par_eleve = defaultdict(list)
+    moyennes = MoyenneEleve.objects.filter(
+        eleve__classe=classe,
+        eleve__statut='actif',
+        periode=periode,
+    ).select_related('eleve__classe', 'matiere', 'periode__annee_scolaire')
+    for moyenne in moyennes:
+        moyennes_par_eleve[moyenne.eleve_id].append(moyenne)
+
+    bulletins = []
+    for eleve in eleves:
+        generale = generales.get(eleve.id)
+        # Seuls les élèves ayant des notes et une moyenne ont un bulletin
+        if generale is None or not generale.nombre_notes:
+            continue
+
+        bulletins.append({
+            'eleve': {
+                'id': eleve.id,
+                'matricule': eleve.matricule,
+                'nom': eleve.nom,
+                'prenom': eleve.prenom,
+                'sexe': eleve.sexe,
+                'classe_nom': classe.nom
+            },
+            'moyenne_generale': float(generale.moyenne),
+            'moyennes_par_matiere': MoyenneEleveSerializer(moyennes_par_eleve[eleve.id], many=True).data,
+            'rang': generale.rang,
+            'isExaequo': generale.est_exaequo,
+            'effectif_classe': generale.effectif_classe,
+            'moyenne_classe': (
+                float(generale.moyenne_classe) if generale.moyenne_classe is not None else None
+            ),
+            'moyenne_annuelle': (
+                float(generale.moyenne_annuelle) if generale.moyenne_annuelle is not None else None
+            ),
+            'nombre_trimestres': generale.nombre_trimestres,
+        })
+
+    # Ordre du classement (tri stable : ordre alphabétique entre ex-aequo)
+    bulletins.sort(key=lambda x: x['rang'])
+
+    return {
+        'classe_nom': classe.nom,
+        'periode_nom': periode.get_nom_display(),
+        'periode_code': periode.nom,  # Pour détecter le trimestre
+        'bulletins': bulletins
+    }
@@ -0,0 +1,234 @@
+"""
+Cache disque des bulletins PDF, adressé par contenu.
+
+Chaque fichier est nommé d'après la classe, la période, le jour d'édition
+(imprimé en pied de page) et une empreinte (sha256) du contenu du bulletin
+(moyennes, rang...), de l'en-tête de l'école et de la version du rendu :
+
+    <BULLETINS_CACHE_DIR>/<ecole_id>/c<classe>_p<periode>_e<eleve>_<jour>_<empreinte>.pdf
+    <BULLETINS_CACHE_DIR>/<ecole_id>/c<classe>_p<periode>_classe_<jour>_<empreinte>.pdf
+
+Un changement de note modifie l'empreinte ; les fichiers de la classe sont en
+outre supprimés à chaque re-classement (MoyenneGenerale.actualiser_classe).
+Pour une période clôturée, un fichier du jour est servi sans relire la base.
+La taille totale est bornée (BULLETINS_CACHE_TAILLE_MAX) : après chaque
+écriture, les fichiers les moins récemment servis sont supprimés en premier.
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import date
+
+from django.conf import settings
+
+from .pdf import VERSION_RENDU, contexte_rendu, ecrire_pdf, nom_fichier_eleve
+
+_verrou = threading.Lock()
+
+
+def racine():
+    return settings.BULLETINS_CACHE_DIR
+
+
+def _repertoire(ecole_id):
+    chemin = os.path.join(racine(), str(ecole_id or 0))
+    os.makedirs(chemin, exist_ok=True)
+    return chemin
+
+
+def _prefixe(classe_id, periode_id, genre, jour):
+    """Début du nom des fichiers d'une classe, d'une période et d'un jour d'édition"""
+    return f"c{classe_id}_p{periode_id}_{genre}_{jour.strftime('%Y%m%d')}_"
+
+
+def empreinte(*parties):
+    """Empreinte stable d'objets JSON (clés triées, décimaux et dates en texte)"""
+    contenu = json.dumps(parties, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()[:32]
+
+
+def _ouvrir(chemin):
+    """Ouvre un fichier du cache et le marque comme récemment utilisé (LRU)"""
+    try:
+        fichier = open(chemin, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(chemin)
+    except OSError:
+        pass
+    return fichier
+
+
+def _chercher(ecole_id, prefixe):
+    """Fichier le plus récent du préfixe donné (périodes clôturées), ou None"""
+    chemins = glob.glob(os.path.join(racine(), str(ecole_id or 0), glob.escape(prefixe) + '*'))
+    chemins = [c for c in chemins if not c.endswith('.tmp')]
+    if not chemins:
+        return None
+    return max(chemins, key=lambda c: os.path.getmtime(c) if os.path.exists(c) else 0)
+
+
+def _enregistrer(ecole_id, nom, ecrire):
+    """Écrit un fichier du cache via ecrire(fichier) (écriture atomique) et retourne son chemin"""
+    repertoire = _repertoire(ecole_id)
+    chemin = os.path.join(repertoire, nom)
+    descripteur, temporaire = tempfile.mkstemp(dir=repertoire, suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as fichier:
+            ecrire(fichier)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+    return chemin
+
+
+def evincer(taille_max=None):
+    """Supprime les fichiers les moins récemment utilisés au-delà de la taille maximale"""
+    taille_max = settings.BULLETINS_CACHE_TAILLE_MAX if taille_max is None else taille_max
+    with _verrou:
+        fichiers = []
+        for chemin in glob.glob(os.path.join(racine(), '*', '*')):
+            try:
+                infos = os.stat(chemin)
+            except FileNotFoundError:
+                continue
+            fichiers.append((infos.st_mtime, infos.st_size, chemin))
+
+        total = sum(taille for _, taille, _ in fichiers)
+        for _, taille, chemin in sorted(fichiers):
+            if total <= taille_max:
+                break
+            if chemin.endswith('.tmp'):
+                continue
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+            total -= taille
+
+
+def invalider_classe(classe_id, periode_id=None):
+    """Supprime les bulletins en cache d'une classe pour une période (ou toutes)"""
+    if not os.path.isdir(racine()):
+        return
+    periode = '*' if periode_id is None else periode_id
+    for chemin in glob.glob(os.path.join(racine(), '*', f'c{classe_id}_p{periode}_*')):
+        try:
+            os.remove(chemin)
+        except FileNotFoundError:
+            pass
+
+
+def invalider_ecole(ecole_id):
+    """Supprime tous les bulletins en cache d'une école (changement d'en-tête)"""
+    shutil.rmtree(os.path.join(racine(), str(ecole_id)), ignore_errors=True)
+
+
+def _contenu(bulletin):
+    """Contenu d'un bulletin sans les horodatages de calcul (sans effet sur le rendu)"""
+    return {
+        **bulletin,
+        'moyennes_par_matiere': [
+            {cle: valeur for cle, valeur in moyenne.items() if cle != 'calculated_at'}
+            for moyenne in bulletin['moyennes_par_matiere']
+        ],
+    }
+
+
+def _pdf_eleve(ecole_id, classe_id, periode_id, bulletin, contexte, cle_contexte, ecrits):
+    """Chemin du PDF d'un élève, rendu si absent du cache (ajouté alors à ecrits)"""
+    prefixe = _prefixe(classe_id, periode_id, f"e{bulletin['eleve']['id']}", contexte['edition'])
+    nom = f"{prefixe}{empreinte(_contenu(bulletin), cle_contexte)}.pdf"
+    chemin = os.path.join(racine(), str(ecole_id or 0), nom)
+    if os.path.exists(chemin):
+        return chemin
+    ecrits.append(nom)
+    return _enregistrer(ecole_id, nom, lambda fichier: ecrire_pdf([bulletin], contexte, fichier))
+
+
+def bulletin_pdf_en_cache(classe, periode, mode, eleve_id=None):
+    """
+    Fichier ouvert d'une période clôturée déjà en cache (sans accès aux notes), ou None.
+    mode : 'classe' (PDF fusionné), 'eleves' (zip), ou 'eleve' avec eleve_id.
+    """
+    if not periode.est_cloturee:
+        return None
+    genre = f"e{eleve_id}" if mode == 'eleve' else mode
+    prefixe = _prefixe(classe.id, periode.id, genre, date.today())
+    chemin = _chercher(classe.ecole_id, prefixe)
+    return _ouvrir(chemin) if chemin else None
+
+
+def bulletins_pdf(classe, periode, donnees, mode):
+    """
+    Fichier ouvert des bulletins de `donnees` (assemblés pour la classe),
+    lu dans le cache ou rendu puis mis en cache.
+    mode : 'classe' (PDF fusionné), 'eleves' (zip d'un PDF par élève), 'eleve' (un élève).
+    """
+    ecole_id = classe.ecole_id
+    contexte = contexte_rendu(donnees, classe.ecole, periode.annee_scolaire.libelle)
+    cle_contexte = {
+        'version': VERSION_RENDU,
+        'annee': contexte['annee'],
+        'periode': contexte['periode_nom'],
+        'ecole': contexte['cle_entete'],
+        'edite_le': contexte['edite_le'],
+    }
+    bulletins = donnees['bulletins']
+    ecrits = []
+
+    if mode == 'eleve':
+        chemin = _pdf_eleve(ecole_id, classe.id, periode.id, bulletins[0], contexte, cle_contexte, ecrits)
+        return _servir(chemin, lambda fichier: ecrire_pdf(bulletins, contexte, fichier), ecrits)
+
+    if mode == 'eleves':
+        # Le zip réutilise les PDF par élève déjà en cache
+        prefixe = _prefixe(classe.id, periode.id, 'eleves', contexte['edition'])
+
+        def ecrire(fichier):
+            with zipfile.ZipFile(fichier, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for bulletin in bulletins:
+                    archive.write(
+                        _pdf_eleve(ecole_id, classe.id, periode.id, bulletin, contexte, cle_contexte, ecrits),
+                        nom_fichier_eleve(bulletin, donnees['periode_code']),
+                    )
+        extension = 'zip'
+    else:
+        prefixe = _prefixe(classe.id, periode.id, 'classe', contexte['edition'])
+
+        def ecrire(fichier):
+            ecrire_pdf(bulletins, contexte, fichier)
+        extension = 'pdf'
+
+    nom = f"{prefixe}{empreinte([_contenu(b) for b in bulletins], cle_contexte)}.{extension}"
+    chemin = os.path.join(racine(), str(ecole_id or 0), nom)
+    if not os.path.exists(chemin):
+        ecrits.append(nom)
+        chemin = _enregistrer(ecole_id, nom, ecrire)
+    return _servir(chemin, ecrire, ecrits)
+
+
+def _servir(chemin, ecrire, ecrits):
+    """
+    Ouvre le fichier à servir puis, si des fichiers viennent d'être écrits,
+    applique la limite de taille du cache (un fichier ouvert reste lisible
+    même s'il est évincé) : un fichier servi depuis le cache ne parcourt pas
+    l'arborescence. Si le fichier a disparu entre-temps, le rendu est refait
+    dans un fichier temporaire.
+    """
+    fichier = _ouvrir(chemin)
+    if fichier is None:
+        fichier = tempfile.TemporaryFile()
+        ecrire(fichier)
+        fichier.seek(0)
+    if ecrits:
+        evincer()
+    return fichier
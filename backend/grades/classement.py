@@ -0,0 +1,230 @@
+"""
+Moteur de classement d'une classe pour une période.
+
+Calcule en une seule requête, pour tous les élèves d'une classe :
+- la moyenne générale pondérée par les coefficients des matières
+- le nombre de notes et le nombre de matières moyennées
+- le rang "compétition" (1, 1, 3) et le rang dense (1, 1, 2)
+
+Les rangs sont calculés par des fonctions de fenêtre SQL quand la base
+les supporte, sinon en Python sur le résultat de la même requête.
+"""
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection
+from django.db.models import (
+    Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value,
+    When, Window,
+)
+from django.db.models.functions import Cast, Coalesce, DenseRank, Rank, Round
+
+from academic.models import Eleve
+from .models import Note, MoyenneEleve
+
+
+def arrondir(valeur):
+    """Arrondi à 2 décimales (demi vers le haut), comme ROUND() en SQL"""
+    if valeur is None:
+        return None
+    return float(Decimal(str(valeur)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+def attribuer_rangs(lignes, cle='moyenne_generale'):
+    """
+    Trie les lignes par moyenne décroissante et attribue les rangs.
+
+    - rang : rang "compétition" avec ex-aequo (1, 1, 3)
+    - rang_dense : rang sans saut (1, 1, 2)
+    - is_exaequo : True si plusieurs lignes partagent le même rang
+
+    Les lignes sans moyenne sont placées à la fin avec un rang None.
+    Le tri est stable : l'ordre d'entrée départage les égalités.
+    """
+    lignes.sort(key=lambda x: (x[cle] is None, -(x[cle] or 0)))
+
+    rang = 0
+    rang_dense = 0
+    precedente = None
+    effectifs = {}
+    for i, ligne in enumerate(lignes):
+        moyenne = ligne[cle]
+        if moyenne is None:
+            ligne['rang'] = None
+            ligne['rang_dense'] = None
+            continue
+        if i == 0 or moyenne != precedente:
+            rang = i + 1
+            rang_dense += 1
+        ligne['rang'] = rang
+        ligne['rang_dense'] = rang_dense
+        precedente = moyenne
+        effectifs[rang] = effectifs.get(rang, 0) + 1
+
+    for ligne in lignes:
+        ligne['is_exaequo'] = ligne['rang'] is not None and effectifs[ligne['rang']] > 1
+
+    return lignes
+
+
+def _ponderer(moyennes):
+    """
+    Annote des MoyenneEleve groupées (values) avec la somme des moyennes
+    pondérées par le coefficient de la matière et la somme des coefficients
+    """
+    # Cast explicite : SQLite stocke les décimaux ronds en entiers (division entière sinon)
+    coefficient = Cast('matiere__coefficient', FloatField())
+    return moyennes.annotate(
+        total_points=Sum(Cast('moyenne', FloatField()) * coefficient),
+        total_coefficients=Sum(coefficient),
+    )
+
+
+def _eleves_annotes(classe, periode, statut='actif'):
+    """Queryset des élèves de la classe annoté avec leurs agrégats pour la période"""
+    moyennes = _ponderer(
+        MoyenneEleve.objects.filter(eleve=OuterRef('pk'), periode=periode).values('eleve')
+    )
+    notes = Note.objects.filter(eleve=OuterRef('pk'), periode=periode).values('eleve')
+    points = moyennes.values('total_points')
+    coefficients = moyennes.values('total_coefficients')
+
+    queryset = Eleve.objects.filter(classe=classe)
+    if statut:
+        queryset = queryset.filter(statut=statut)
+
+    return queryset.annotate(
+        notes_count=Coalesce(
+            Subquery(notes.annotate(n=Count('id')).values('n'), output_field=IntegerField()), 0
+        ),
+        nombre_matieres=Coalesce(
+            Subquery(moyennes.annotate(n=Count('id')).values('n'), output_field=IntegerField()), 0
+        ),
+        total_points=Subquery(points, output_field=FloatField()),
+        total_coefficients=Subquery(coefficients, output_field=FloatField()),
+    ).annotate(
+        moyenne_generale=Case(
+            When(
+                total_coefficients__gt=0,
+                then=Round(F('total_points') / F('total_coefficients'), 2),
+            ),
+            default=Value(None),
+            output_field=FloatField(),
+        )
+    )
+
+
+def classement_classe(classe, periode, statut='actif'):
+    """
+    Classement complet d'une classe pour une période.
+
+    Retourne une liste de dicts triée par rang (élèves sans moyenne à la fin),
+    avec : eleve_id, matricule, nom, prenom, sexe, nom_complet, notes_count,
+    moyenne_generale, nombre_matieres, has_notes, rang, rang_dense, is_exaequo.
+    """
+    queryset = _eleves_annotes(classe, periode, statut)
+    champs = [
+        'id', 'matricule', 'nom', 'prenom', 'sexe',
+        'notes_count', 'nombre_matieres', 'moyenne_generale',
+    ]
+    ordre_moyenne = F('moyenne_generale').desc(nulls_last=True)
+    avec_fenetres = connection.features.supports_over_clause
+
+    if avec_fenetres:
+        queryset = queryset.annotate(
+            rang=Window(expression=Rank(), order_by=ordre_moyenne),
+            rang_dense=Window(expression=DenseRank(), order_by=ordre_moyenne),
+        )
+        champs += ['rang', 'rang_dense']
+
+    lignes = []
+    for row in queryset.order_by(ordre_moyenne, 'nom', 'prenom').values(*champs):
+        lignes.append({
+            'eleve_id': row['id'],
+            'matricule': row['matricule'],
+            'nom': row['nom'],
+            'prenom': row['prenom'],
+            'sexe': row['sexe'],
+            'nom_complet': f"{row['nom']} {row['prenom']}",
+            'notes_count': row['notes_count'],
+            'moyenne_generale': arrondir(row['moyenne_generale']),
+            'nombre_matieres': row['nombre_matieres'],
+            'has_notes': row['notes_count'] > 0,
+            'rang': row.get('rang'),
+            'rang_dense': row.get('rang_dense'),
+        })
+
+    if not avec_fenetres:
+        return attribuer_rangs(lignes)
+
+    effectifs = {}
+    for ligne in lignes:
+        if ligne['moyenne_generale'] is None:
+            # Les fonctions de fenêtre classent aussi les NULL : pas de rang sans moyenne
+            ligne['rang'] = None
+            ligne['rang_dense'] = None
+        else:
+            effectifs[ligne['rang']] = effectifs.get(ligne['rang'], 0) + 1
+    for ligne in lignes:
+        ligne['is_exaequo'] = ligne['rang'] is not None and effectifs[ligne['rang']] > 1
+
+    return lignes
+
+
+def moyennes_generales_annee(classe, annee_scolaire_id, statut='actif'):
+    """
+    Moyennes générales de chaque période d'une année pour les élèves d'une
+    classe, pondérées et arrondies comme dans classement_classe, en une requête.
+
+    Retourne {eleve_id: {periode_id: moyenne_generale}}.
+    """
+    moyennes = MoyenneEleve.objects.filter(
+        eleve__classe=classe, periode__annee_scolaire_id=annee_scolaire_id
+    )
+    if statut:
+        moyennes = moyennes.filter(eleve__statut=statut)
+
+    resultat = defaultdict(dict)
+    for row in _ponderer(moyennes.values('eleve', 'periode')).order_by():
+        if row['total_coefficients']:
+            resultat[row['eleve']][row['periode']] = arrondir(
+                row['total_points'] / row['total_coefficients']
+            )
+    return resultat
+
+
+def classement_materialise(classe, periode, statut='actif'):
+    """
+    Même résultat que classement_classe, lu dans la table MoyenneGenerale
+    (deux lectures indexées : élèves de la classe et lignes classées).
+    """
+    from .models import MoyenneGenerale
+
+    generales = {g.eleve_id: g for g in MoyenneGenerale.pour_classe(classe, periode)}
+    eleves = Eleve.objects.filter(classe=classe)
+    if statut:
+        eleves = eleves.filter(statut=statut)
+
+    lignes = []
+    for eleve in eleves.values('id', 'matricule', 'nom', 'prenom', 'sexe'):
+        generale = generales.get(eleve['id'])
+        notes_count = generale.nombre_notes if generale else 0
+        lignes.append({
+            'eleve_id': eleve['id'],
+            'matricule': eleve['matricule'],
+            'nom': eleve['nom'],
+            'prenom': eleve['prenom'],
+            'sexe': eleve['sexe'],
+            'nom_complet': f"{eleve['nom']} {eleve['prenom']}",
+            'notes_count': notes_count,
+            'moyenne_generale': float(generale.moyenne) if generale else None,
+            'nombre_matieres': generale.nombre_matieres if generale else 0,
+            'has_notes': notes_count > 0,
+            'rang': generale.rang if generale else None,
+            'rang_dense': generale.rang_dense if generale else None,
+            'is_exaequo': generale.est_exaequo if generale else False,
+        })
+
+    # Tri stable : rang croissant, élèves non classés à la fin (ordre alphabétique conservé)
+    lignes.sort(key=lambda x: (x['rang'] is None, x['rang'] or 0))
+    return lignes
@@ -0,0 +1,107 @@
+"""
+Export des feuilles de notes d'une période (CSV ou Excel).
+
+Une ligne par élève : une colonne par matière et type d'évaluation, la
+moyenne de chaque matière (MoyenneEleve), puis la moyenne générale et le
+rang (MoyenneGenerale.pour_classe). Les données sont lues classe par classe (quatre
+requêtes par classe) et les lignes produites au fil de l'eau :
+- CSV : envoyé ligne à ligne (StreamingHttpResponse) ;
+- Excel : classeur openpyxl en mode write_only, écrit dans un fichier temporaire.
+La mémoire utilisée reste celle d'une classe, quelle que soit la taille de l'école.
+"""
+import csv
+import tempfile
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+from academic.models import Eleve
+from . import referentiel
+from .models import Note, MoyenneEleve, MoyenneGenerale
+
+
+class Echo:
+    """Pseudo-fichier : write() retourne la ligne au lieu de l'écrire (csv en flux)"""
+
+    def write(self, valeur):
+        return valeur
+
+
+def colonnes_referentiel(ecole):
+    """Matières de l'école et types d'évaluation (référentiel en cache), dans l'ordre des colonnes"""
+    matieres = sorted(referentiel.matieres(ecole.id).values(), key=lambda matiere: (matiere.nom, matiere.id))
+    return matieres, list(referentiel.types_evaluation().values())
+
+
+def entete(matieres, types):
+    colonnes = ['Classe', 'Matricule', 'Nom', 'Prénom']
+    for matiere in matieres:
+        colonnes += [f"{matiere.code} {type_evaluation.get_nom_display()}" for type_evaluation in types]
+        colonnes.append(f"{matiere.code} Moyenne")
+    return colonnes + ['Moyenne générale', 'Rang']
+
+
+def lignes_feuille(periode, classes, matieres, types):
+    """Produit une ligne (liste de valeurs, None si absente) par élève actif de chaque classe"""
+    for classe in classes:
+        notes = {
+            (eleve_id, matiere_id, type_id): valeur
+            for eleve_id, matiere_id, type_id, valeur in Note.objects.filter(
+                periode=periode, eleve__classe=classe
+            ).values_list('eleve_id', 'matiere_id', 'type_evaluation_id', 'valeur').order_by()
+        }
+        moyennes = {
+            (eleve_id, matiere_id): moyenne
+            for eleve_id, matiere_id, moyenne in MoyenneEleve.objects.filter(
+                periode=periode, eleve__classe=classe
+            ).values_list('eleve_id', 'matiere_id', 'moyenne').order_by()
+        }
+        # Classement calculé au premier accès s'il manque (migration, matière modifiée)
+        generales = {
+            ligne.eleve_id: (ligne.moyenne, ligne.rang)
+            for ligne in MoyenneGenerale.pour_classe(classe, periode)
+        }
+
+        eleves = Eleve.objects.filter(classe=classe, statut='actif').order_by('nom', 'prenom').values_list(
+            'id', 'matricule', 'nom', 'prenom'
+        )
+        for eleve_id, matricule, nom, prenom in eleves:
+            ligne = [classe.nom, matricule, nom, prenom]
+            for matiere in matieres:
+                ligne += [notes.get((eleve_id, matiere.id, type_evaluation.id)) for type_evaluation in types]
+                ligne.append(moyennes.get((eleve_id, matiere.id)))
+            ligne += list(generales.get(eleve_id, (None, None)))
+            yield ligne
+
+
+def flux_csv(colonnes, lignes):
+    """Lignes CSV encodées au fil de l'eau (BOM pour Excel en tête)"""
+    writer = csv.writer(Echo())
+    yield '﻿' + writer.writerow(colonnes)
+    for ligne in lignes:
+        yield writer.writerow(['' if valeur is None else valeur for valeur in ligne])
+
+
+def classeur_xlsx(colonnes, lignes, titre):
+    """Fichier temporaire (positionné au début) contenant le classeur Excel"""
+    classeur = openpyxl.Workbook(write_only=True)
+    feuille = classeur.create_sheet(title=titre[:31])
+    feuille.freeze_panes = 'E2'
+
+    style_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    style_font = Font(color="FFFFFF", bold=True)
+    cellules = []
+    for colonne in colonnes:
+        cellule = WriteOnlyCell(feuille, value=colonne)
+        cellule.fill = style_fill
+        cellule.font = style_font
+        cellules.append(cellule)
+    feuille.append(cellules)
+    for ligne in lignes:
+        feuille.append(ligne)
+
+    fichier = tempfile.TemporaryFile()
+    classeur.save(fichier)
+    fichier.seek(0)
+    return fichier
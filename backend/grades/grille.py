@@ -0,0 +1,79 @@
+"""
+Grille des notes d'une classe pour une période, en colonnes.
+
+Au lieu d'une liste d'objets note (un dictionnaire sérialisé par note, avec
+ses relations), la grille décrit une fois les élèves, les matières et les
+types d'évaluation, chacun sous forme de colonnes parallèles, puis les notes
+dans un seul tableau dense ``valeurs`` (None si la note n'est pas saisie) :
+
+    valeurs[(e * M + m) * T + t]  ->  note de l'élève e, matière m, type t
+
+où ``dimensions = [E, M, T]``. Notes et coefficients sont des nombres (float,
+sérialisés en nombres JSON et non en chaînes décimales). Les élèves sont lus en une requête, les notes
+en une requête values_list (sans instancier de modèle) ; matières et types
+viennent du référentiel en cache (grades.referentiel).
+"""
+from academic.models import Eleve
+from .exports import colonnes_referentiel
+from .models import Note
+
+
+def grille_notes(classe, periode, matiere_id=None):
+    """
+    Grille des notes des élèves actifs de la classe (dictionnaire prêt à sérialiser).
+    matiere_id (entier) restreint la grille à une matière.
+    """
+    matieres, types = colonnes_referentiel(classe.ecole)
+    if matiere_id is not None:
+        matieres = [matiere for matiere in matieres if matiere.id == matiere_id]
+
+    eleves = list(
+        Eleve.objects.filter(classe=classe, statut='actif').order_by('nom', 'prenom').values_list(
+            'id', 'matricule', 'nom', 'prenom'
+        )
+    )
+
+    # Position de chaque élève, matière et type dans le tableau dense
+    rang_eleve = {eleve[0]: rang for rang, eleve in enumerate(eleves)}
+    rang_matiere = {matiere.id: rang for rang, matiere in enumerate(matieres)}
+    rang_type = {type_evaluation.id: rang for rang, type_evaluation in enumerate(types)}
+    nb_matieres, nb_types = len(matieres), len(types)
+
+    valeurs = [None] * (len(eleves) * nb_matieres * nb_types)
+    notes = Note.objects.filter(
+        ecole_id=classe.ecole_id, periode=periode, eleve__classe=classe
+    ).values_list('eleve_id', 'matiere_id', 'type_evaluation_id', 'valeur').order_by()
+    if matiere_id is not None:
+        notes = notes.filter(matiere_id=matiere_id)
+    for eleve_id, note_matiere_id, type_id, valeur in notes:
+        e = rang_eleve.get(eleve_id)
+        m = rang_matiere.get(note_matiere_id)
+        t = rang_type.get(type_id)
+        # Élève inactif ou matière hors référentiel : hors de la grille
+        if e is None or m is None or t is None:
+            continue
+        valeurs[(e * nb_matieres + m) * nb_types + t] = float(valeur)
+
+    return {
+        'classe': {'id': classe.id, 'nom': classe.nom},
+        'periode': {'id': periode.id, 'nom': periode.get_nom_display(), 'est_cloturee': periode.est_cloturee},
+        'eleves': {
+            'id': [eleve[0] for eleve in eleves],
+            'matricule': [eleve[1] for eleve in eleves],
+            'nom': [eleve[2] for eleve in eleves],
+            'prenom': [eleve[3] for eleve in eleves],
+        },
+        'matieres': {
+            'id': [matiere.id for matiere in matieres],
+            'code': [matiere.code for matiere in matieres],
+            'nom': [matiere.nom for matiere in matieres],
+            'coefficient': [float(matiere.coefficient) for matiere in matieres],
+        },
+        'types': {
+            'id': [type_evaluation.id for type_evaluation in types],
+            'nom': [type_evaluation.get_nom_display() for type_evaluation in types],
+            'coefficient': [float(type_evaluation.coefficient) for type_evaluation in types],
+        },
+        'dimensions': [len(eleves), nb_matieres, nb_types],
+        'valeurs': valeurs,
+    }
@@ -0,0 +1,216 @@
+"""
+Import en masse de notes (CSV ou Excel), au format de exemple_import_notes.csv :
+
+    matricule,matiere,type_evaluation,note,date_evaluation,commentaire
+
+Le fichier est lu en flux (academic.imports.lire_lignes). Les élèves de
+l'école sont chargés une fois par fichier, les matières et les types
+d'évaluation lus dans le référentiel en cache (grades.referentiel), dans des
+tables de correspondance ; chaque lot de lignes est ensuite
+validé en mémoire et enregistré par un seul bulk_create(update_conflicts=True).
+Les moyennes des couples (élève, matière) touchés sont recalculées une seule
+fois, en fin d'import.
+"""
+import re
+import time
+import unicodedata
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import IntegrityError, transaction
+
+from academic.imports import TAILLE_LOT, LigneInvalide, date_cellule, texte_cellule
+from academic.models import Eleve
+from . import referentiel
+from .models import Note, MoyenneEleve
+
+NOTE_MAX = Decimal('10')
+
+
+def cle_recherche(texte):
+    """'Contrôle ' -> 'controle', 'Mathématiques' -> 'mathematiques'"""
+    texte = unicodedata.normalize('NFKD', str(texte or '')).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'\s+', ' ', texte.strip().lower())
+
+
+def _valeur(valeur):
+    texte = texte_cellule(valeur).replace(',', '.')
+    if not texte:
+        raise LigneInvalide("note manquante")
+    try:
+        note = Decimal(texte).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise LigneInvalide(f"note invalide '{texte}'")
+    if not Decimal('0') <= note <= NOTE_MAX:
+        raise LigneInvalide(f"note {texte} hors limites (0 à {NOTE_MAX})")
+    return note
+
+
+class ImportNotes:
+    """
+    Import de notes d'une période pour une école, par lots.
+
+    professeur : auteur des notes ; s'il est fourni, seules les notes des
+    élèves de ses classes (professeur principal) sont acceptées.
+
+    rapport : une entrée par ligne {'ligne', 'statut' ('importee'/'ignoree'/
+    'erreur'), 'matricule', 'message'} ; importees : nombre de notes enregistrées ;
+    cles : couples (eleve_id, matiere_id) touchés.
+    """
+
+    def __init__(self, periode, ecole, professeur=None, taille_lot=TAILLE_LOT):
+        self.periode = periode
+        self.ecole = ecole
+        self.professeur = professeur
+        self.taille_lot = taille_lot
+
+        # Tables de correspondance construites une fois par fichier
+        self.eleves = {
+            matricule: (eleve_id, titulaire_id)
+            for matricule, eleve_id, titulaire_id in Eleve.objects.filter(ecole=ecole).values_list(
+                'matricule', 'id', 'classe__professeur_principal_id'
+            )
+        }
+        self.matieres = {}
+        for matiere in referentiel.matieres(ecole.id).values():
+            self.matieres.setdefault(cle_recherche(matiere.code), matiere.id)
+            self.matieres[cle_recherche(matiere.nom)] = matiere.id
+        self.types = {}
+        for type_evaluation in referentiel.types_evaluation().values():
+            self.types[cle_recherche(type_evaluation.nom)] = type_evaluation.id
+            self.types[cle_recherche(type_evaluation.get_nom_display())] = type_evaluation.id
+
+        self.cles = set()
+        self.importees = 0
+        self.rapport = []
+        self.lignes = 0
+        self.duree = 0.0
+        self.moyennes = 0
+
+    @property
+    def erreurs(self):
+        return [f"Ligne {l['ligne']}: {l['message']}" for l in self.rapport if l['statut'] == 'erreur']
+
+    @property
+    def debit(self):
+        """Lignes traitées par seconde"""
+        return round(self.lignes / self.duree) if self.duree else None
+
+    def _erreur(self, numero, message, matricule=''):
+        self.rapport.append({'ligne': numero, 'statut': 'erreur', 'matricule': matricule, 'message': message})
+
+    def importer(self, lignes, recalculer=True):
+        """
+        Importe un itérable de (numéro de ligne, dict), puis recalcule les
+        moyennes touchées (sauf recalculer=False) ; retourne self
+        """
+        debut = time.monotonic()
+        lot = []
+        for numero, row in lignes:
+            lot.append((numero, row))
+            if len(lot) >= self.taille_lot:
+                self.importer_lot(lot)
+                lot = []
+        if lot:
+            self.importer_lot(lot)
+        if recalculer:
+            self.recalculer()
+        self.rapport.sort(key=lambda l: l['ligne'])
+        self.duree = time.monotonic() - debut
+        return self
+
+    def preparer(self, row):
+        """Valide une ligne et retourne (eleve_id, matiere_id, type_evaluation_id, valeur, date, commentaire)"""
+        matricule = texte_cellule(row.get('matricule'))
+        if not matricule:
+            raise LigneInvalide("matricule manquant")
+        eleve = self.eleves.get(matricule)
+        if eleve is None:
+            raise LigneInvalide(f"élève {matricule} introuvable dans l'école")
+        eleve_id, titulaire_id = eleve
+        if self.professeur is not None and titulaire_id != self.professeur.id:
+            raise LigneInvalide(f"élève {matricule}: pas autorisé (hors de votre classe)")
+
+        matiere = texte_cellule(row.get('matiere'))
+        matiere_id = self.matieres.get(cle_recherche(matiere))
+        if matiere_id is None:
+            raise LigneInvalide(f"matière '{matiere}' introuvable")
+
+        type_texte = texte_cellule(row.get('type_evaluation'))
+        type_id = self.types.get(cle_recherche(type_texte))
+        if type_id is None:
+            raise LigneInvalide(f"type d'évaluation '{type_texte}' introuvable (Devoir, Contrôle ou Composition)")
+
+        date_evaluation = date_cellule(row.get('date_evaluation'), "date d'évaluation")
+        if not self.periode.date_debut <= date_evaluation <= self.periode.date_fin:
+            raise LigneInvalide(f"date {date_evaluation.isoformat()} hors de la période")
+
+        return eleve_id, matiere_id, type_id, _valeur(row.get('note')), date_evaluation, texte_cellule(row.get('commentaire'))
+
+    def importer_lot(self, lot):
+        """Valide puis enregistre un lot de lignes (une transaction) ; retourne le nombre de notes enregistrées"""
+        # Une seule note par (élève, matière, type) dans le lot : la dernière ligne l'emporte
+        saisies = {}
+        for numero, row in lot:
+            matricule = texte_cellule(row.get('matricule'))
+            try:
+                eleve_id, matiere_id, type_id, valeur, date_evaluation, commentaire = self.preparer(row)
+            except LigneInvalide as e:
+                self._erreur(numero, str(e), matricule)
+                continue
+            cle = (eleve_id, matiere_id, type_id)
+            if cle in saisies:
+                precedent = saisies[cle][0]
+                self.rapport.append({
+                    'ligne': precedent[0], 'statut': 'ignoree', 'matricule': precedent[1],
+                    'message': f"remplacée par la ligne {numero}",
+                })
+            saisies[cle] = ((numero, matricule), Note(
+                eleve_id=eleve_id,
+                matiere_id=matiere_id,
+                periode=self.periode,
+                ecole=self.ecole,
+                type_evaluation_id=type_id,
+                valeur=valeur,
+                date_evaluation=date_evaluation,
+                professeur=self.professeur,
+                commentaire=commentaire,
+            ))
+
+        self.lignes += len(lot)
+        if not saisies:
+            return 0
+        try:
+            with transaction.atomic():
+                # bulk_create n'émet pas post_save : pas de recalcul note par note
+                Note.objects.bulk_create(
+                    [note for _, note in saisies.values()],
+                    update_conflicts=True,
+                    unique_fields=['eleve', 'matiere', 'periode', 'type_evaluation'],
+                    update_fields=['ecole', 'valeur', 'date_evaluation', 'professeur', 'commentaire', 'updated_at'],
+                )
+        except IntegrityError as e:
+            for (numero, matricule), _ in saisies.values():
+                self._erreur(numero, f"lot rejeté par la base ({e})", matricule)
+            return 0
+
+        for (numero, matricule), note in saisies.values():
+            self.rapport.append({'ligne': numero, 'statut': 'importee', 'matricule': matricule, 'message': ''})
+            self.cles.add((note.eleve_id, note.matiere_id))
+        self.importees += len(saisies)
+        return len(saisies)
+
+    def recalculer(self):
+        """Recalcule en une passe les moyennes des couples (élève, matière) touchés"""
+        with transaction.atomic():
+            self.moyennes = len(MoyenneEleve.recalculer_moyennes(self.periode, self.cles))
+        return self.moyennes
+
+    def resume(self):
+        """Compteurs de l'import (réponse de l'API, résultat de tâche)"""
+        return {
+            'lignes': self.lignes,
+            'imported': self.importees,
+            'moyennes_recalculees': self.moyennes,
+            'duree': round(self.duree, 3),
+            'lignes_par_seconde': self.debit,
+        }
@@ -1,11 +1,26 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from django.core.management.base import BaseCommand
-from grades.models import MoyenneEleve, Periode, Note
-from academic.models import Eleve
-from grades.models import Matiere
+from django.db import connection, connections
+from grades.models import Periode, Note
+from grades.recalcul import recalculer_classe
+
+
+def _initialiser_worker():
+    """Initialisation d'un processus worker (aucune connexion partagée avec le parent)"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _traiter(tache):
+    classe_id, periode_id, eleve_id, simulation = tache
+    return recalculer_classe(classe_id, periode_id, eleve_id=eleve_id, simulation=simulation)
 
 
 class Command(BaseCommand):
-    help = 'Calcule ou recalcule toutes les moyennes pour tous les élèves'
+    help = 'Calcule ou recalcule toutes les moyennes, classe par classe (option --workers pour paralléliser)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,79 +33,110 @@ class Command(BaseCommand):
             type=int,
             help='ID de l\'élève à traiter (sinon tous)'
         )
+        parser.add_argument(
+            '--ecole',
+            type=int,
+            help='ID de l\'école à traiter (sinon toutes)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Nombre de processus (une tâche = une classe pour une période)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher les différences sans rien enregistrer'
+        )
 
     def handle(self, *args, **options):
         periode_id = options.get('periode')
         eleve_id = options.get('eleve')
+        ecole_id = options.get('ecole')
+        workers = max(1, options['workers'])
+        simulation = options['dry_run']
 
-        self.stdout.write(self.style.SUCCESS('🧮 CALCUL DES MOYENNES'))
+        titre = '🧮 CALCUL DES MOYENNES' + (' (simulation)' if simulation else '')
+        self.stdout.write(self.style.SUCCESS(titre))
         self.stdout.write('=' * 60)
 
         # Filtrer les périodes
+        periodes = Periode.objects.all()
         if periode_id:
-            periodes = Periode.objects.filter(id=periode_id)
-        else:
-            periodes = Periode.objects.all()
+            periodes = periodes.filter(id=periode_id)
+        if ecole_id:
+            periodes = periodes.filter(annee_scolaire__ecole_id=ecole_id)
 
         if not periodes.exists():
             self.stdout.write(self.style.ERROR('❌ Aucune période trouvée'))
             return
 
-        # Filtrer les élèves
+        # Une tâche par couple (classe, période) ayant des notes d'élèves actifs
+        notes = Note.objects.filter(periode__in=periodes, eleve__statut='actif')
         if eleve_id:
-            eleves = Eleve.objects.filter(id=eleve_id, statut='actif')
-        else:
-            eleves = Eleve.objects.filter(statut='actif')
-
-        if not eleves.exists():
-            self.stdout.write(self.style.ERROR('❌ Aucun élève trouvé'))
+            notes = notes.filter(eleve_id=eleve_id)
+        if ecole_id:
+            notes = notes.filter(eleve__classe__ecole_id=ecole_id)
+        taches = [
+            (classe_id, p_id, eleve_id, simulation)
+            for classe_id, p_id in notes.values_list('eleve__classe_id', 'periode_id').order_by().distinct()
+        ]
+
+        if not taches:
+            self.stdout.write(self.style.ERROR('❌ Aucune note trouvée'))
             return
 
-        total_moyennes = 0
-
-        for periode in periodes:
-            self.stdout.write(f'\n📅 {periode.get_nom_display()}')
-            self.stdout.write('-' * 60)
-
-            periode_moyennes = 0
-
-            for eleve in eleves:
-                # Trouver les matières pour lesquelles l'élève a des notes
-                matieres_avec_notes = Matiere.objects.filter(
-                    notes__eleve=eleve,
-                    notes__periode=periode
-                ).distinct()
-
-                if not matieres_avec_notes.exists():
-                    continue
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite n'accepte qu'un écrivain à la fois
+            self.stdout.write(self.style.WARNING('⚠️  SQLite : --workers ignoré, traitement séquentiel'))
+            workers = 1
 
-                self.stdout.write(f'\n👤 {eleve.nom} {eleve.prenom} ({eleve.classe.nom})')
+        self.stdout.write(f'📚 {len(taches)} classe(s)/période(s) à traiter avec {workers} processus')
 
-                for matiere in matieres_avec_notes:
-                    # Calculer la moyenne
-                    moyenne = MoyenneEleve.calculer_moyenne(eleve, matiere, periode)
+        totaux = {'cles': 0, 'nouvelles': 0, 'modifiees': 0, 'inchangees': 0}
+        debut = time.monotonic()
+        pas = max(1, len(taches) // 20)
 
-                    if moyenne:
-                        periode_moyennes += 1
-                        total_moyennes += 1
-                        self.stdout.write(
-                            f'   ✅ {matiere.nom}: {moyenne.moyenne}/10'
-                        )
+        for i, compteurs in enumerate(self._executer(taches, workers), start=1):
+            for cle, valeur in compteurs.items():
+                totaux[cle] += valeur
+            if i % pas == 0 or i == len(taches):
+                duree = time.monotonic() - debut
+                self.stdout.write(
+                    f"   ⏳ {i}/{len(taches)} — {totaux['cles']} moyenne(s), "
+                    f"{totaux['cles'] / duree if duree else 0:.0f}/s"
+                )
 
-            self.stdout.write(
-                self.style.SUCCESS(f'\n   📊 {periode_moyennes} moyenne(s) calculée(s) pour cette période')
-            )
+        duree = time.monotonic() - debut
 
         # Résumé final
         self.stdout.write('\n' + '=' * 60)
         self.stdout.write(self.style.SUCCESS('✨ CALCUL TERMINÉ !'))
         self.stdout.write('=' * 60)
         self.stdout.write(f'📊 RÉSUMÉ:')
-        self.stdout.write(f'   • Périodes traitées: {periodes.count()}')
-        self.stdout.write(f'   • Élèves traités: {eleves.count()}')
-        self.stdout.write(f'   • Moyennes calculées: {total_moyennes}')
-        self.stdout.write('=' * 60)
-        self.stdout.write('')
-        self.stdout.write(self.style.SUCCESS('💡 Conseil:'))
-        self.stdout.write('   Actualisez la page frontend pour voir les moyennes !')
+        self.stdout.write(f'   • Classes/périodes traitées: {len(taches)}')
+        self.stdout.write(f"   • Moyennes examinées: {totaux['cles']}")
+        verbe = 'à créer' if simulation else 'créées'
+        self.stdout.write(f"   • Nouvelles ({verbe}): {totaux['nouvelles']}")
+        verbe = 'à mettre à jour' if simulation else 'mises à jour'
+        self.stdout.write(f"   • Modifiées ({verbe}): {totaux['modifiees']}")
+        self.stdout.write(f"   • Inchangées: {totaux['inchangees']}")
+        self.stdout.write(
+            f"   • Durée: {duree:.1f}s ({totaux['cles'] / duree if duree else 0:.0f} moyennes/s)"
+        )
         self.stdout.write('=' * 60)
+
+    def _executer(self, taches, workers):
+        """Produit les compteurs de chaque tâche, au fil de l'eau"""
+        if workers == 1:
+            for tache in taches:
+                yield _traiter(tache)
+            return
+
+        # Les processus ne doivent pas hériter des connexions ouvertes du parent
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_worker) as executor:
+            futures = [executor.submit(_traiter, tache) for tache in taches]
+            for future in as_completed(futures):
+                yield future.result()
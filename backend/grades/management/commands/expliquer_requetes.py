@@ -0,0 +1,100 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from academic.models import Classe, Eleve, MatiereClasse
+from grades.models import Note, MoyenneEleve, MoyenneGenerale
+
+# Parcours complet d'une table (SQLite : SCAN sans index, PostgreSQL : Seq Scan)
+PARCOURS = re.compile(r'\bSCAN (?:TABLE )?"?(\w+)"?( USING)?|Seq Scan on "?(\w+)"?')
+
+# Petites tables de référence : un parcours complet y est normal
+TABLES_REFERENCE = {
+    'academic_ecole', 'academic_anneescolaire', 'academic_matiere',
+    'grades_periode', 'grades_typeevaluation',
+}
+
+
+def requetes_principales(ecole_id, periode_id, classe_id, eleve_id, professeur_id):
+    """Querysets émis par les principaux endpoints, pour des identifiants réels"""
+    return {
+        'notes (liste enseignant)': Note.objects.filter(
+            ecole_id=ecole_id, periode_id=periode_id, eleve__classe_id__in=[classe_id]
+        ),
+        'notes (export classe)': Note.objects.filter(
+            periode_id=periode_id, eleve__classe_id=classe_id
+        ).values_list('eleve_id', 'matiere_id', 'type_evaluation_id', 'valeur').order_by(),
+        'notes (élève, période)': Note.objects.filter(eleve_id=eleve_id, periode_id=periode_id),
+        'moyennes (liste)': MoyenneEleve.objects.filter(ecole_id=ecole_id, periode_id=periode_id),
+        'moyennes (élève, période)': MoyenneEleve.objects.filter(eleve_id=eleve_id, periode_id=periode_id),
+        'moyennes générales (classement)': MoyenneGenerale.objects.filter(
+            classe_id=classe_id, periode_id=periode_id
+        ).order_by('rang'),
+        'élèves actifs (classe)': Eleve.objects.filter(classe_id=classe_id, statut='actif'),
+        'élèves actifs (école)': Eleve.objects.filter(ecole_id=ecole_id, statut='actif'),
+        'classes (école)': Classe.objects.filter(ecole_id=ecole_id),
+        'classes (titulaire)': Classe.objects.filter(professeur_principal_id=professeur_id),
+        'enseignements (professeur)': MatiereClasse.objects.filter(professeur_id=professeur_id),
+    }
+
+
+def parcours_complets(plan):
+    """Tables parcourues entièrement d'après un plan EXPLAIN (hors tables de référence)"""
+    tables = {scan or seq_scan for scan, index, seq_scan in PARCOURS.findall(plan) if not index}
+    return sorted(tables - TABLES_REFERENCE)
+
+
+class Command(BaseCommand):
+    help = 'Affiche le plan (EXPLAIN) des requêtes des principaux endpoints et signale les parcours complets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ecole',
+            type=int,
+            help='ID de l\'école dont les données servent d\'exemple (sinon celle qui a le plus de notes)'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Échoue si un parcours complet est détecté (intégration continue)'
+        )
+
+    def _exemple(self, ecole_id):
+        notes = Note.objects.all()
+        if ecole_id:
+            notes = notes.filter(ecole_id=ecole_id)
+        note = notes.select_related('eleve__classe').order_by('-id').first()
+        if note is None:
+            raise CommandError(
+                'Aucune note : peupler la base (populate_db, generate_notes) avant de vérifier les plans'
+            )
+        classe = note.eleve.classe
+        return note.ecole_id, note.periode_id, classe.id, note.eleve_id, classe.professeur_principal_id
+
+    def handle(self, *args, **options):
+        exemple = self._exemple(options.get('ecole'))
+
+        self.stdout.write(self.style.SUCCESS(f'🔎 PLANS DES REQUÊTES ({connection.vendor})'))
+        self.stdout.write('=' * 60)
+        signalees = {}
+        for nom, queryset in requetes_principales(*exemple).items():
+            plan = queryset.explain()
+            tables = parcours_complets(plan)
+            if tables:
+                signalees[nom] = tables
+                self.stdout.write(self.style.WARNING(f'⚠️  {nom} : parcours complet de {", ".join(tables)}'))
+            else:
+                self.stdout.write(f'✅ {nom}')
+            if tables or options['verbosity'] > 1:
+                for ligne in plan.splitlines():
+                    self.stdout.write(f'      {ligne}')
+
+        self.stdout.write('=' * 60)
+        if not signalees:
+            self.stdout.write(self.style.SUCCESS('✨ Aucun parcours complet'))
+            return
+        message = f'{len(signalees)} requête(s) avec parcours complet'
+        if options['strict']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from datetime import date, timedelta
 from grades.models import Periode, TypeEvaluation, Note, MoyenneEleve
+from grades.recalcul import differer
 from academic.models import Eleve, Matiere
 from users.models import Professeur
 import random
@@ -154,11 +155,13 @@ class Command(BaseCommand):
             self.stdout.write(f'\n   🧮 Calcul des moyennes pour {periode.get_nom_display()}...')
             moyennes_count = 0
             
-            for eleve in eleves:
-                for matiere in matieres:
-                    moyenne = MoyenneEleve.calculer_moyenne(eleve, matiere, periode)
-                    if moyenne:
-                        moyennes_count += 1
+            # Re-classement différé : une fois par classe, en fin de boucle
+            with differer():
+                for eleve in eleves:
+                    for matiere in matieres:
+                        moyenne = MoyenneEleve.calculer_moyenne(eleve, matiere, periode)
+                        if moyenne:
+                            moyennes_count += 1
             
             self.stdout.write(
                 self.style.SUCCESS(f'   ✅ {moyennes_count} moyennes calculées')
@@ -0,0 +1,87 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from academic.imports import lire_lignes, LigneInvalide, TAILLE_LOT
+from grades.imports import ImportNotes
+from grades.models import Periode
+from users.models import Professeur
+
+
+class Command(BaseCommand):
+    help = 'Importe des notes depuis un fichier CSV ou Excel (format exemple_import_notes.csv)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fichier',
+            help='Chemin du fichier .csv ou .xlsx'
+        )
+        parser.add_argument(
+            '--periode',
+            type=int,
+            required=True,
+            help='ID de la période des notes (détermine l\'école)'
+        )
+        parser.add_argument(
+            '--professeur',
+            type=int,
+            help='ID du professeur auteur des notes (limite l\'import à ses classes)'
+        )
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=TAILLE_LOT,
+            help='Nombre de lignes enregistrées par transaction'
+        )
+
+    def handle(self, *args, **options):
+        chemin = options['fichier']
+        try:
+            periode = Periode.objects.select_related('annee_scolaire__ecole').get(id=options['periode'])
+        except Periode.DoesNotExist:
+            raise CommandError(f"Période {options['periode']} introuvable")
+        if periode.est_cloturee:
+            raise CommandError(f'{periode} est clôturée')
+
+        professeur = None
+        if options.get('professeur'):
+            try:
+                professeur = Professeur.objects.get(id=options['professeur'])
+            except Professeur.DoesNotExist:
+                raise CommandError(f"Professeur {options['professeur']} introuvable")
+
+        self.stdout.write(self.style.SUCCESS('📥 IMPORT DES NOTES'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'📄 {chemin} → {periode}')
+
+        import_notes = ImportNotes(
+            periode, periode.annee_scolaire.ecole, professeur=professeur,
+            taille_lot=max(1, options['taille_lot'])
+        )
+        try:
+            with open(chemin, 'rb') as fichier:
+                import_notes.importer(
+                    lire_lignes(File(fichier, name=os.path.basename(chemin)), colonne_requise='matricule')
+                )
+        except FileNotFoundError:
+            raise CommandError(f'Fichier introuvable : {chemin}')
+        except LigneInvalide as e:
+            raise CommandError(str(e))
+
+        for erreur in import_notes.erreurs[:20]:
+            self.stdout.write(self.style.WARNING(f'   ⚠️  {erreur}'))
+        if len(import_notes.erreurs) > 20:
+            self.stdout.write(f'   ... et {len(import_notes.erreurs) - 20} autre(s) erreur(s)')
+
+        resume = import_notes.resume()
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('✨ IMPORT TERMINÉ !'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'📊 RÉSUMÉ:')
+        self.stdout.write(f"   • Lignes lues: {resume['lignes']}")
+        self.stdout.write(f"   • Notes importées: {resume['imported']}")
+        self.stdout.write(f'   • Erreurs: {len(import_notes.erreurs)}')
+        self.stdout.write(f"   • Moyennes recalculées: {resume['moyennes_recalculees']}")
+        self.stdout.write(f"   • Durée: {resume['duree']:.1f}s ({resume['lignes_par_seconde'] or 0} lignes/s)")
+        self.stdout.write('=' * 60)
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from grades.recalcul import traiter_file, statistiques, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = 'Worker : traite la file des moyennes à recalculer (RECALCUL_MOYENNES_MODE=file)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--boucle',
+            action='store_true',
+            help='Tourner en continu au lieu de vider la file une seule fois'
+        )
+        parser.add_argument(
+            '--intervalle',
+            type=float,
+            default=2.0,
+            help='Pause en secondes quand la file est vide (mode --boucle)'
+        )
+        parser.add_argument(
+            '--lot',
+            type=int,
+            default=TAILLE_LOT,
+            help='Nombre de clés traitées par lot'
+        )
+
+    def handle(self, *args, **options):
+        boucle = options['boucle']
+        intervalle = options['intervalle']
+        lot = options['lot']
+
+        self.stdout.write(self.style.SUCCESS('🧮 TRAITEMENT DE LA FILE DE RECALCUL'))
+        total = 0
+        debut = time.monotonic()
+
+        try:
+            while True:
+                traites = traiter_file(limite=lot)
+                total += traites
+                if traites:
+                    self.stdout.write(f'   ✅ {traites} moyenne(s) recalculée(s)')
+                    continue
+                if not boucle:
+                    break
+                time.sleep(intervalle)
+        except KeyboardInterrupt:
+            pass
+
+        duree = time.monotonic() - debut
+        compteurs = statistiques()
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'📊 {total} clé(s) traitée(s) en {duree:.1f}s')
+        self.stdout.write(
+            f"   • Recalculées: {compteurs['recalcules']} | Fusionnées: {compteurs['fusionnes']}"
+        )
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from grades.taches import traiter_prochaine, reprendre_interrompues
+
+
+class Command(BaseCommand):
+    help = 'Worker : exécute les tâches de fond en attente (recalculs, imports...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--boucle',
+            action='store_true',
+            help='Tourner en continu au lieu de vider la file une seule fois'
+        )
+        parser.add_argument(
+            '--intervalle',
+            type=float,
+            default=2.0,
+            help='Pause en secondes quand aucune tâche n\'est en attente (mode --boucle)'
+        )
+        parser.add_argument(
+            '--reprendre',
+            action='store_true',
+            help='Remettre en attente les tâches restées en cours (worker arrêté) avant de commencer'
+        )
+
+    def handle(self, *args, **options):
+        boucle = options['boucle']
+        intervalle = options['intervalle']
+
+        self.stdout.write(self.style.SUCCESS('⚙️  TRAITEMENT DES TÂCHES'))
+        executees = 0
+
+        if options['reprendre']:
+            reprises = reprendre_interrompues()
+            self.stdout.write(f'   ↻ {reprises} tâche(s) interrompue(s) remise(s) en attente')
+
+        try:
+            while True:
+                tache = traiter_prochaine()
+                if tache is not None:
+                    executees += 1
+                    style = self.style.SUCCESS if tache.statut == 'terminee' else self.style.ERROR
+                    self.stdout.write(style(
+                        f'   {tache} : {tache.traites}/{tache.total} ligne(s), '
+                        f'{tache.debit or 0} lignes/s, {len(tache.erreurs)} erreur(s)'
+                    ))
+                    continue
+                if not boucle:
+                    break
+                time.sleep(intervalle)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'📊 {executees} tâche(s) exécutée(s)')
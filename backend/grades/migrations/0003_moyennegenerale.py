@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0005_alter_classe_unique_together_and_more'),
+        ('grades', '0002_alter_note_valeur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoyenneGenerale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('moyenne', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('moyenne_annuelle', models.DecimalField(blank=True, decimal_places=2, help_text="Moyenne des moyennes générales de l'année (3ème trimestre uniquement)", max_digits=5, null=True)),
+                ('nombre_trimestres', models.IntegerField(default=0)),
+                ('nombre_notes', models.IntegerField(default=0)),
+                ('nombre_matieres', models.IntegerField(default=0)),
+                ('rang', models.PositiveIntegerField()),
+                ('rang_dense', models.PositiveIntegerField()),
+                ('est_exaequo', models.BooleanField(default=False)),
+                ('effectif_classe', models.PositiveIntegerField(default=0, help_text="Nombre d'élèves classés")),
+                ('moyenne_classe', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('calculated_at', models.DateTimeField(auto_now=True)),
+                ('classe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moyennes_generales', to='academic.classe')),
+                ('eleve', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moyennes_generales', to='academic.eleve')),
+                ('periode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moyennes_generales', to='grades.periode')),
+            ],
+            options={
+                'verbose_name': 'Moyenne Générale',
+                'verbose_name_plural': 'Moyennes Générales',
+                'ordering': ['classe', 'periode', 'rang'],
+                'indexes': [models.Index(fields=['classe', 'periode', 'rang'], name='moygen_classe_periode_rang')],
+                'unique_together': {('eleve', 'periode')},
+            },
+        ),
+    ]
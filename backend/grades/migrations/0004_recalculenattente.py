@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0005_alter_classe_unique_together_and_more'),
+        ('grades', '0003_moyennegenerale'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecalculEnAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('demande_le', models.DateTimeField(help_text='Date de la dernière demande de recalcul')),
+                ('eleve', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='academic.eleve')),
+                ('matiere', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='academic.matiere')),
+                ('periode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='grades.periode')),
+            ],
+            options={
+                'verbose_name': 'Recalcul en attente',
+                'verbose_name_plural': 'Recalculs en attente',
+                'indexes': [models.Index(fields=['demande_le'], name='recalcul_demande_le')],
+                'unique_together': {('eleve', 'matiere', 'periode')},
+            },
+        ),
+    ]
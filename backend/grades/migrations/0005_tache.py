@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0005_alter_classe_unique_together_and_more'),
+        ('grades', '0004_recalculenattente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(help_text='Type de tâche (voir grades.taches)', max_length=50)),
+                ('cle', models.CharField(help_text="Clé d'idempotence (type + paramètres)", max_length=200)),
+                ('parametres', models.JSONField(blank=True, default=dict)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echouee', 'Échouée')], default='en_attente', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0, help_text='Nombre de lignes à traiter')),
+                ('traites', models.PositiveIntegerField(default=0, help_text='Nombre de lignes traitées')),
+                ('erreurs', models.JSONField(blank=True, default=list)),
+                ('resultat', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('demarree_le', models.DateTimeField(blank=True, null=True)),
+                ('terminee_le', models.DateTimeField(blank=True, null=True)),
+                ('cree_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='taches', to=settings.AUTH_USER_MODEL)),
+                ('ecole', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='taches', to='academic.ecole')),
+            ],
+            options={
+                'verbose_name': 'Tâche',
+                'verbose_name_plural': 'Tâches',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['statut', 'created_at'], name='tache_statut_created')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('statut__in', ['en_attente', 'en_cours'])), fields=('cle',), name='tache_cle_active_unique')],
+            },
+        ),
+    ]
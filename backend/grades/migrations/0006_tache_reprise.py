@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0005_tache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tache',
+            name='fichier',
+            field=models.CharField(blank=True, help_text='Fichier importé, stocké sur le serveur', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='tache',
+            name='point_reprise',
+            field=models.PositiveIntegerField(default=0, help_text="Dernière ligne du fichier enregistrée (reprise d'un import)"),
+        ),
+    ]
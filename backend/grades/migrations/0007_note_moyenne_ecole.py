@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+TAILLE_LOT = 5000
+
+
+def renseigner_ecole(apps, schema_editor):
+    """École de l'élève recopiée sur les notes et moyennes existantes, par tranches d'identifiants"""
+    Eleve = apps.get_model('academic', 'Eleve')
+    ecole_eleve = Subquery(Eleve.objects.filter(id=OuterRef('eleve_id')).values('ecole_id')[:1])
+    for nom in ('Note', 'MoyenneEleve'):
+        modele = apps.get_model('grades', nom)
+        dernier = modele.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        for debut in range(0, dernier, TAILLE_LOT):
+            modele.objects.filter(
+                id__gt=debut, id__lte=debut + TAILLE_LOT, ecole__isnull=True
+            ).update(ecole_id=ecole_eleve)
+
+
+class Migration(migrations.Migration):
+    # Chaque tranche est validée séparément (pas de transaction sur toute la table)
+    atomic = False
+
+    dependencies = [
+        ('academic', '0005_alter_classe_unique_together_and_more'),
+        ('grades', '0006_tache_reprise'),
+        ('users', '0003_professeur_ecole'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moyenneeleve',
+            name='ecole',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='moyennes', to='academic.ecole', verbose_name='École'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='ecole',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notes', to='academic.ecole', verbose_name='École'),
+        ),
+        # Avant les index : pas de mise à jour d'index pendant le remplissage
+        migrations.RunPython(renseigner_ecole, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='moyenneeleve',
+            index=models.Index(fields=['ecole', 'periode', 'eleve'], name='moy_ecole_periode_eleve'),
+        ),
+        migrations.AddIndex(
+            model_name='moyenneeleve',
+            index=models.Index(fields=['ecole', 'periode', 'matiere'], name='moy_ecole_periode_matiere'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['ecole', 'periode', 'eleve'], name='note_ecole_periode_eleve'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['ecole', 'periode', 'matiere'], name='note_ecole_periode_matiere'),
+        ),
+    ]
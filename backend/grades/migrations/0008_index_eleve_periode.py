@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0006_index_eleves'),
+        ('grades', '0007_note_moyenne_ecole'),
+        ('users', '0003_professeur_ecole'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moyenneeleve',
+            index=models.Index(fields=['eleve', 'periode', 'matiere'], name='moy_eleve_periode_matiere'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['eleve', 'periode'], name='note_eleve_periode'),
+        ),
+    ]
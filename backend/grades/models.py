@@ -1,8 +1,9 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
-from decimal import Decimal
-from academic.models import Eleve, Matiere, AnneeScolaire
+from decimal import Decimal, ROUND_HALF_UP
+from academic.models import Ecole, Eleve, Matiere, AnneeScolaire, Classe
 from users.models import Professeur
+from core import cache_vues
 
 
 class Periode(models.Model):
@@ -61,6 +62,16 @@ class Note(models.Model):
     matiere = models.ForeignKey(Matiere, on_delete=models.CASCADE, related_name='notes')
     periode = models.ForeignKey(Periode, on_delete=models.CASCADE, related_name='notes')
     type_evaluation = models.ForeignKey(TypeEvaluation, on_delete=models.CASCADE, related_name='notes')
+    # École de l'élève, dénormalisée : cloisonnement sans jointure
+    ecole = models.ForeignKey(
+        Ecole,
+        on_delete=models.CASCADE,
+        related_name='notes',
+        null=True,  # Renseignée à l'enregistrement (voir save) et par la migration 0007
+        blank=True,
+        editable=False,
+        verbose_name="École"
+    )
     
     valeur = models.DecimalField(
         max_digits=4,
@@ -90,10 +101,21 @@ class Note(models.Model):
         ordering = ['-date_evaluation']
         # Un élève ne peut avoir qu'une seule note d'un type donné pour une matière et période
         unique_together = ['eleve', 'matiere', 'periode', 'type_evaluation']
+        indexes = [
+            # Notes d'un élève pour une période (moyenne générale, bulletins)
+            models.Index(fields=['eleve', 'periode'], name='note_eleve_periode'),
+            models.Index(fields=['ecole', 'periode', 'eleve'], name='note_ecole_periode_eleve'),
+            models.Index(fields=['ecole', 'periode', 'matiere'], name='note_ecole_periode_matiere'),
+        ]
     
     def __str__(self):
         return f"{self.eleve.nom_complet} - {self.matiere.nom} : {self.valeur}/20"
     
+    def save(self, *args, **kwargs):
+        if self.ecole_id is None and self.eleve_id is not None:
+            self.ecole_id = self.eleve.ecole_id
+        super().save(*args, **kwargs)
+    
     def clean(self):
         """Validation personnalisée"""
         from django.core.exceptions import ValidationError
@@ -112,6 +134,16 @@ class MoyenneEleve(models.Model):
     eleve = models.ForeignKey(Eleve, on_delete=models.CASCADE, related_name='moyennes')
     matiere = models.ForeignKey(Matiere, on_delete=models.CASCADE, related_name='moyennes')
     periode = models.ForeignKey(Periode, on_delete=models.CASCADE, related_name='moyennes')
+    # École de l'élève, dénormalisée : cloisonnement sans jointure
+    ecole = models.ForeignKey(
+        Ecole,
+        on_delete=models.CASCADE,
+        related_name='moyennes',
+        null=True,  # Renseignée à l'enregistrement (voir save) et par la migration 0007
+        blank=True,
+        editable=False,
+        verbose_name="École"
+    )
     
     # Moyennes calculées
     moyenne = models.DecimalField(
@@ -133,53 +165,171 @@ class MoyenneEleve(models.Model):
         verbose_name_plural = 'Moyennes Élèves'
         ordering = ['eleve', 'periode', 'matiere']
         unique_together = ['eleve', 'matiere', 'periode']
+        indexes = [
+            # Moyennes d'un élève pour une période, dans l'ordre du modèle (l'unicité est eleve, matiere, periode)
+            models.Index(fields=['eleve', 'periode', 'matiere'], name='moy_eleve_periode_matiere'),
+            models.Index(fields=['ecole', 'periode', 'eleve'], name='moy_ecole_periode_eleve'),
+            models.Index(fields=['ecole', 'periode', 'matiere'], name='moy_ecole_periode_matiere'),
+        ]
     
     def __str__(self):
         return f"{self.eleve.nom_complet} - {self.matiere.nom} : {self.moyenne}/20"
     
+    def save(self, *args, **kwargs):
+        if self.ecole_id is None and self.eleve_id is not None:
+            self.ecole_id = self.eleve.ecole_id
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def _agreger_notes(notes):
+        """
+        Agrégats par (eleve, matiere) calculés par la base : somme des valeurs
+        pondérées par le coefficient du type d'évaluation, somme des coefficients
+        et nombre de notes, en Decimal (pas de conversion en float).
+        """
+        from django.db.models import Count, DecimalField, F, Sum
+        
+        return notes.values('eleve', 'matiere').annotate(
+            points=Sum(
+                F('valeur') * F('type_evaluation__coefficient'),
+                output_field=DecimalField(max_digits=12, decimal_places=4),
+            ),
+            coefficients=Sum(
+                'type_evaluation__coefficient',
+                output_field=DecimalField(max_digits=12, decimal_places=4),
+            ),
+            nombre=Count('id'),
+        ).order_by()
+    
+    @staticmethod
+    def _resultat(agregat):
+        """(moyenne, nombre_notes, total_points) arrondis à 2 décimales, ou None"""
+        if not agregat['nombre'] or not agregat['coefficients']:
+            return None
+        centieme = Decimal('0.01')
+        moyenne = (agregat['points'] / agregat['coefficients']).quantize(centieme, rounding=ROUND_HALF_UP)
+        return moyenne, agregat['nombre'], agregat['points'].quantize(centieme, rounding=ROUND_HALF_UP)
+    
     @classmethod
     def calculer_moyenne(cls, eleve, matiere, periode):
         """Calcule et enregistre la moyenne d'un élève pour une matière et période"""
-        from django.db.models import Avg, Sum, Count
-        
-        # Récupérer toutes les notes avec leurs coefficients
-        notes = Note.objects.filter(
-            eleve=eleve,
-            matiere=matiere,
-            periode=periode
-        ).select_related('type_evaluation')
-        
-        if not notes.exists():
-            return None
-        
-        # Calcul de la moyenne pondérée
-        total_points = 0
-        total_coefficients = 0
-        
-        for note in notes:
-            coef_type = note.type_evaluation.coefficient
-            total_points += float(note.valeur) * float(coef_type)
-            total_coefficients += float(coef_type)
-        
-        if total_coefficients == 0:
+        agregats = list(cls._agreger_notes(
+            Note.objects.filter(eleve=eleve, matiere=matiere, periode=periode)
+        ))
+        resultat = cls._resultat(agregats[0]) if agregats else None
+        if resultat is None:
             return None
+        moyenne, nombre_notes, total_points = resultat
         
-        moyenne_calculee = total_points / total_coefficients
-        
-        # Créer ou mettre à jour la moyenne
+        # Créer ou mettre à jour la moyenne (post_save planifie le re-classement de la classe)
         moyenne_obj, created = cls.objects.update_or_create(
             eleve=eleve,
             matiere=matiere,
             periode=periode,
             defaults={
-                'moyenne': round(moyenne_calculee, 2),
-                'nombre_notes': notes.count(),
+                'moyenne': moyenne,
+                'nombre_notes': nombre_notes,
                 'total_points': total_points,
             }
         )
         
         return moyenne_obj
     
+    @classmethod
+    def calculer_moyennes(cls, periode, cles):
+        """
+        Calcule sans les enregistrer les moyennes de plusieurs (eleve_id, matiere_id)
+        d'une période, en une seule requête d'agrégation.
+        
+        Retourne {(eleve_id, matiere_id): (moyenne, nombre_notes, total_points)} ;
+        les clés sans note n'y figurent pas.
+        """
+        cles = set(cles)
+        if not cles:
+            return {}
+        
+        agregats = cls._agreger_notes(Note.objects.filter(
+            periode=periode,
+            eleve_id__in={eleve_id for eleve_id, _ in cles},
+            matiere_id__in={matiere_id for _, matiere_id in cles},
+        ))
+        
+        resultats = {}
+        for agregat in agregats:
+            cle = (agregat['eleve'], agregat['matiere'])
+            resultat = cls._resultat(agregat)
+            if cle in cles and resultat is not None:
+                resultats[cle] = resultat
+        return resultats
+    
+    @classmethod
+    def recalculer_moyennes(cls, periode, cles):
+        """
+        Recalcule en une passe les moyennes de plusieurs (eleve_id, matiere_id) d'une période :
+        une requête d'agrégation sur les notes, un upsert groupé, puis le re-classement
+        des classes concernées.
+        """
+        cles = set(cles)
+        if not cles:
+            return []
+        return cls.enregistrer_moyennes(periode, cls.calculer_moyennes(periode, cles), cles)
+    
+    @classmethod
+    def enregistrer_moyennes(cls, periode, resultats, cles=()):
+        """
+        Enregistre par un upsert groupé des moyennes issues de calculer_moyennes,
+        supprime celles des clés sans note restante (présentes dans cles mais
+        pas dans resultats), puis re-classe les classes des élèves concernés.
+        """
+        # Classe et école des élèves concernés (resultats et cles), en une requête
+        eleves = {
+            eleve_id: (classe_id, ecole_id)
+            for eleve_id, classe_id, ecole_id in Eleve.objects.filter(
+                id__in={eleve_id for eleve_id, _ in resultats} | {eleve_id for eleve_id, _ in cles}
+            ).values_list('id', 'classe_id', 'ecole_id').order_by()
+        }
+        moyennes = [
+            cls(
+                eleve_id=eleve_id,
+                matiere_id=matiere_id,
+                periode=periode,
+                ecole_id=eleves.get(eleve_id, (None, None))[1],
+                moyenne=moyenne,
+                nombre_notes=nombre_notes,
+                total_points=total_points,
+            )
+            for (eleve_id, matiere_id), (moyenne, nombre_notes, total_points) in resultats.items()
+        ]
+        
+        if moyennes:
+            moyennes = cls.objects.bulk_create(
+                moyennes,
+                update_conflicts=True,
+                unique_fields=['eleve', 'matiere', 'periode'],
+                update_fields=['ecole', 'moyenne', 'nombre_notes', 'total_points', 'calculated_at'],
+            )
+        
+        # Dernière note supprimée : la moyenne de la clé n'a plus lieu d'être
+        orphelines = set(cles) - set(resultats)
+        if orphelines:
+            cls.objects.filter(pk__in=[
+                pk for pk, eleve_id, matiere_id in cls.objects.filter(
+                    periode=periode,
+                    eleve_id__in={eleve_id for eleve_id, _ in orphelines},
+                    matiere_id__in={matiere_id for _, matiere_id in orphelines},
+                ).values_list('pk', 'eleve_id', 'matiere_id').order_by()
+                if (eleve_id, matiere_id) in orphelines
+            ]).delete()
+        
+        # bulk_create n'émet pas de signal : re-classer explicitement chaque classe touchée
+        # et périmer les réponses de l'API en cache (core.cache_vues)
+        for classe_id in {classe_id for classe_id, _ in eleves.values()}:
+            MoyenneGenerale.actualiser_classe(classe_id, periode)
+        for ecole_id in {ecole_id for _, ecole_id in eleves.values()}:
+            cache_vues.invalider(ecole_id, cache_vues.MOYENNES)
+        
+        return moyennes
+    
     @classmethod
     def calculer_moyenne_generale(cls, eleve, periode):
         """Calcule la moyenne générale d'un élève pour une période"""
@@ -206,24 +356,418 @@ class MoyenneEleve(models.Model):
         return round(total_points / total_coefficients, 2)
 
 
+def _deux_decimales(valeur):
+    """Décimal à 2 chiffres après la virgule, comme relu en base (9.0 -> Decimal('9.00'))"""
+    if valeur is None:
+        return None
+    return Decimal(str(valeur)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class MoyenneGenerale(models.Model):
+    """
+    Moyenne générale et rang d'un élève pour une période (matérialisés).
+    Maintenue à jour classe par classe à chaque modification d'une MoyenneEleve,
+    pour que bulletins et tableaux de bord n'aient qu'une lecture indexée à faire.
+    """
+    eleve = models.ForeignKey(Eleve, on_delete=models.CASCADE, related_name='moyennes_generales')
+    classe = models.ForeignKey(Classe, on_delete=models.CASCADE, related_name='moyennes_generales')
+    periode = models.ForeignKey(Periode, on_delete=models.CASCADE, related_name='moyennes_generales')
+    
+    # Résultats de l'élève
+    moyenne = models.DecimalField(max_digits=5, decimal_places=2)
+    moyenne_annuelle = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Moyenne des moyennes générales de l'année (3ème trimestre uniquement)"
+    )
+    nombre_trimestres = models.IntegerField(default=0)
+    nombre_notes = models.IntegerField(default=0)
+    nombre_matieres = models.IntegerField(default=0)
+    
+    # Classement dans la classe
+    rang = models.PositiveIntegerField()
+    rang_dense = models.PositiveIntegerField()
+    est_exaequo = models.BooleanField(default=False)
+    effectif_classe = models.PositiveIntegerField(default=0, help_text="Nombre d'élèves classés")
+    moyenne_classe = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    
+    # Timestamps
+    calculated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Moyenne Générale'
+        verbose_name_plural = 'Moyennes Générales'
+        ordering = ['classe', 'periode', 'rang']
+        unique_together = ['eleve', 'periode']
+        indexes = [
+            models.Index(fields=['classe', 'periode', 'rang'], name='moygen_classe_periode_rang'),
+        ]
+    
+    def __str__(self):
+        return f"{self.eleve.nom_complet} - {self.periode} : {self.moyenne}/10 (rang {self.rang})"
+    
+    @classmethod
+    def pour_classe(cls, classe, periode):
+        """
+        Lignes classées d'une classe pour une période. Sans ligne enregistrée
+        (table pas encore remplie, classements supprimés), le classement est
+        calculé en mémoire sans rien écrire : une lecture n'a pas d'effet de bord.
+        """
+        lignes = list(cls.objects.filter(classe=classe, periode=periode))
+        if not lignes:
+            lignes = cls.classer(classe, periode)
+        return lignes
+    
+    @classmethod
+    def pour_eleve(cls, eleve, periode):
+        """Ligne d'un élève pour une période (None si l'élève n'est pas classé), sans écriture"""
+        ligne = cls.objects.filter(eleve=eleve, periode=periode).first()
+        if ligne is None and eleve.classe_id:
+            ligne = next((l for l in cls.pour_classe(eleve.classe, periode) if l.eleve_id == eleve.id), None)
+        return ligne
+    
+    @classmethod
+    def classer(cls, classe, periode):
+        """Lignes classées (non enregistrées) d'une classe (instance ou id) pour une période"""
+        from .classement import classement_classe
+        
+        classe_id = getattr(classe, 'pk', classe)
+        lignes = [
+            ligne for ligne in classement_classe(classe, periode)
+            if ligne['moyenne_generale'] is not None
+        ]
+        annuelles = {}
+        if periode.nom == 'trimestre3':
+            annuelles = cls._moyennes_annuelles(classe, periode.annee_scolaire_id)
+        
+        moyenne_classe = None
+        if lignes:
+            moyenne_classe = round(sum(l['moyenne_generale'] for l in lignes) / len(lignes), 2)
+        
+        objets = []
+        for ligne in lignes:
+            moyenne_annuelle, nombre_trimestres = annuelles.get(ligne['eleve_id'], (None, 0))
+            objets.append(cls(
+                eleve_id=ligne['eleve_id'],
+                classe_id=classe_id,
+                periode=periode,
+                moyenne=_deux_decimales(ligne['moyenne_generale']),
+                moyenne_annuelle=moyenne_annuelle,
+                nombre_trimestres=nombre_trimestres,
+                nombre_notes=ligne['notes_count'],
+                nombre_matieres=ligne['nombre_matieres'],
+                rang=ligne['rang'],
+                rang_dense=ligne['rang_dense'],
+                est_exaequo=ligne['is_exaequo'],
+                effectif_classe=len(lignes),
+                moyenne_classe=_deux_decimales(moyenne_classe),
+            ))
+        return objets
+    
+    @classmethod
+    def actualiser_classe(cls, classe, periode):
+        """Recalcule moyennes générales et rangs d'une seule classe (instance ou id) pour une période"""
+        from django.db import transaction
+        from .cache_bulletins import invalider_classe
+        
+        # Moyennes ou rangs modifiés : les bulletins PDF en cache sont périmés
+        invalider_classe(getattr(classe, 'pk', classe), periode.id)
+        objets = cls.classer(classe, periode)
+        
+        with transaction.atomic():
+            cls.objects.filter(classe=classe, periode=periode).exclude(
+                eleve_id__in=[o.eleve_id for o in objets]
+            ).delete()
+            if objets:
+                cls.objects.bulk_create(
+                    objets,
+                    update_conflicts=True,
+                    unique_fields=['eleve', 'periode'],
+                    update_fields=[
+                        'classe', 'moyenne', 'moyenne_annuelle', 'nombre_trimestres',
+                        'nombre_notes', 'nombre_matieres', 'rang', 'rang_dense',
+                        'est_exaequo', 'effectif_classe', 'moyenne_classe', 'calculated_at',
+                    ],
+                )
+        
+        # Une autre période de l'année a changé : la moyenne annuelle du 3ème trimestre aussi
+        if periode.nom != 'trimestre3':
+            cls._actualiser_annuelles(classe, periode.annee_scolaire_id)
+    
+    @classmethod
+    def _moyennes_annuelles(cls, classe, annee_scolaire_id):
+        """{eleve_id: (moyenne annuelle, nombre de trimestres)} pour les élèves actifs d'une classe"""
+        from .classement import arrondir, moyennes_generales_annee
+        
+        return {
+            eleve_id: (_deux_decimales(arrondir(sum(m.values()) / len(m))), len(m))
+            for eleve_id, m in moyennes_generales_annee(classe, annee_scolaire_id).items()
+        }
+    
+    @classmethod
+    def _actualiser_annuelles(cls, classe, annee_scolaire_id):
+        """Met à jour la moyenne annuelle des lignes du 3ème trimestre déjà calculées"""
+        lignes = list(cls.objects.filter(
+            classe=classe,
+            periode__annee_scolaire_id=annee_scolaire_id,
+            periode__nom='trimestre3',
+        ))
+        if not lignes:
+            return
+        annuelles = cls._moyennes_annuelles(classe, annee_scolaire_id)
+        for ligne in lignes:
+            ligne.moyenne_annuelle, ligne.nombre_trimestres = annuelles.get(ligne.eleve_id, (None, 0))
+        cls.objects.bulk_update(lignes, ['moyenne_annuelle', 'nombre_trimestres'])
+
+
+class RecalculEnAttente(models.Model):
+    """File locale des moyennes à recalculer (mode 'file' du recalcul différé)"""
+    eleve = models.ForeignKey(Eleve, on_delete=models.CASCADE, related_name='+')
+    matiere = models.ForeignKey(Matiere, on_delete=models.CASCADE, related_name='+')
+    periode = models.ForeignKey(Periode, on_delete=models.CASCADE, related_name='+')
+    demande_le = models.DateTimeField(help_text="Date de la dernière demande de recalcul")
+    
+    class Meta:
+        verbose_name = 'Recalcul en attente'
+        verbose_name_plural = 'Recalculs en attente'
+        unique_together = ['eleve', 'matiere', 'periode']
+        indexes = [
+            models.Index(fields=['demande_le'], name='recalcul_demande_le'),
+        ]
+    
+    def __str__(self):
+        return f"{self.eleve_id}/{self.matiere_id}/{self.periode_id} ({self.demande_le})"
+
+
+class Tache(models.Model):
+    """
+    Tâche de fond (recalcul, import...) exécutée par la commande traiter_taches.
+    Une tâche en attente ou en cours est unique par clé : une nouvelle demande
+    identique retourne la tâche existante.
+    """
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echouee', 'Échouée'),
+    ]
+    STATUTS_ACTIFS = ['en_attente', 'en_cours']
+    
+    type = models.CharField(max_length=50, help_text="Type de tâche (voir grades.taches)")
+    cle = models.CharField(max_length=200, help_text="Clé d'idempotence (type + paramètres)")
+    parametres = models.JSONField(default=dict, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    
+    # Avancement
+    total = models.PositiveIntegerField(default=0, help_text="Nombre de lignes à traiter")
+    traites = models.PositiveIntegerField(default=0, help_text="Nombre de lignes traitées")
+    erreurs = models.JSONField(default=list, blank=True)
+    resultat = models.JSONField(default=dict, blank=True)
+    point_reprise = models.PositiveIntegerField(
+        default=0, help_text="Dernière ligne du fichier enregistrée (reprise d'un import)"
+    )
+    fichier = models.CharField(max_length=500, blank=True, help_text="Fichier importé, stocké sur le serveur")
+    
+    ecole = models.ForeignKey(
+        'academic.Ecole', on_delete=models.CASCADE, related_name='taches', null=True, blank=True
+    )
+    cree_par = models.ForeignKey(
+        'users.User', on_delete=models.SET_NULL, related_name='taches', null=True, blank=True
+    )
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    demarree_le = models.DateTimeField(null=True, blank=True)
+    terminee_le = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Tâche'
+        verbose_name_plural = 'Tâches'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cle'],
+                condition=models.Q(statut__in=['en_attente', 'en_cours']),
+                name='tache_cle_active_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['statut', 'created_at'], name='tache_statut_created'),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} #{self.pk} ({self.get_statut_display()})"
+    
+    @property
+    def progression(self):
+        """Avancement en pourcentage"""
+        if not self.total:
+            return 100.0 if self.statut == 'terminee' else 0.0
+        return round(100.0 * self.traites / self.total, 1)
+    
+    @property
+    def debit(self):
+        """Lignes traitées par seconde depuis le premier démarrage (reprises comprises)"""
+        from django.utils import timezone
+        if not self.demarree_le:
+            return None
+        duree = ((self.terminee_le or timezone.now()) - self.demarree_le).total_seconds()
+        return round(self.traites / duree, 1) if duree > 0 else None
+
+
 # Signal pour recalculer automatiquement les moyennes
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 
 @receiver(post_save, sender=Note)
 def recalculer_moyenne_apres_note(sender, instance, **kwargs):
-    """Recalcule automatiquement la moyenne après ajout/modification d'une note"""
-    MoyenneEleve.calculer_moyenne(
-        instance.eleve,
-        instance.matiere,
-        instance.periode
-    )
+    """Planifie le recalcul de la moyenne après ajout/modification d'une note"""
+    from .recalcul import planifier
+    planifier(instance.eleve_id, instance.matiere_id, instance.periode_id)
 
 @receiver(post_delete, sender=Note)
 def recalculer_moyenne_apres_suppression(sender, instance, **kwargs):
-    """Recalcule la moyenne après suppression d'une note"""
-    MoyenneEleve.calculer_moyenne(
-        instance.eleve,
-        instance.matiere,
-        instance.periode
+    """Planifie le recalcul de la moyenne après suppression d'une note"""
+    from .recalcul import planifier
+    planifier(instance.eleve_id, instance.matiere_id, instance.periode_id)
+
+
+@receiver(post_save, sender=MoyenneEleve)
+@receiver(post_delete, sender=MoyenneEleve)
+def actualiser_moyenne_generale(sender, instance, **kwargs):
+    """
+    Une moyenne a changé : recalcul différé de sa clé (grades.recalcul), qui
+    re-classe une seule fois chaque classe touchée à la fin de la portée
+    """
+    origin = kwargs.get('origin')
+    if origin is not None and not isinstance(origin, MoyenneEleve) and getattr(origin, 'model', None) is not MoyenneEleve:
+        # Suppression en cascade (élève, classe, période...) : rien à re-classer
+        return
+    from .recalcul import planifier
+    planifier(instance.eleve_id, instance.matiere_id, instance.periode_id)
+
+
+def actualiser_classements_eleves(eleves):
+    """
+    Des élèves (instances à jour) ont changé de classe ou de statut : supprime
+    leurs moyennes générales périmées, puis re-classe une seule fois chaque
+    couple (classe, période) concerné
+    """
+    from django.db.models import F
+    # Identité des élèves imprimée sur les bulletins
+    from .cache_bulletins import invalider_classe
+    for classe_id in {eleve.classe_id for eleve in eleves}:
+        invalider_classe(classe_id)
+    perimees = list(
+        MoyenneGenerale.objects.filter(eleve__in=[eleve.pk for eleve in eleves])
+        .exclude(classe_id=F('eleve__classe_id'), eleve__statut='actif')
+        .select_related('periode')
     )
+    if not perimees:
+        return
+    MoyenneGenerale.objects.filter(pk__in=[ligne.pk for ligne in perimees]).delete()
+    periodes = {ligne.periode_id: ligne.periode for ligne in perimees}
+    a_actualiser = {(ligne.classe_id, ligne.periode_id) for ligne in perimees}
+    actifs = {eleve.pk: eleve.classe_id for eleve in eleves if eleve.statut == 'actif'}
+    a_actualiser |= {
+        (actifs[ligne.eleve_id], ligne.periode_id) for ligne in perimees
+        if actifs.get(ligne.eleve_id) is not None
+    }
+    for classe_id, periode_id in a_actualiser:
+        MoyenneGenerale.actualiser_classe(classe_id, periodes[periode_id])
+
+
+@receiver(post_save, sender=Eleve)
+def actualiser_classements_eleve(sender, instance, created, **kwargs):
+    """Un élève change de classe ou de statut : re-classer les classes concernées"""
+    if created:
+        return
+    actualiser_classements_eleves([instance])
+
+
+def _suppression_eleve(origin):
+    """Vrai si la suppression vient d'un élève (instance ou queryset), pas d'une cascade"""
+    return origin is None or isinstance(origin, Eleve) or getattr(origin, 'model', None) is Eleve
+
+
+@receiver(pre_delete, sender=Eleve)
+def noter_periodes_classees_eleve(sender, instance, **kwargs):
+    """Périodes où l'élève est classé, lues avant que la cascade ne supprime ses moyennes générales"""
+    if _suppression_eleve(kwargs.get('origin')) and instance.classe_id:
+        instance._periodes_classees = list(Periode.objects.filter(moyennes_generales__eleve=instance))
+
+
+@receiver(post_delete, sender=Eleve)
+def actualiser_classements_apres_suppression(sender, instance, **kwargs):
+    """Un élève est supprimé : re-classer sa classe pour chaque période où il était classé"""
+    for periode in getattr(instance, '_periodes_classees', ()):
+        MoyenneGenerale.actualiser_classe(instance.classe_id, periode)
+
+
+@receiver(post_save, sender=Matiere)
+def invalider_moyennes_generales_matiere(sender, instance, created, **kwargs):
+    """Le coefficient d'une matière a pu changer : les classements seront recalculés au prochain accès"""
+    if not created:
+        from .cache_bulletins import invalider_ecole
+        MoyenneGenerale.objects.filter(classe__ecole_id=instance.ecole_id).delete()
+        invalider_ecole(instance.ecole_id)
+
+
+@receiver(post_save, sender=Ecole)
+def invalider_bulletins_ecole(sender, instance, created, **kwargs):
+    """Nom, devise ou logo de l'école modifiés : en-tête des bulletins en cache périmé"""
+    if not created:
+        from .cache_bulletins import invalider_ecole
+        invalider_ecole(instance.pk)
+
+
+# Cache du référentiel de l'école (grades.referentiel) : nouvelle version à chaque modification
+@receiver(post_save, sender=Ecole)
+@receiver(post_save, sender=Matiere)
+@receiver(post_delete, sender=Matiere)
+def invalider_referentiel_ecole(sender, instance, **kwargs):
+    from .referentiel import invalider
+    invalider(instance.pk if sender is Ecole else instance.ecole_id)
+
+
+@receiver(post_save, sender=AnneeScolaire)
+@receiver(post_delete, sender=AnneeScolaire)
+def invalider_referentiel_annee(sender, instance, **kwargs):
+    from .referentiel import invalider
+    # Activer une année désactive les autres par update() (sans signal) : tout invalider
+    invalider(None if instance.active else instance.ecole_id)
+
+
+@receiver(post_save, sender=Periode)
+@receiver(post_delete, sender=Periode)
+def invalider_referentiel_periode(sender, instance, **kwargs):
+    from .referentiel import invalider
+    ecole_id = AnneeScolaire.objects.filter(id=instance.annee_scolaire_id).values_list('ecole_id', flat=True).first()
+    invalider(ecole_id)
+
+
+@receiver(post_save, sender=TypeEvaluation)
+@receiver(post_delete, sender=TypeEvaluation)
+def invalider_referentiel_types(sender, instance, **kwargs):
+    from .referentiel import invalider
+    invalider(None)
+
+
+# Cache des réponses de lecture de l'API (core.cache_vues) : nouvelle version des groupes touchés
+@receiver(post_save, sender=Periode)
+@receiver(post_delete, sender=Periode)
+def invalider_vues_periode(sender, instance, **kwargs):
+    ecole_id = AnneeScolaire.objects.filter(id=instance.annee_scolaire_id).values_list('ecole_id', flat=True).first()
+    cache_vues.invalider(ecole_id, cache_vues.PERIODES, cache_vues.MOYENNES)
+
+
+@receiver(post_save, sender=MoyenneEleve)
+@receiver(post_delete, sender=MoyenneEleve)
+def invalider_vues_moyenne(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    if origin is not None and not isinstance(origin, MoyenneEleve) and getattr(origin, 'model', None) is not MoyenneEleve:
+        # Suppression en cascade : invalidée par le signal de l'objet supprimé
+        return
+    cache_vues.invalider(instance.eleve.ecole_id, cache_vues.MOYENNES)
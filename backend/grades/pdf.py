@@ -0,0 +1,300 @@
+"""
+Rendu PDF des bulletins (reportlab), côté serveur.
+
+Le contenu vient de assembler_bulletins_classe. Les bulletins sont écrits
+dans un fichier (cache disque de grades.cache_bulletins) que la vue renvoie
+en streaming. Le canvas reportlab garde toutes les pages d'un PDF en mémoire
+jusqu'à save() (quelques Ko par page compressée) : le PDF fusionné d'une
+classe est limité à PAGES_MAX pages, au-delà le zip d'un PDF par élève
+(un canvas par élève) garde une mémoire constante.
+
+L'en-tête de l'école (logo décodé compris) est mis en cache par processus.
+"""
+import os
+from datetime import date
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+LARGEUR, HAUTEUR = A4
+MARGE = 15 * mm
+BLEU = colors.HexColor('#1e3a8a')
+VERT = colors.HexColor('#059669')
+GRIS = colors.HexColor('#6b7280')
+GRIS_CLAIR = colors.HexColor('#f3f4f6')
+BORDURE = colors.HexColor('#d1d5db')
+
+# À incrémenter à chaque changement de mise en page (invalide le cache disque)
+VERSION_RENDU = 1
+
+# Pages d'un même PDF (gardées en mémoire jusqu'à save()) : bien au-delà d'une classe
+PAGES_MAX = 200
+
+APPRECIATIONS = [
+    (8, "Excellent travail. Élève sérieux et appliqué. Continuez ainsi."),
+    (7, "Bon travail dans l'ensemble. Peut encore progresser avec plus d'efforts."),
+    (6, "Résultats corrects mais irréguliers. Doit fournir plus d'efforts."),
+    (5, "Résultats insuffisants. Doit redoubler d'efforts et de sérieux."),
+    (0, "Résultats très insuffisants. Un travail régulier est nécessaire."),
+]
+
+
+def mention(moyenne):
+    """Mention pour une moyenne sur 10 (mêmes seuils que le frontend)"""
+    if moyenne >= 8:
+        return 'Très Bien'
+    if moyenne >= 7:
+        return 'Bien'
+    if moyenne >= 6:
+        return 'Assez Bien'
+    if moyenne >= 5:
+        return 'Passable'
+    return 'Insuffisant'
+
+
+def appreciation(moyenne):
+    for seuil, texte in APPRECIATIONS:
+        if moyenne >= seuil:
+            return texte
+
+
+@lru_cache(maxsize=32)
+def _logo(chemin, modifie_le):
+    """Logo décodé une fois par fichier (la date de modification invalide le cache)"""
+    try:
+        return ImageReader(chemin)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=64)
+def _entete(ecole_id, nom, devise, chemin_logo, logo_modifie_le):
+    return {
+        'nom': (nom or 'École primaire').upper(),
+        'devise': devise or '',
+        'logo': _logo(chemin_logo, logo_modifie_le) if chemin_logo else None,
+    }
+
+
+def cle_entete(ecole):
+    """Éléments de l'en-tête d'une école qui déterminent son rendu (clé de cache)"""
+    if ecole is None:
+        return (None, None, None, None, None)
+    chemin, modifie_le = None, None
+    if ecole.logo:
+        try:
+            chemin = ecole.logo.path
+            modifie_le = os.path.getmtime(chemin)
+        except (OSError, ValueError, NotImplementedError):
+            chemin = None
+    return (ecole.pk, ecole.nom, ecole.devise, chemin, modifie_le)
+
+
+def entete_ecole(ecole):
+    """En-tête (nom, devise, logo) d'une école, depuis le cache du processus"""
+    return _entete(*cle_entete(ecole))
+
+
+def _nombre(valeur):
+    return f"{float(valeur):.2f}"
+
+
+def dessiner_bulletin(c, bulletin, contexte):
+    """Dessine le bulletin d'un élève sur la page courante du canvas"""
+    entete = contexte['entete']
+    eleve = bulletin['eleve']
+    y = HAUTEUR - MARGE
+
+    # En-tête officiel
+    hauteur_entete = 32 * mm
+    c.setStrokeColor(BLEU)
+    c.setLineWidth(2)
+    c.rect(MARGE, y - hauteur_entete, LARGEUR - 2 * MARGE, hauteur_entete)
+    if entete['logo'] is not None:
+        c.drawImage(
+            entete['logo'], MARGE + 3 * mm, y - hauteur_entete + 3 * mm,
+            width=26 * mm, height=26 * mm, preserveAspectRatio=True, mask='auto'
+        )
+    centre = LARGEUR / 2
+    c.setFillColor(BLEU)
+    c.setFont('Helvetica-Bold', 15)
+    c.drawCentredString(centre, y - 8 * mm, entete['nom'])
+    c.setFillColor(GRIS)
+    c.setFont('Helvetica-Oblique', 8)
+    c.drawCentredString(centre, y - 12 * mm, entete['devise'])
+    c.setFont('Helvetica', 9)
+    c.drawCentredString(centre, y - 16 * mm, f"Année Scolaire {contexte['annee']}")
+    c.setFillColor(colors.black)
+    c.setFont('Helvetica-Bold', 13)
+    c.drawCentredString(centre, y - 23 * mm, 'BULLETIN DE NOTES')
+    c.setFont('Helvetica', 11)
+    c.drawCentredString(centre, y - 28 * mm, contexte['periode_nom'])
+    y -= hauteur_entete + 6 * mm
+
+    # Informations élève
+    rang = f"{bulletin['rang']}°" if bulletin['rang'] else 'N/A'
+    if bulletin['isExaequo']:
+        rang += ' (ex-æquo)'
+    infos = [
+        ('Nom et Prénom', f"{eleve['nom']} {eleve['prenom']}", 'Matricule', eleve['matricule']),
+        ('Classe', eleve['classe_nom'], 'Sexe', 'Masculin' if eleve['sexe'] == 'M' else 'Féminin'),
+        ('Rang', rang, 'Effectif', str(bulletin['effectif_classe'] or 'N/A')),
+    ]
+    demi = (LARGEUR - 2 * MARGE) / 2
+    c.setLineWidth(0.5)
+    c.setStrokeColor(BORDURE)
+    for libelle_1, valeur_1, libelle_2, valeur_2 in infos:
+        for x, libelle, valeur in ((MARGE, libelle_1, valeur_1), (MARGE + demi, libelle_2, valeur_2)):
+            c.rect(x, y - 7 * mm, demi, 7 * mm)
+            c.setFillColor(GRIS)
+            c.setFont('Helvetica', 9)
+            c.drawString(x + 2 * mm, y - 4.8 * mm, f"{libelle} :")
+            c.setFillColor(colors.black)
+            c.setFont('Helvetica-Bold', 9)
+            c.drawString(x + 30 * mm, y - 4.8 * mm, str(valeur))
+        y -= 7 * mm
+    y -= 6 * mm
+
+    # Résultats par matière
+    largeur = LARGEUR - 2 * MARGE
+    colonnes = [largeur - 75 * mm, 20 * mm, 22 * mm, 33 * mm]
+    c.setFillColor(BLEU)
+    c.rect(MARGE, y - 7 * mm, largeur, 7 * mm, stroke=0, fill=1)
+    c.setFillColor(colors.white)
+    c.setFont('Helvetica-Bold', 10)
+    c.drawString(MARGE + 2 * mm, y - 4.8 * mm, 'RÉSULTATS PAR MATIÈRE')
+    y -= 7 * mm
+
+    def ligne(cellules, fond=None, couleur=colors.black, police='Helvetica', taille=9):
+        nonlocal y
+        if fond is not None:
+            c.setFillColor(fond)
+            c.rect(MARGE, y - 6.5 * mm, largeur, 6.5 * mm, stroke=0, fill=1)
+        x = MARGE
+        c.setFillColor(couleur)
+        c.setFont(police, taille)
+        for i, (texte, largeur_colonne) in enumerate(zip(cellules, colonnes)):
+            c.rect(x, y - 6.5 * mm, largeur_colonne, 6.5 * mm)
+            if i == 0:
+                c.drawString(x + 2 * mm, y - 4.5 * mm, texte)
+            else:
+                c.drawCentredString(x + largeur_colonne / 2, y - 4.5 * mm, texte)
+            x += largeur_colonne
+        y -= 6.5 * mm
+
+    ligne(['MATIÈRES', 'COEF.', 'MOY./10', 'APPRÉCIATION'], fond=GRIS_CLAIR, police='Helvetica-Bold')
+    total_coefficients = 0
+    for moyenne in bulletin['moyennes_par_matiere']:
+        matiere = moyenne['matiere_info']
+        total_coefficients += float(matiere['coefficient'])
+        ligne([
+            matiere['nom'], str(matiere['coefficient']),
+            _nombre(moyenne['moyenne']), mention(float(moyenne['moyenne'])),
+        ])
+    moyenne_generale = bulletin['moyenne_generale']
+    ligne(
+        ['MOYENNE GÉNÉRALE', '', _nombre(moyenne_generale), mention(moyenne_generale)],
+        fond=BLEU, couleur=colors.white, police='Helvetica-Bold', taille=10
+    )
+    if bulletin.get('moyenne_annuelle') is not None:
+        moyenne_annuelle = bulletin['moyenne_annuelle']
+        ligne(
+            [f"MOYENNE ANNUELLE ({bulletin['nombre_trimestres']} trimestres)", '',
+             _nombre(moyenne_annuelle), mention(moyenne_annuelle)],
+            fond=VERT, couleur=colors.white, police='Helvetica-Bold', taille=10
+        )
+    y -= 6 * mm
+
+    # Statistiques
+    moyenne_classe = bulletin.get('moyenne_classe')
+    statistiques = [
+        ('Rang', f"{bulletin['rang'] or '-'}/{bulletin['effectif_classe'] or '-'}"),
+        ('Moyenne Classe', f"{_nombre(moyenne_classe)}/10" if moyenne_classe is not None else '-'),
+        ('Total Coef.', f"{total_coefficients:g}"),
+    ]
+    tiers = largeur / 3
+    for i, (libelle, valeur) in enumerate(statistiques):
+        x = MARGE + i * tiers
+        c.setStrokeColor(BORDURE)
+        c.rect(x, y - 12 * mm, tiers, 12 * mm)
+        c.setFillColor(GRIS)
+        c.setFont('Helvetica', 8)
+        c.drawCentredString(x + tiers / 2, y - 4.5 * mm, libelle)
+        c.setFillColor(BLEU)
+        c.setFont('Helvetica-Bold', 12)
+        c.drawCentredString(x + tiers / 2, y - 9.5 * mm, valeur)
+    y -= 18 * mm
+
+    # Appréciation du conseil de classe
+    c.setFillColor(GRIS_CLAIR)
+    c.rect(MARGE, y - 6 * mm, largeur, 6 * mm, fill=1)
+    c.setFillColor(colors.black)
+    c.setFont('Helvetica-Bold', 9)
+    c.drawString(MARGE + 2 * mm, y - 4.2 * mm, 'APPRÉCIATIONS DU CONSEIL DE CLASSE')
+    c.rect(MARGE, y - 18 * mm, largeur, 12 * mm)
+    c.setFont('Helvetica-Oblique', 9)
+    c.drawString(MARGE + 3 * mm, y - 13 * mm, appreciation(moyenne_generale))
+    y -= 26 * mm
+
+    # Signatures
+    for i, (titre, detail) in enumerate([
+        ('Le Directeur', 'Signature et cachet'),
+        ('Le Professeur Principal', 'Signature'),
+        ('Le Parent/Tuteur', 'Signature'),
+    ]):
+        x = MARGE + i * tiers
+        c.setStrokeColor(GRIS)
+        c.setLineWidth(1)
+        c.line(x + 2 * mm, y, x + tiers - 2 * mm, y)
+        c.setFillColor(colors.black)
+        c.setFont('Helvetica-Bold', 9)
+        c.drawCentredString(x + tiers / 2, y - 5 * mm, titre)
+        c.setFillColor(GRIS)
+        c.setFont('Helvetica', 7)
+        c.drawCentredString(x + tiers / 2, y - 20 * mm, detail)
+
+    # Pied de page
+    c.setFont('Helvetica', 7)
+    c.drawCentredString(
+        LARGEUR / 2, MARGE,
+        f"Document édité le {contexte['edite_le']} - Document officiel à conserver"
+    )
+
+
+def contexte_rendu(donnees, ecole, annee):
+    """Éléments communs à tous les bulletins d'une classe"""
+    cle = cle_entete(ecole)
+    # Date imprimée en pied de page : elle fait partie de la clé du cache disque
+    edition = date.today()
+    return {
+        'entete': _entete(*cle),
+        'cle_entete': cle,
+        'annee': annee,
+        'periode_nom': donnees['periode_nom'],
+        'edition': edition,
+        'edite_le': edition.strftime('%d/%m/%Y'),
+    }
+
+
+def ecrire_pdf(bulletins, contexte, fichier):
+    """
+    Écrit les bulletins (une page chacun) dans un fichier PDF ouvert en binaire.
+    Lève ValueError au-delà de PAGES_MAX bulletins (mémoire du canvas).
+    """
+    if len(bulletins) > PAGES_MAX:
+        raise ValueError(f"{len(bulletins)} bulletins : au plus {PAGES_MAX} pages par PDF")
+    c = canvas.Canvas(fichier, pagesize=A4, pageCompression=1)
+    c.setTitle(f"Bulletins - {contexte['periode_nom']}")
+    for bulletin in bulletins:
+        dessiner_bulletin(c, bulletin, contexte)
+        c.showPage()
+    c.save()
+
+
+def nom_fichier_eleve(bulletin, periode_code):
+    eleve = bulletin['eleve']
+    return f"bulletin_{eleve['matricule']}_{periode_code}.pdf"
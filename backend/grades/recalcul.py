@@ -0,0 +1,288 @@
+"""
+Recalcul différé et dédoublonné des moyennes.
+
+Les signaux de Note ne recalculent plus la moyenne immédiatement : ils
+planifient la clé (eleve_id, matiere_id, periode_id). Les clés sont
+dédoublonnées puis recalculées en une seule passe :
+- à la fin de la portée courante (requête HTTP via RecalculDiffereMiddleware,
+  ou bloc ``with differer():``)
+- sinon au commit de la transaction en cours
+- sinon immédiatement (mode autocommit)
+
+En mode 'file' (settings.RECALCUL_MOYENNES_MODE), les clés sont écrites dans
+la table RecalculEnAttente et traitées par la commande ``traiter_recalculs``.
+Un recalcul de fin de requête en échec y est aussi mis (``differer(tolerant=True)``) :
+la réponse de la requête, dont les écritures sont validées, n'est pas une erreur.
+
+Cette file est distincte des tâches de fond (grades.taches, table Tache) : elle
+ne contient que des clés dédoublonnées (une ligne par moyenne, écrasée à chaque
+demande), sans suivi ni point de reprise, alimentée par les signaux. Une Tache
+est un travail soumis par un utilisateur (import, recalcul d'une période), suivi
+par un endpoint (avancement, erreurs) et repris après interruption.
+"""
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+TAILLE_LOT = 500
+
+logger = logging.getLogger(__name__)
+
+_etat = threading.local()
+_verrou = threading.Lock()
+_compteurs = {
+    'planifies': 0,    # clés reçues des signaux
+    'fusionnes': 0,    # clés déjà en attente (recalcul évité)
+    'recalcules': 0,   # clés effectivement recalculées
+    'mis_en_file': 0,  # clés transmises au worker (mode 'file')
+}
+
+
+def _incrementer(compteur, n=1):
+    with _verrou:
+        _compteurs[compteur] += n
+
+
+def statistiques():
+    """Copie des compteurs du processus courant"""
+    with _verrou:
+        return dict(_compteurs)
+
+
+def reinitialiser_statistiques():
+    with _verrou:
+        for compteur in _compteurs:
+            _compteurs[compteur] = 0
+
+
+class _Lot:
+    """Ensemble de clés en attente, exécuté une seule fois"""
+
+    def __init__(self, tolerant=False):
+        self.cles = set()
+        self.execute = False
+        self.tolerant = tolerant
+
+    def ajouter(self, cle):
+        if cle in self.cles:
+            _incrementer('fusionnes')
+        else:
+            self.cles.add(cle)
+
+    def executer(self):
+        self.execute = True
+        cles, self.cles = self.cles, set()
+        if self.tolerant:
+            executer_ou_mettre_en_file(cles)
+        else:
+            executer(cles)
+
+
+def _portee():
+    return getattr(_etat, 'portee', None)
+
+
+@contextmanager
+def differer(tolerant=False):
+    """
+    Regroupe les recalculs planifiés dans le bloc et les exécute à sa sortie.
+    Les portées imbriquées sont fusionnées dans la plus externe.
+
+    tolerant : un recalcul en échec est journalisé et ses clés mises en file
+    (RecalculEnAttente) au lieu de lever l'exception (fin de requête HTTP).
+
+    Si le bloc lève une exception, les recalculs ne sont pas perdus : les
+    écritures faites hors transaction sont déjà validées, ils sont donc
+    exécutés aussitôt ; dans une transaction, ils attendent son commit (et
+    sont abandonnés avec elle si elle est annulée).
+    """
+    if _portee() is not None:
+        yield
+        return
+
+    lot = _Lot(tolerant)
+    _etat.portee = lot
+    try:
+        yield
+    except Exception:
+        _etat.portee = None
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lot.executer)
+        else:
+            lot.executer()
+        raise
+    finally:
+        _etat.portee = None
+    lot.executer()
+
+
+def planifier(eleve_id, matiere_id, periode_id):
+    """Marque la moyenne (eleve, matiere, periode) comme à recalculer"""
+    _incrementer('planifies')
+    cle = (eleve_id, matiere_id, periode_id)
+
+    lot = _portee()
+    if lot is not None:
+        lot.ajouter(cle)
+        return
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        executer({cle})
+        return
+
+    # Un lot par transaction, tant que son callback on_commit est en attente
+    # (après un rollback Django l'a supprimé : on repart d'un nouveau lot)
+    lot = getattr(_etat, 'lot_transaction', None)
+    if (
+        lot is None
+        or lot.execute
+        or not any(f == lot.executer for _, f, _ in connection.run_on_commit)
+    ):
+        lot = _Lot()
+        _etat.lot_transaction = lot
+        transaction.on_commit(lot.executer)
+    lot.ajouter(cle)
+
+
+def executer(cles):
+    """Recalcule (ou met en file) un ensemble de clés dédoublonnées"""
+    if not cles:
+        return
+    if getattr(settings, 'RECALCUL_MOYENNES_MODE', 'synchrone') == 'file':
+        mettre_en_file(cles)
+    else:
+        recalculer(cles)
+
+
+def executer_ou_mettre_en_file(cles):
+    """
+    Comme executer, après des écritures déjà validées : un échec est journalisé
+    et les clés sont mises en file, reprises par traiter_recalculs.
+    """
+    if not cles:
+        return
+    try:
+        # Point de sauvegarde : un recalcul en échec n'écrit rien
+        with transaction.atomic():
+            executer(cles)
+    except Exception:
+        logger.exception("Recalcul de %d moyenne(s) en échec : mis en file", len(cles))
+        try:
+            mettre_en_file(cles)
+        except Exception:
+            logger.exception("Mise en file de %d moyenne(s) impossible", len(cles))
+
+
+def recalculer(cles):
+    """Recalcul groupé par période, par lots de TAILLE_LOT clés"""
+    from .models import Periode, MoyenneEleve
+
+    par_periode = defaultdict(list)
+    for eleve_id, matiere_id, periode_id in cles:
+        par_periode[periode_id].append((eleve_id, matiere_id))
+
+    # Une période supprimée entre-temps (suppression en cascade) est ignorée
+    for periode in Periode.objects.filter(id__in=par_periode.keys()):
+        paires = par_periode[periode.id]
+        for debut in range(0, len(paires), TAILLE_LOT):
+            MoyenneEleve.recalculer_moyennes(periode, paires[debut:debut + TAILLE_LOT])
+    _incrementer('recalcules', len(cles))
+
+
+def mettre_en_file(cles):
+    """Enregistre les clés dans la file locale (une ligne par clé, horodatée)"""
+    from .models import RecalculEnAttente
+
+    maintenant = timezone.now()
+    RecalculEnAttente.objects.bulk_create(
+        [
+            RecalculEnAttente(eleve_id=e, matiere_id=m, periode_id=p, demande_le=maintenant)
+            for e, m, p in cles
+        ],
+        update_conflicts=True,
+        unique_fields=['eleve', 'matiere', 'periode'],
+        update_fields=['demande_le'],
+        batch_size=TAILLE_LOT,
+    )
+    _incrementer('mis_en_file', len(cles))
+
+
+def traiter_file(limite=TAILLE_LOT):
+    """
+    Traite un lot de la file (worker). Retourne le nombre de clés traitées.
+    Une clé re-demandée pendant le traitement (demande_le plus récent) est conservée.
+    """
+    from .models import RecalculEnAttente
+
+    debut = timezone.now()
+    lignes = list(
+        RecalculEnAttente.objects.filter(demande_le__lte=debut)
+        .order_by('demande_le')
+        .values_list('id', 'eleve_id', 'matiere_id', 'periode_id')[:limite]
+    )
+    if not lignes:
+        return 0
+
+    recalculer({(e, m, p) for _, e, m, p in lignes})
+    RecalculEnAttente.objects.filter(
+        id__in=[ligne[0] for ligne in lignes], demande_le__lte=debut
+    ).delete()
+    return len(lignes)
+
+
+def recalculer_classe(classe_id, periode_id, eleve_id=None, simulation=False):
+    """
+    Recalcule (ou compare, en simulation) les moyennes des élèves actifs d'une
+    classe pour une période. Unité de travail de la commande calculer_moyennes.
+
+    Seules les moyennes nouvelles ou modifiées sont écrites (un upsert groupé).
+    Sans rien à écrire, le classement de la classe est tout de même enregistré
+    s'il manque (table MoyenneGenerale à remplir : les lectures le calculent en
+    mémoire mais ne l'écrivent jamais).
+    Retourne les compteurs : cles, nouvelles, modifiees, inchangees.
+    """
+    from .models import Note, MoyenneEleve, MoyenneGenerale, Periode
+
+    notes = Note.objects.filter(
+        periode_id=periode_id, eleve__classe_id=classe_id, eleve__statut='actif'
+    )
+    if eleve_id:
+        notes = notes.filter(eleve_id=eleve_id)
+    cles = set(notes.values_list('eleve_id', 'matiere_id').order_by().distinct())
+
+    compteurs = {'cles': len(cles), 'nouvelles': 0, 'modifiees': 0, 'inchangees': 0}
+    if not cles:
+        return compteurs
+
+    periode = Periode.objects.get(id=periode_id)
+    existantes = {
+        (eleve, matiere): (moyenne, nombre_notes)
+        for eleve, matiere, moyenne, nombre_notes in MoyenneEleve.objects.filter(
+            periode=periode, eleve_id__in={eleve for eleve, _ in cles}
+        ).values_list('eleve_id', 'matiere_id', 'moyenne', 'nombre_notes').order_by()
+    }
+
+    a_ecrire = {}
+    for cle, resultat in MoyenneEleve.calculer_moyennes(periode, cles).items():
+        if cle not in existantes:
+            compteurs['nouvelles'] += 1
+        elif existantes[cle] != resultat[:2]:
+            compteurs['modifiees'] += 1
+        else:
+            compteurs['inchangees'] += 1
+            continue
+        a_ecrire[cle] = resultat
+
+    if simulation:
+        return compteurs
+    if a_ecrire:
+        MoyenneEleve.enregistrer_moyennes(periode, a_ecrire)
+    elif not MoyenneGenerale.objects.filter(classe_id=classe_id, periode=periode).exists():
+        MoyenneGenerale.actualiser_classe(classe_id, periode)
+    return compteurs
@@ -0,0 +1,154 @@
+"""
+Cache du référentiel d'une école : matières, années scolaires, périodes et
+types d'évaluation.
+
+Ces tables changent rarement mais sont relues à chaque saisie de notes.
+Chaque jeu est mis en cache (backend de settings.CACHES, alias
+REFERENTIEL_CACHE) sous une clé qui contient la version de l'école et la
+version globale (types d'évaluation, communs à toutes les écoles) :
+
+    referentiel:<jeu>:<ecole_id>:<version école>:<version globale>
+
+Les signaux post_save/post_delete de ces modèles incrémentent la version
+concernée (voir grades.models) : les anciennes entrées ne sont plus lues et
+expirent d'elles-mêmes. Les compteurs hits/misses sont ceux du processus.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+GLOBAL = 'global'
+
+_verrou = threading.Lock()
+_compteurs = {
+    'hits': 0,            # jeux lus dans le cache
+    'misses': 0,          # jeux rechargés depuis la base
+    'invalidations': 0,   # versions incrémentées
+}
+
+
+def _incrementer(compteur, n=1):
+    with _verrou:
+        _compteurs[compteur] += n
+
+
+def statistiques():
+    """Copie des compteurs du processus courant"""
+    with _verrou:
+        return dict(_compteurs)
+
+
+def reinitialiser_statistiques():
+    with _verrou:
+        for compteur in _compteurs:
+            _compteurs[compteur] = 0
+
+
+def _cache():
+    return caches[settings.REFERENTIEL_CACHE]
+
+
+def _cle_version(portee):
+    return f'referentiel:version:{portee}'
+
+
+def _versions(ecole_id):
+    """Versions (école, globale), initialisées à l'horloge si absentes du cache"""
+    cache = _cache()
+    cles = [_cle_version(ecole_id), _cle_version(GLOBAL)]
+    versions = cache.get_many(cles)
+    for cle in cles:
+        if cle not in versions:
+            # Jamais 1 : une version évincée ne doit pas retomber sur d'anciennes entrées
+            cache.add(cle, time.time_ns(), timeout=None)
+            versions[cle] = cache.get(cle)
+    return versions[cles[0]], versions[cles[1]]
+
+
+def _incrementer_version(portee):
+    cache = _cache()
+    try:
+        cache.incr(_cle_version(portee))
+    except ValueError:
+        cache.set(_cle_version(portee), time.time_ns(), timeout=None)
+    _incrementer('invalidations')
+
+
+def invalider(ecole_id=None):
+    """
+    Invalide le référentiel d'une école (ou de toutes si ecole_id est None).
+    L'invalidation est refaite au commit : une lecture concurrente a pu
+    remettre en cache l'état non encore validé.
+    """
+    portee = GLOBAL if ecole_id is None else ecole_id
+    _incrementer_version(portee)
+    transaction.on_commit(lambda: _incrementer_version(portee))
+
+
+def _jeu(nom, ecole_id, charger):
+    cache = _cache()
+    version_ecole, version_globale = _versions(ecole_id)
+    cle = f'referentiel:{nom}:{ecole_id}:{version_ecole}:{version_globale}'
+    valeur = cache.get(cle)
+    if valeur is not None:
+        _incrementer('hits')
+        return valeur
+    _incrementer('misses')
+    valeur = charger()
+    cache.set(cle, valeur, timeout=settings.REFERENTIEL_CACHE_TIMEOUT)
+    return valeur
+
+
+def matieres(ecole_id):
+    """{id: Matiere} de l'école"""
+    from academic.models import Matiere
+    return _jeu('matieres', ecole_id, lambda: {
+        matiere.id: matiere for matiere in Matiere.objects.filter(ecole_id=ecole_id)
+    })
+
+
+def annees(ecole_id):
+    """{id: AnneeScolaire} de l'école"""
+    from academic.models import AnneeScolaire
+    return _jeu('annees', ecole_id, lambda: {
+        annee.id: annee for annee in AnneeScolaire.objects.filter(ecole_id=ecole_id)
+    })
+
+
+def periodes(ecole_id):
+    """{id: Periode} de l'école, dans l'ordre du modèle, avec leur année scolaire"""
+    from .models import Periode
+    return _jeu('periodes', ecole_id, lambda: {
+        periode.id: periode
+        for periode in Periode.objects.filter(annee_scolaire__ecole_id=ecole_id).select_related('annee_scolaire')
+    })
+
+
+def types_evaluation():
+    """{id: TypeEvaluation} (communs à toutes les écoles), dans l'ordre du modèle"""
+    from .models import TypeEvaluation
+    return _jeu('types', GLOBAL, lambda: {
+        type_evaluation.id: type_evaluation for type_evaluation in TypeEvaluation.objects.all()
+    })
+
+
+def _identifiant(valeur):
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+def matiere(ecole_id, matiere_id):
+    return matieres(ecole_id).get(_identifiant(matiere_id))
+
+
+def periode(ecole_id, periode_id):
+    return periodes(ecole_id).get(_identifiant(periode_id))
+
+
+def type_evaluation(type_id):
+    return types_evaluation().get(_identifiant(type_id))
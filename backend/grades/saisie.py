@@ -0,0 +1,67 @@
+"""
+Saisie groupée de notes (saisie rapide d'une classe).
+
+Les élèves sont chargés en une requête, les droits vérifiés en mémoire, les
+notes insérées ou mises à jour par un seul bulk_create(update_conflicts=True)
+dans une transaction, puis les moyennes concernées recalculées en une passe.
+"""
+from django.db import transaction
+
+from academic.models import Eleve
+from .models import Note, MoyenneEleve
+
+
+def saisir_notes(professeur, matiere, periode, type_evaluation, date_evaluation, notes_data):
+    """
+    Enregistre les notes d'une évaluation pour plusieurs élèves.
+
+    Retourne (notes enregistrées, messages d'erreur). Un élève introuvable ou
+    hors de la classe du professeur produit une erreur sans bloquer les autres.
+    """
+    # Une seule note par élève : la dernière saisie l'emporte
+    saisies = {}
+    for note_data in notes_data:
+        saisies[note_data['eleve_id']] = note_data
+
+    eleves = Eleve.objects.filter(id__in=saisies.keys()).select_related('classe')
+    eleves = {eleve.id: eleve for eleve in eleves}
+
+    notes = []
+    errors = []
+    for eleve_id, note_data in saisies.items():
+        eleve = eleves.get(eleve_id)
+        if eleve is None:
+            errors.append(f"Élève ID {eleve_id}: introuvable")
+            continue
+
+        # Vérifier que l'enseignant a le droit
+        if eleve.classe.professeur_principal_id != professeur.id:
+            errors.append(f"Élève {eleve.nom_complet}: pas autorisé")
+            continue
+
+        notes.append(Note(
+            eleve=eleve,
+            matiere=matiere,
+            periode=periode,
+            ecole_id=eleve.ecole_id,
+            type_evaluation=type_evaluation,
+            valeur=note_data['valeur'],
+            date_evaluation=date_evaluation,
+            professeur=professeur,
+            commentaire=note_data.get('commentaire', ''),
+        ))
+
+    if not notes:
+        return notes, errors
+
+    with transaction.atomic():
+        # bulk_create n'émet pas post_save : pas de recalcul note par note
+        notes = Note.objects.bulk_create(
+            notes,
+            update_conflicts=True,
+            unique_fields=['eleve', 'matiere', 'periode', 'type_evaluation'],
+            update_fields=['ecole', 'valeur', 'date_evaluation', 'professeur', 'commentaire', 'updated_at'],
+        )
+        MoyenneEleve.recalculer_moyennes(periode, {(note.eleve_id, matiere.id) for note in notes})
+
+    return notes, errors
@@ -1,9 +1,15 @@
 from rest_framework import serializers
-from .models import Periode, TypeEvaluation, Note, MoyenneEleve
+from .models import Periode, TypeEvaluation, Note, MoyenneEleve, Tache
 from academic.serializers import EleveListSerializer, MatiereSerializer
 from academic.models import Eleve, Matiere
 
 
+def _ecole_id(contexte):
+    """École de l'utilisateur de la requête du contexte (None sans école)"""
+    request = contexte.get('request')
+    return getattr(getattr(request, 'user', None), 'ecole_id', None)
+
+
 class PeriodeSerializer(serializers.ModelSerializer):
     """Serializer pour les périodes"""
     nom_display = serializers.CharField(source='get_nom_display', read_only=True)
@@ -93,16 +99,8 @@ class NoteSerializer(serializers.ModelSerializer):
         if request and hasattr(request.user, 'professeur_profile'):
             validated_data['professeur'] = request.user.professeur_profile
         
-        note = Note.objects.create(**validated_data)
-        
-        # Recalculer la moyenne après création
-        MoyenneEleve.calculer_moyenne(
-            eleve=note.eleve,
-            matiere=note.matiere,
-            periode=note.periode
-        )
-        
-        return note
+        # La moyenne est recalculée via le signal post_save (recalcul différé)
+        return Note.objects.create(**validated_data)
     
     def update(self, instance, validated_data):
         # Empêcher la modification si la période est clôturée
@@ -113,14 +111,7 @@ class NoteSerializer(serializers.ModelSerializer):
         
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
-        
-        # Recalculer la moyenne après modification
-        MoyenneEleve.calculer_moyenne(
-            eleve=instance.eleve,
-            matiere=instance.matiere,
-            periode=instance.periode
-        )
+        instance.save()  # Recalcul de la moyenne planifié par le signal post_save
         
         return instance
 
@@ -155,29 +146,58 @@ class NoteBulkCreateSerializer(serializers.Serializer):
     notes = NoteSaisieRapideSerializer(many=True)
     
     def validate(self, data):
-        # Vérifier que la matière existe
-        try:
-            Matiere.objects.get(id=data['matiere_id'])
-        except Matiere.DoesNotExist:
+        """
+        Vérifie la matière, la période (non clôturée) et le type d'évaluation,
+        lus dans le référentiel en cache de l'école de l'utilisateur, et les
+        ajoute aux données validées (matiere, periode, type_evaluation).
+        """
+        from . import referentiel
+        
+        ecole_id = _ecole_id(self.context)
+        data['matiere'] = referentiel.matiere(ecole_id, data['matiere_id'])
+        if data['matiere'] is None:
             raise serializers.ValidationError({'matiere_id': 'Matière introuvable'})
         
-        # Vérifier que la période existe et n'est pas clôturée
-        try:
-            periode = Periode.objects.get(id=data['periode_id'])
-            if periode.est_cloturee:
-                raise serializers.ValidationError({'periode_id': 'Cette période est clôturée'})
-        except Periode.DoesNotExist:
+        data['periode'] = referentiel.periode(ecole_id, data['periode_id'])
+        if data['periode'] is None:
             raise serializers.ValidationError({'periode_id': 'Période introuvable'})
+        if data['periode'].est_cloturee:
+            raise serializers.ValidationError({'periode_id': 'Cette période est clôturée'})
         
-        # Vérifier que le type d'évaluation existe
-        try:
-            TypeEvaluation.objects.get(id=data['type_evaluation_id'])
-        except TypeEvaluation.DoesNotExist:
+        data['type_evaluation'] = referentiel.type_evaluation(data['type_evaluation_id'])
+        if data['type_evaluation'] is None:
             raise serializers.ValidationError({'type_evaluation_id': 'Type d\'évaluation introuvable'})
         
         return data
 
 
+class NoteImportSerializer(serializers.Serializer):
+    """Serializer pour l'import de notes (format exemple_import_notes.csv)"""
+    file = serializers.FileField()
+    periode_id = serializers.IntegerField()
+    asynchrone = serializers.BooleanField(
+        required=False, default=False, help_text="Traiter l'import en tâche de fond"
+    )
+    
+    def validate_file(self, value):
+        if not value.name.lower().endswith(('.csv', '.xlsx')):
+            raise serializers.ValidationError(
+                "Le fichier doit être au format CSV ou Excel (.xlsx)"
+            )
+        return value
+    
+    def validate(self, data):
+        """Ajoute la période (référentiel en cache de l'école) aux données validées"""
+        from . import referentiel
+        
+        data['periode'] = referentiel.periode(_ecole_id(self.context), data['periode_id'])
+        if data['periode'] is None:
+            raise serializers.ValidationError({'periode_id': 'Période introuvable'})
+        if data['periode'].est_cloturee:
+            raise serializers.ValidationError({'periode_id': 'Cette période est clôturée'})
+        return data
+
+
 class MoyenneEleveSerializer(serializers.ModelSerializer):
     """Serializer pour les moyennes"""
     eleve_info = EleveListSerializer(source='eleve', read_only=True)
@@ -203,3 +223,19 @@ class MoyenneGeneraleSerializer(serializers.Serializer):
     moyenne_generale = serializers.DecimalField(max_digits=5, decimal_places=2)
     nombre_matieres = serializers.IntegerField()
     moyennes_par_matiere = MoyenneEleveSerializer(many=True)
+
+
+class TacheSerializer(serializers.ModelSerializer):
+    """Serializer pour le suivi d'une tâche de fond"""
+    statut_display = serializers.CharField(source='get_statut_display', read_only=True)
+    progression = serializers.FloatField(read_only=True)
+    debit = serializers.FloatField(read_only=True, help_text="Lignes traitées par seconde")
+    
+    class Meta:
+        model = Tache
+        fields = [
+            'id', 'type', 'parametres', 'statut', 'statut_display',
+            'total', 'traites', 'progression', 'debit', 'point_reprise', 'erreurs', 'resultat',
+            'created_at', 'demarree_le', 'terminee_le'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,295 @@
+"""
+Exécution de tâches de fond sans broker externe.
+
+Les tâches sont des lignes de la table Tache. Un endpoint les soumet
+(``soumettre``), la commande ``traiter_taches`` les exécute une par une :
+chaque type de tâche est une fonction enregistrée avec ``@tache('type')``
+qui reçoit la Tache et signale son avancement avec ``avancer``.
+
+Les imports (élèves, notes) portent sur un fichier déposé dans IMPORTS_DIR
+(``stocker_fichier``) et traité par lots : chaque lot est validé dans la même
+transaction que le point de reprise de la tâche, si bien qu'une tâche
+interrompue ou échouée reprend après la dernière ligne enregistrée.
+
+La file RecalculEnAttente (grades.recalcul, commande traiter_recalculs) est
+d'une autre nature : des clés de moyennes dédoublonnées, sans suivi.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Tache
+
+_executeurs = {}
+
+# Nombre maximal d'erreurs conservées sur une tâche
+MAX_ERREURS = 100
+
+
+def tache(type_tache):
+    """Décorateur : enregistre l'exécuteur d'un type de tâche"""
+    def enregistrer(fonction):
+        _executeurs[type_tache] = fonction
+        return fonction
+    return enregistrer
+
+
+def soumettre(type_tache, parametres, cle, ecole=None, utilisateur=None, fichier=''):
+    """
+    Crée une tâche en attente, ou retourne la tâche active de même clé.
+    fichier : chemin d'un fichier déposé (voir stocker_fichier).
+    Retourne (tache, creee).
+    """
+    try:
+        with transaction.atomic():
+            return Tache.objects.create(
+                type=type_tache,
+                cle=cle,
+                parametres=parametres,
+                ecole=ecole,
+                cree_par=utilisateur,
+                fichier=fichier,
+            ), True
+    except IntegrityError:
+        # Contrainte tache_cle_active_unique : une tâche identique est déjà active
+        existante = Tache.objects.filter(cle=cle, statut__in=Tache.STATUTS_ACTIFS).first()
+        if existante is None:
+            raise
+        return existante, False
+
+
+def avancer(tache, traites=0, total=None, erreurs=(), reprise=None, compteurs=None):
+    """
+    Enregistre l'avancement d'une tâche (lisible immédiatement par l'endpoint de suivi).
+    reprise : dernière ligne enregistrée ; compteurs : ajoutés à tache.resultat.
+    """
+    tache.traites += traites
+    if total is not None:
+        tache.total = total
+    if erreurs:
+        tache.erreurs = (tache.erreurs + list(erreurs))[:MAX_ERREURS]
+    if reprise is not None:
+        tache.point_reprise = reprise
+    if compteurs:
+        tache.resultat = {
+            **tache.resultat,
+            **{cle: tache.resultat.get(cle, 0) + valeur for cle, valeur in compteurs.items()},
+        }
+    Tache.objects.filter(pk=tache.pk).update(
+        traites=tache.traites, total=tache.total, erreurs=tache.erreurs,
+        point_reprise=tache.point_reprise, resultat=tache.resultat,
+    )
+
+
+def reserver():
+    """Passe la plus ancienne tâche en attente à 'en_cours' et la retourne (ou None)"""
+    for tache_id in Tache.objects.filter(statut='en_attente').order_by('created_at').values_list('id', flat=True)[:10]:
+        # Mise à jour conditionnelle : un seul worker obtient la tâche.
+        # demarree_le garde le premier démarrage : traites cumule toutes les reprises
+        if Tache.objects.filter(pk=tache_id, statut='en_attente').update(
+            statut='en_cours', demarree_le=Coalesce('demarree_le', Value(timezone.now()))
+        ):
+            return Tache.objects.get(pk=tache_id)
+    return None
+
+
+def reprendre_interrompues():
+    """Remet en attente les tâches restées 'en_cours' (worker arrêté) ; retourne leur nombre"""
+    return Tache.objects.filter(statut='en_cours').update(statut='en_attente')
+
+
+def relancer(tache):
+    """
+    Remet en attente une tâche échouée (un import reprend après son point de reprise).
+    Lève IntegrityError si une tâche de même clé est déjà active.
+    """
+    with transaction.atomic():
+        relancee = Tache.objects.filter(pk=tache.pk, statut='echouee').update(
+            statut='en_attente', terminee_le=None
+        )
+    if relancee:
+        tache.refresh_from_db()
+    return bool(relancee)
+
+
+def executer(tache):
+    """Exécute une tâche réservée et enregistre son statut final"""
+    executeur = _executeurs.get(tache.type)
+    try:
+        if executeur is None:
+            raise ValueError(f"Type de tâche inconnu : {tache.type}")
+        tache.resultat = executeur(tache) or {}
+        tache.statut = 'terminee'
+    except Exception as e:
+        tache.erreurs = (tache.erreurs + [str(e)])[:MAX_ERREURS]
+        tache.statut = 'echouee'
+    tache.terminee_le = timezone.now()
+    tache.save(update_fields=['statut', 'resultat', 'erreurs', 'terminee_le'])
+    return tache
+
+
+def traiter_prochaine():
+    """Réserve et exécute la prochaine tâche. Retourne la tâche, ou None si la file est vide"""
+    tache_reservee = reserver()
+    if tache_reservee is None:
+        return None
+    return executer(tache_reservee)
+
+
+@tache('recalcul_moyennes')
+def recalculer_moyennes_periode(tache):
+    """Recalcule toutes les moyennes d'une période, classe par classe"""
+    from collections import defaultdict
+    from .models import Note, MoyenneEleve, Periode
+
+    periode = Periode.objects.get(id=tache.parametres['periode_id'])
+    par_classe = defaultdict(set)
+    cles = Note.objects.filter(periode=periode).values_list(
+        'eleve__classe_id', 'eleve_id', 'matiere_id'
+    ).order_by().distinct()
+    for classe_id, eleve_id, matiere_id in cles:
+        par_classe[classe_id].add((eleve_id, matiere_id))
+
+    avancer(tache, total=sum(len(cles) for cles in par_classe.values()))
+    enregistrees = 0
+    for classe_id, cles in par_classe.items():
+        try:
+            with transaction.atomic():
+                enregistrees += len(MoyenneEleve.recalculer_moyennes(periode, cles))
+            avancer(tache, traites=len(cles))
+        except Exception as e:
+            avancer(tache, traites=len(cles), erreurs=[f"Classe {classe_id}: {e}"])
+
+    return {
+        'moyennes': enregistrees,
+        'message': f'{enregistrees} moyennes recalculées pour {periode.get_nom_display()}',
+    }
+
+
+def stocker_fichier(fichier, ecole_id):
+    """
+    Copie un fichier déposé dans IMPORTS_DIR, sous un nom dérivé de son contenu.
+    Retourne (chemin, empreinte sha256) ; un même fichier déposé deux fois
+    donne le même chemin.
+    """
+    repertoire = os.path.join(settings.IMPORTS_DIR, str(ecole_id or 0))
+    os.makedirs(repertoire, exist_ok=True)
+    empreinte = hashlib.sha256()
+    descripteur, temporaire = tempfile.mkstemp(dir=repertoire, suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as sortie:
+            for morceau in fichier.chunks():
+                empreinte.update(morceau)
+                sortie.write(morceau)
+        empreinte = empreinte.hexdigest()
+        chemin = os.path.join(repertoire, empreinte[:32] + os.path.splitext(fichier.name)[1].lower())
+        os.replace(temporaire, chemin)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+    return chemin, empreinte
+
+
+def _supprimer_fichier(tache):
+    """Supprime le fichier d'une tâche terminée s'il ne sert plus à une autre tâche active"""
+    if Tache.objects.filter(fichier=tache.fichier, statut__in=Tache.STATUTS_ACTIFS).exclude(pk=tache.pk).exists():
+        return
+    try:
+        os.remove(tache.fichier)
+    except FileNotFoundError:
+        pass
+
+
+def importer_fichier(tache, traiter_lot, colonne_requise):
+    """
+    Traite par lots les lignes du fichier d'une tâche, après son point de reprise.
+
+    traiter_lot(lot) enregistre un lot de (numéro de ligne, dict) et retourne
+    (compteurs, erreurs) ; le lot, les compteurs et le point de reprise sont
+    validés dans une même transaction.
+    """
+    from academic.imports import TAILLE_LOT, lire_lignes
+
+    def lignes():
+        # Le fichier est rouvert à chaque lecture (lire_lignes enveloppe le flux brut)
+        with open(tache.fichier, 'rb') as fichier:
+            yield from lire_lignes(File(fichier, name=tache.fichier), colonne_requise=colonne_requise)
+
+    def valider(lot):
+        with transaction.atomic():
+            compteurs, erreurs = traiter_lot(lot)
+            avancer(tache, traites=len(lot), erreurs=erreurs, reprise=lot[-1][0], compteurs=compteurs)
+
+    taille_lot = tache.parametres.get('taille_lot', TAILLE_LOT)
+    if not tache.total:
+        avancer(tache, total=sum(1 for _ in lignes()))
+
+    lot = []
+    for numero, row in lignes():
+        if numero <= tache.point_reprise:
+            continue
+        lot.append((numero, row))
+        if len(lot) >= taille_lot:
+            valider(lot)
+            lot = []
+    if lot:
+        valider(lot)
+
+    _supprimer_fichier(tache)
+    return tache.resultat
+
+
+@tache('import_eleves')
+def importer_eleves(tache):
+    """Importe les élèves d'un fichier dans une classe"""
+    from academic.imports import ImportEleves
+    from academic.models import Classe
+
+    classe = Classe.objects.select_related('ecole').get(id=tache.parametres['classe_id'])
+    import_eleves = ImportEleves(classe, classe.ecole)
+
+    def traiter_lot(lot):
+        import_eleves.rapport = []
+        return {'importes': import_eleves.importer_lot(lot)}, import_eleves.erreurs
+
+    resultat = importer_fichier(tache, traiter_lot, colonne_requise='nom')
+    return {
+        **resultat,
+        'message': f"{resultat.get('importes', 0)} élève(s) importé(s) dans {classe.nom}",
+    }
+
+
+@tache('import_notes')
+def importer_notes(tache):
+    """Importe les notes d'un fichier pour une période (moyennes recalculées lot par lot)"""
+    from users.models import Professeur
+    from .imports import ImportNotes
+    from .models import Periode
+
+    periode = Periode.objects.select_related('annee_scolaire__ecole').get(id=tache.parametres['periode_id'])
+    professeur = None
+    if tache.parametres.get('professeur_id'):
+        professeur = Professeur.objects.get(id=tache.parametres['professeur_id'])
+    import_notes = ImportNotes(periode, periode.annee_scolaire.ecole, professeur=professeur)
+
+    def traiter_lot(lot):
+        # Moyennes recalculées dans la transaction du lot : cohérentes à chaque point de reprise
+        import_notes.rapport = []
+        import_notes.cles = set()
+        importees = import_notes.importer_lot(lot)
+        moyennes = import_notes.recalculer()
+        return {'importees': importees, 'moyennes_recalculees': moyennes}, import_notes.erreurs
+
+    resultat = importer_fichier(tache, traiter_lot, colonne_requise='matricule')
+    return {
+        **resultat,
+        'message': f"{resultat.get('importees', 0)} note(s) importée(s) pour {periode.get_nom_display()}",
+    }
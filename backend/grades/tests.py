@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -46,3 +48,1788 @@ class GradesEndpointsTests(APITestCase):
         r = self.client.post(url_recalc, {})
         # Should be 400 because periode_id is required (auth as admin already)
         self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DonneesClasseMixin:
+    """Jeu de données minimal : une école, une classe, deux matières, une période"""
+
+    def creer_donnees(self, nb_eleves=4):
+        from datetime import date
+        from decimal import Decimal
+        from academic.models import Ecole, AnneeScolaire, Classe, Matiere
+        from users.models import Professeur
+        from .models import Periode, TypeEvaluation
+
+        self.ecole = Ecole.objects.create(
+            nom='École Test', code='TEST', directrice='Mme Test',
+            adresse='Dakar', telephone='770000000', email='ecole@test.sn'
+        )
+        self.annee = AnneeScolaire.objects.create(
+            libelle='2024-2025', date_debut=date(2024, 10, 1), date_fin=date(2025, 7, 31),
+            active=True, ecole=self.ecole
+        )
+        self.prof_user = User.objects.create_user(
+            username='prof', password='StrongPass123!', role='professeur', ecole=self.ecole
+        )
+        self.prof = Professeur.objects.create(user=self.prof_user, matricule='PR001', ecole=self.ecole)
+        self.classe = Classe.objects.create(
+            niveau='cm2', section='A', annee_scolaire=self.annee,
+            professeur_principal=self.prof, ecole=self.ecole
+        )
+        self.maths = Matiere.objects.create(nom='Mathématiques', code='MATH', coefficient=Decimal('2'), ecole=self.ecole)
+        self.francais = Matiere.objects.create(nom='Français', code='FR', coefficient=Decimal('1'), ecole=self.ecole)
+        self.periode = Periode.objects.create(
+            nom='trimestre1', annee_scolaire=self.annee,
+            date_debut=date(2024, 10, 1), date_fin=date(2024, 12, 20)
+        )
+        self.devoir = TypeEvaluation.objects.create(nom='devoir', coefficient=Decimal('1'))
+        self.composition = TypeEvaluation.objects.create(nom='composition', coefficient=Decimal('2'))
+        self.eleves = [self.creer_eleve(i) for i in range(1, nb_eleves + 1)]
+
+    def creer_eleve(self, i, classe=None):
+        from datetime import date
+        from academic.models import Eleve
+
+        return Eleve.objects.create(
+            matricule=f'EL{i:05d}', nom=f'NOM{i:02d}', prenom='Prenom', sexe='M',
+            date_naissance=date(2013, 1, 1), lieu_naissance='Dakar', adresse='Dakar',
+            classe=classe or self.classe, ecole=self.ecole
+        )
+
+    def prechauffer_referentiel(self):
+        """Met en cache le référentiel de l'école (matières, périodes, types)"""
+        from . import referentiel
+
+        referentiel.matieres(self.ecole.id)
+        referentiel.periodes(self.ecole.id)
+        referentiel.types_evaluation()
+
+    def prechauffer_principal(self, user=None):
+        """Met en cache l'utilisateur authentifié (users.cache_principaux)"""
+        from users.cache_principaux import principal
+
+        principal(User, (user or self.prof_user).pk)
+
+    def connecter(self, username='prof'):
+        login = self.client.post(reverse('login'), {"username": username, "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+
+    def noter(self, eleve, matiere, valeur, type_evaluation=None, periode=None):
+        from datetime import date
+        from decimal import Decimal
+        from .models import Note
+
+        periode = periode or self.periode
+        # Le recalcul des moyennes est exécuté au commit (simulé dans un TestCase)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Note.objects.create(
+                eleve=eleve, matiere=matiere, periode=periode,
+                type_evaluation=type_evaluation or self.devoir,
+                valeur=Decimal(str(valeur)), date_evaluation=periode.date_debut,
+                professeur=self.prof
+            )
+
+
+class ClassementClasseTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        self.creer_donnees(nb_eleves=4)
+        e1, e2, e3, _ = self.eleves
+        # e1 : (8*2 + 6*1) / 3 = 7.33 ; e2 : 7.33 (ex-aequo) ; e3 : 5 ; e4 : sans note
+        self.noter(e1, self.maths, 8)
+        self.noter(e1, self.francais, 6)
+        self.noter(e2, self.maths, 7)
+        self.noter(e2, self.francais, 8)
+        self.noter(e3, self.maths, 5)
+
+    def test_rangs_et_exaequo(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from .classement import classement_classe
+
+        with CaptureQueriesContext(connection) as ctx:
+            lignes = classement_classe(self.classe, self.periode)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        par_eleve = {l['eleve_id']: l for l in lignes}
+        e1, e2, e3, e4 = self.eleves
+        self.assertEqual(par_eleve[e1.id]['moyenne_generale'], 7.33)
+        self.assertEqual(par_eleve[e2.id]['moyenne_generale'], 7.33)
+        self.assertEqual([par_eleve[e.id]['rang'] for e in self.eleves], [1, 1, 3, None])
+        self.assertEqual([par_eleve[e.id]['rang_dense'] for e in self.eleves], [1, 1, 2, None])
+        self.assertTrue(par_eleve[e1.id]['is_exaequo'])
+        self.assertFalse(par_eleve[e3.id]['is_exaequo'])
+        self.assertEqual(par_eleve[e3.id]['nombre_matieres'], 1)
+        self.assertFalse(par_eleve[e4.id]['has_notes'])
+        self.assertEqual(lignes[-1]['eleve_id'], e4.id)
+
+    def test_repli_python_sans_fonctions_de_fenetre(self):
+        from unittest import mock
+        from django.db import connection
+        from .classement import classement_classe
+
+        attendu = classement_classe(self.classe, self.periode)
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            repli = classement_classe(self.classe, self.periode)
+        self.assertEqual(attendu, repli)
+
+    def test_classe_moyennes_endpoint(self):
+        login = self.client.post(reverse('login'), {"username": "prof", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        r = self.client.get(reverse('moyenne-classe-moyennes'), {'classe': self.classe.id, 'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['effectif_classe'], 4)
+        self.assertEqual([e['rang'] for e in r.data['eleves']], [1, 1, 3, None])
+
+        r = self.client.get(reverse('moyenne-bulletins-classe'), {'classe': self.classe.id, 'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(r.data['bulletins']), 3)
+        self.assertEqual([b['rang'] for b in r.data['bulletins']], [1, 1, 3])
+        self.assertEqual([b['isExaequo'] for b in r.data['bulletins']], [True, True, False])
+
+
+class BulletinsClasseTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from datetime import date
+        from .models import Periode
+
+        self.creer_donnees(nb_eleves=3)
+        self.periode2 = Periode.objects.create(
+            nom='trimestre2', annee_scolaire=self.annee,
+            date_debut=date(2025, 1, 5), date_fin=date(2025, 3, 30)
+        )
+        self.periode3 = Periode.objects.create(
+            nom='trimestre3', annee_scolaire=self.annee,
+            date_debut=date(2025, 4, 5), date_fin=date(2025, 6, 30)
+        )
+
+    def noter_annee(self, eleves):
+        for i, eleve in enumerate(eleves):
+            for periode in (self.periode, self.periode2, self.periode3):
+                self.noter(eleve, self.maths, 5 + i % 5, periode=periode)
+                self.noter(eleve, self.francais, 6, periode=periode)
+
+    def test_moyenne_annuelle(self):
+        from .bulletins import assembler_bulletins_classe
+
+        e1 = self.eleves[0]
+        self.noter(e1, self.maths, 8, periode=self.periode)
+        self.noter(e1, self.maths, 6, periode=self.periode2)
+        self.noter(e1, self.maths, 4, periode=self.periode3)
+
+        data = assembler_bulletins_classe(self.classe, self.periode3)
+        self.assertEqual(data['periode_code'], 'trimestre3')
+        self.assertEqual(len(data['bulletins']), 1)
+        bulletin = data['bulletins'][0]
+        self.assertEqual(bulletin['moyenne_generale'], 4.0)
+        self.assertEqual(bulletin['moyenne_annuelle'], 6.0)
+        self.assertEqual(bulletin['nombre_trimestres'], 3)
+        self.assertEqual(bulletin['rang'], 1)
+        self.assertEqual(len(bulletin['moyennes_par_matiere']), 1)
+
+    def test_bulletins_suivent_le_moteur_de_classement(self):
+        from .bulletins import assembler_bulletins_classe
+        from .classement import arrondir, classement_classe
+
+        self.noter_annee(self.eleves)
+        self.noter(self.eleves[1], self.francais, 9, type_evaluation=self.composition, periode=self.periode2)
+
+        attendus = {}
+        for periode in (self.periode, self.periode2, self.periode3):
+            for ligne in classement_classe(self.classe, periode):
+                attendus.setdefault(ligne['eleve_id'], []).append(ligne['moyenne_generale'])
+        rangs = {l['eleve_id']: l['rang'] for l in classement_classe(self.classe, self.periode3)}
+
+        for bulletin in assembler_bulletins_classe(self.classe, self.periode3)['bulletins']:
+            eleve_id = bulletin['eleve']['id']
+            self.assertEqual(bulletin['moyenne_generale'], attendus[eleve_id][-1])
+            self.assertEqual(bulletin['rang'], rangs[eleve_id])
+            self.assertEqual(
+                bulletin['moyenne_annuelle'],
+                arrondir(sum(attendus[eleve_id]) / len(attendus[eleve_id])),
+            )
+
+    def test_budget_requetes_independant_de_l_effectif(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from .bulletins import assembler_bulletins_classe
+
+        self.noter_annee(self.eleves)
+        with CaptureQueriesContext(connection) as petite:
+            data = assembler_bulletins_classe(self.classe, self.periode3)
+        self.assertEqual(len(data['bulletins']), 3)
+
+        self.eleves += [self.creer_eleve(i) for i in range(10, 30)]
+        self.noter_annee(self.eleves[3:])
+        with CaptureQueriesContext(connection) as grande:
+            data = assembler_bulletins_classe(self.classe, self.periode3)
+        self.assertEqual(len(data['bulletins']), 23)
+
+        self.assertLessEqual(len(petite.captured_queries), 3)
+        self.assertEqual(len(petite.captured_queries), len(grande.captured_queries))
+
+
+class BulletinsPdfTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        self.cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache, ignore_errors=True)
+        reglages = override_settings(BULLETINS_CACHE_DIR=self.cache)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        self.creer_donnees(nb_eleves=3)
+        for i, eleve in enumerate(self.eleves):
+            self.noter(eleve, self.maths, 5 + i)
+            self.noter(eleve, self.francais, 7)
+        self.connecter()
+        self.url = reverse('moyenne-bulletins-pdf')
+
+    def telecharger(self, **params):
+        r = self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id, **params})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        return r, b''.join(r.streaming_content)
+
+    def test_pdf_classe_fusionne(self):
+        r, contenu = self.telecharger()
+        self.assertEqual(r['Content-Type'], 'application/pdf')
+        self.assertTrue(contenu.startswith(b'%PDF'))
+        # Une page par élève
+        self.assertEqual(contenu.count(b'/Type /Page') - contenu.count(b'/Type /Pages'), 3)
+
+    def test_limite_de_pages_du_pdf_fusionne(self):
+        from unittest import mock
+
+        with mock.patch('grades.pdf.PAGES_MAX', 2):
+            r = self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id})
+            self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('mode=eleves', r.data['error'])
+            # Un PDF par élève : pas de limite
+            self.telecharger(mode='eleves')
+
+    def test_zip_un_pdf_par_eleve(self):
+        import io
+        import zipfile
+
+        r, contenu = self.telecharger(mode='eleves')
+        self.assertEqual(r['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(contenu)) as archive:
+            noms = archive.namelist()
+            self.assertEqual(len(noms), 3)
+            self.assertTrue(archive.read(noms[0]).startswith(b'%PDF'))
+
+    def test_pdf_eleve_et_droits(self):
+        eleve = self.eleves[1]
+        r, contenu = self.telecharger(eleve=eleve.id)
+        self.assertIn(eleve.matricule, r['Content-Disposition'])
+        self.assertEqual(contenu.count(b'/Type /Page') - contenu.count(b'/Type /Pages'), 1)
+
+        r = self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id, 'mode': 'docx'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def fichiers_en_cache(self):
+        import os
+        return sorted(
+            nom for _, _, noms in os.walk(self.cache) for nom in noms
+        )
+
+    def test_cache_adresse_par_contenu(self):
+        _, premier = self.telecharger()
+        fichiers = self.fichiers_en_cache()
+        self.assertEqual(len(fichiers), 1)
+
+        # Second téléchargement : même fichier, pas de nouveau rendu
+        _, second = self.telecharger()
+        self.assertEqual(premier, second)
+        self.assertEqual(self.fichiers_en_cache(), fichiers)
+
+        # Le zip réutilise les PDF par élève ; une note modifiée invalide la classe
+        self.telecharger(mode='eleves')
+        self.assertEqual(len(self.fichiers_en_cache()), 5)
+        self.noter(self.eleves[0], self.maths, 9, type_evaluation=self.composition)
+        self.assertEqual(self.fichiers_en_cache(), [])
+
+        _, troisieme = self.telecharger()
+        self.assertNotEqual(self.fichiers_en_cache(), fichiers)
+
+    def test_periode_cloturee_servie_depuis_le_disque(self):
+        self.telecharger()
+        self.periode.est_cloturee = True
+        self.periode.save()
+
+        # Classe, période (utilisateur et droits en cache) : aucune lecture des moyennes
+        with self.assertNumQueries(2):
+            self.telecharger()
+
+    def test_eviction_lru(self):
+        import os
+        from django.test import override_settings
+        from .cache_bulletins import evincer
+
+        self.telecharger(mode='eleves')
+        taille = sum(
+            os.path.getsize(os.path.join(racine, nom))
+            for racine, _, noms in os.walk(self.cache) for nom in noms
+        )
+        with override_settings(BULLETINS_CACHE_TAILLE_MAX=taille // 2):
+            evincer()
+        restants = self.fichiers_en_cache()
+        self.assertTrue(0 < len(restants) < 4)
+
+    def test_eviction_apres_ecriture_seulement(self):
+        from unittest import mock
+        from . import cache_bulletins
+
+        with mock.patch.object(cache_bulletins, 'evincer') as evincer:
+            self.telecharger()
+            self.assertEqual(evincer.call_count, 1)
+            # Fichier servi depuis le cache : l'arborescence n'est pas parcourue
+            self.telecharger()
+            self.assertEqual(evincer.call_count, 1)
+
+    def test_date_d_edition_dans_la_cle(self):
+        from datetime import date
+        from unittest import mock
+        from . import cache_bulletins, pdf
+
+        self.telecharger()
+        self.periode.est_cloturee = True
+        self.periode.save()
+        lendemain = mock.Mock(today=mock.Mock(return_value=date(2031, 1, 2)))
+        with mock.patch.object(pdf, 'date', lendemain), mock.patch.object(cache_bulletins, 'date', lendemain):
+            self.telecharger()
+        # Le PDF de la veille n'est pas resservi : la date imprimée est celle du jour
+        self.assertEqual(len(self.fichiers_en_cache()), 2)
+        self.assertTrue(any('_20310102_' in nom for nom in self.fichiers_en_cache()))
+
+
+class ExportNotesTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from academic.models import Classe
+
+        self.creer_donnees(nb_eleves=3)
+        e1, e2, _ = self.eleves
+        self.noter(e1, self.maths, 8)
+        self.noter(e1, self.maths, 6, type_evaluation=self.composition)
+        self.noter(e1, self.francais, 7)
+        self.noter(e2, self.maths, 9)
+        self.autre_classe = Classe.objects.create(
+            niveau='cm1', section='A', annee_scolaire=self.annee, ecole=self.ecole
+        )
+        self.noter(self.creer_eleve(50, classe=self.autre_classe), self.francais, 5)
+        self.url = reverse('moyenne-export-notes')
+
+    def lire_csv(self, r):
+        import csv
+        import io
+
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertTrue(r.streaming)
+        contenu = b''.join(r.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(contenu)))
+
+    def test_csv_classe(self):
+        self.connecter()
+        lignes = self.lire_csv(self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id}))
+        self.assertEqual(lignes[0], [
+            'Classe', 'Matricule', 'Nom', 'Prénom',
+            'FR Devoir', 'FR Composition', 'FR Moyenne',
+            'MATH Devoir', 'MATH Composition', 'MATH Moyenne',
+            'Moyenne générale', 'Rang',
+        ])
+        self.assertEqual(len(lignes), 4)
+        # (8 + 6 * 2) / 3 = 6.67 en maths, 7 en français : (6.67 * 2 + 7) / 3
+        self.assertEqual(lignes[1], [
+            'CM2-A', 'EL00001', 'NOM01', 'Prenom', '7.00', '', '7.00', '8.00', '6.00', '6.67', '6.78', '2',
+        ])
+        self.assertEqual(lignes[2][-2:], ['9.00', '1'])
+        self.assertEqual(lignes[3][4:], [''] * 8)
+
+        # Un enseignant n'exporte que sa classe
+        r = self.client.get(self.url, {'classe': self.autre_classe.id, 'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+        r = self.client.get(self.url, {'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_ecole_xlsx(self):
+        import io
+        import openpyxl
+
+        User.objects.create_user(username='admin', password='StrongPass123!', role='admin', ecole=self.ecole)
+        self.connecter('admin')
+        lignes = self.lire_csv(self.client.get(self.url, {'periode': self.periode.id}))
+        self.assertEqual([ligne[0] for ligne in lignes[1:]], ['CM1-A', 'CM2-A', 'CM2-A', 'CM2-A'])
+
+        r = self.client.get(self.url, {'periode': self.periode.id, 'type': 'xlsx'})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        classeur = openpyxl.load_workbook(io.BytesIO(b''.join(r.streaming_content)))
+        valeurs = list(classeur.active.iter_rows(values_only=True))
+        self.assertEqual(len(valeurs), 5)
+        self.assertEqual(valeurs[1][1], 'EL00050')
+        self.assertEqual(valeurs[2][-1], 2)
+
+    def test_rangs_apres_modification_d_une_matiere(self):
+        # Matière enregistrée : les classements de l'école sont supprimés, puis recalculés à l'export
+        self.maths.save()
+        self.connecter()
+        lignes = self.lire_csv(self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id}))
+        self.assertEqual([ligne[-2:] for ligne in lignes[1:3]], [['6.78', '2'], ['9.00', '1']])
+
+
+class MoyenneGeneraleTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from academic.models import Classe
+
+        self.creer_donnees(nb_eleves=3)
+        self.autre_classe = Classe.objects.create(
+            niveau='cm1', section='A', annee_scolaire=self.annee, ecole=self.ecole
+        )
+        self.autre_eleve = self.creer_eleve(50, classe=self.autre_classe)
+
+    def test_maintenue_a_chaque_note(self):
+        from .models import MoyenneGenerale
+
+        e1, e2, _ = self.eleves
+        self.noter(e1, self.maths, 6)
+        note = self.noter(e2, self.maths, 8)
+        self.noter(self.autre_eleve, self.maths, 9)
+
+        lignes = {g.eleve_id: g for g in MoyenneGenerale.objects.filter(classe=self.classe, periode=self.periode)}
+        self.assertEqual(lignes[e2.id].rang, 1)
+        self.assertEqual(lignes[e1.id].rang, 2)
+        self.assertEqual(lignes[e1.id].effectif_classe, 2)
+        autre = MoyenneGenerale.objects.get(eleve=self.autre_eleve, periode=self.periode)
+
+        # Seule la classe concernée est re-classée
+        note.valeur = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            note.save()
+        lignes = {g.eleve_id: g for g in MoyenneGenerale.objects.filter(classe=self.classe, periode=self.periode)}
+        self.assertEqual(lignes[e1.id].rang, 1)
+        self.assertEqual(lignes[e2.id].rang, 2)
+        self.assertEqual(
+            MoyenneGenerale.objects.get(pk=autre.pk).calculated_at, autre.calculated_at
+        )
+
+    def test_changement_de_classe(self):
+        from .models import MoyenneGenerale
+
+        e1, e2, _ = self.eleves
+        self.noter(e1, self.maths, 6)
+        self.noter(e2, self.maths, 8)
+
+        e2.classe = self.autre_classe
+        e2.save()
+        ligne = MoyenneGenerale.objects.get(eleve=e1, periode=self.periode)
+        self.assertEqual((ligne.rang, ligne.effectif_classe), (1, 1))
+        self.assertEqual(MoyenneGenerale.objects.get(eleve=e2, periode=self.periode).classe, self.autre_classe)
+
+    def test_suppression_eleve(self):
+        from academic.models import Eleve
+        from .models import MoyenneGenerale
+
+        e1, e2, e3 = self.eleves
+        for eleve, valeur in ((e1, 6), (e2, 8), (e3, 7)):
+            self.noter(eleve, self.maths, valeur)
+
+        e2.delete()
+        lignes = {g.eleve_id: g for g in MoyenneGenerale.objects.filter(classe=self.classe, periode=self.periode)}
+        self.assertEqual(set(lignes), {e1.id, e3.id})
+        self.assertEqual((lignes[e3.id].rang, lignes[e3.id].effectif_classe), (1, 2))
+        self.assertEqual(lignes[e1.id].moyenne_classe, Decimal('6.50'))
+
+        # Suppression groupée (queryset) : même re-classement
+        Eleve.objects.filter(pk=e3.pk).delete()
+        ligne = MoyenneGenerale.objects.get(classe=self.classe, periode=self.periode)
+        self.assertEqual((ligne.eleve_id, ligne.rang, ligne.effectif_classe), (e1.id, 1, 1))
+
+    def test_passage_classe_groupe(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from academic.models import Eleve
+        from .models import MoyenneGenerale
+
+        e1, e2, e3 = self.eleves
+        for eleve, valeur in ((e1, 6), (e2, 8), (e3, 7)):
+            self.noter(eleve, self.maths, valeur)
+        self.noter(self.autre_eleve, self.maths, 9)
+        admin = User.objects.create_user(username='admin', password='StrongPass123!', role='admin', ecole=self.ecole)
+        self.connecter('admin')
+        self.prechauffer_principal(admin)
+
+        def passage(eleves):
+            with CaptureQueriesContext(connection) as requetes:
+                r = self.client.post(reverse('eleve-passage-classe'), {
+                    'eleves': [e.id for e in eleves], 'nouvelle_classe': self.autre_classe.id, 'statut': 'actif',
+                }, format='json')
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+            self.assertEqual(r.data['eleves_mis_a_jour'], len(eleves))
+            return len(requetes)
+
+        # Une mise à jour groupée ; chaque (classe, période) touchée re-classée une fois
+        un_eleve = passage([e3])
+        self.assertLessEqual(passage([e1, e2]), un_eleve)
+
+        self.assertEqual(set(Eleve.objects.filter(classe=self.autre_classe).values_list('id', flat=True)),
+                         {e1.id, e2.id, e3.id, self.autre_eleve.id})
+        self.assertFalse(MoyenneGenerale.objects.filter(classe=self.classe).exists())
+        lignes = {g.eleve_id: g for g in MoyenneGenerale.objects.filter(classe=self.autre_classe, periode=self.periode)}
+        self.assertEqual([lignes[e.id].rang for e in (self.autre_eleve, e2, e3, e1)], [1, 2, 3, 4])
+        self.assertEqual(lignes[e1.id].effectif_classe, 4)
+
+    def test_lecture_sans_ecriture(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import MoyenneGenerale
+
+        e1, e2, _ = self.eleves
+        self.noter(e1, self.maths, 6)
+        self.noter(e2, self.maths, 8)
+        MoyenneGenerale.objects.all().delete()
+        self.connecter()
+
+        # Table vide : le classement est calculé en mémoire, rien n'est écrit
+        r = self.client.get(reverse('moyenne-moyenne-generale'), {'eleve': e1.id, 'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual((r.data['moyenne_generale'], r.data['rang']), (6.0, 2))
+        self.assertFalse(MoyenneGenerale.objects.exists())
+
+        # La commande calculer_moyennes remplit la table
+        call_command('calculer_moyennes', stdout=StringIO())
+        lignes = {g.eleve_id: g.rang for g in MoyenneGenerale.objects.filter(classe=self.classe, periode=self.periode)}
+        self.assertEqual(lignes, {e1.id: 2, e2.id: 1})
+
+    def test_enregistrements_reclasses_une_fois(self):
+        from unittest import mock
+        from .models import MoyenneGenerale
+        from .recalcul import differer
+
+        e1, e2, e3 = self.eleves
+        with mock.patch.object(
+            MoyenneGenerale, 'actualiser_classe', wraps=MoyenneGenerale.actualiser_classe
+        ) as actualiser:
+            with differer():
+                for eleve, valeur in ((e1, 6), (e2, 8), (e3, 7)):
+                    self.noter(eleve, self.maths, valeur)
+                actualiser.assert_not_called()
+        self.assertEqual(actualiser.call_count, 1)
+        lignes = {g.eleve_id: g.rang for g in MoyenneGenerale.objects.filter(classe=self.classe, periode=self.periode)}
+        self.assertEqual(lignes, {e1.id: 3, e2.id: 1, e3.id: 2})
+
+    def test_moyenne_generale_endpoint(self):
+        e1, e2, _ = self.eleves
+        self.noter(e1, self.maths, 6)
+        self.noter(e2, self.maths, 8)
+
+        login = self.client.post(reverse('login'), {"username": "prof", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        r = self.client.get(reverse('moyenne-moyenne-generale'), {'eleve': e1.id, 'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['moyenne_generale'], 6.0)
+        self.assertEqual(r.data['rang'], 2)
+        self.assertEqual(r.data['total_eleves'], 2)
+        self.assertEqual(r.data['moyenne_classe'], 7.0)
+        self.assertEqual(r.data['nombre_matieres'], 1)
+
+
+class SaisieRapideTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from academic.models import Classe
+
+        self.creer_donnees(nb_eleves=3)
+        self.autre_classe = Classe.objects.create(
+            niveau='cm1', section='A', annee_scolaire=self.annee, ecole=self.ecole
+        )
+        self.autre_eleve = self.creer_eleve(50, classe=self.autre_classe)
+        login = self.client.post(reverse('login'), {"username": "prof", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+
+    def saisir(self, notes):
+        return self.client.post(reverse('note-saisie-rapide'), {
+            'matiere_id': self.maths.id,
+            'periode_id': self.periode.id,
+            'type_evaluation_id': self.devoir.id,
+            'date_evaluation': '2024-10-15',
+            'notes': notes,
+        }, format='json')
+
+    def test_upsert_et_moyennes(self):
+        from .models import Note, MoyenneEleve, MoyenneGenerale
+
+        e1, e2, e3 = self.eleves
+        r = self.saisir([
+            {'eleve_id': e1.id, 'valeur': '7.5'},
+            {'eleve_id': e2.id, 'valeur': '6'},
+            {'eleve_id': self.autre_eleve.id, 'valeur': '9'},
+            {'eleve_id': 99999, 'valeur': '9'},
+        ])
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['created_count'], 2)
+        self.assertEqual(len(r.data['errors']), 2)
+        self.assertTrue(all(n['id'] for n in r.data['notes']))
+
+        # Nouvelle saisie de la même évaluation : mise à jour, pas de doublon
+        r = self.saisir([{'eleve_id': e1.id, 'valeur': '5'}, {'eleve_id': e3.id, 'valeur': '8'}])
+        self.assertEqual(r.data['created_count'], 2)
+        self.assertEqual(Note.objects.filter(periode=self.periode).count(), 3)
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1, matiere=self.maths).moyenne, 5)
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e3, matiere=self.maths).nombre_notes, 1)
+        self.assertEqual(MoyenneGenerale.objects.get(eleve=e3, periode=self.periode).rang, 1)
+        self.assertFalse(Note.objects.filter(eleve=self.autre_eleve).exists())
+
+    def test_budget_requetes_independant_du_nombre_de_notes(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+
+        self.prechauffer_referentiel()
+        self.prechauffer_principal()
+        with CaptureQueriesContext(connection) as petite:
+            self.saisir([{'eleve_id': e.id, 'valeur': '6'} for e in self.eleves[:1]])
+        self.eleves += [self.creer_eleve(i) for i in range(10, 40)]
+        with CaptureQueriesContext(connection) as grande:
+            r = self.saisir([{'eleve_id': e.id, 'valeur': '6'} for e in self.eleves])
+        self.assertEqual(r.data['created_count'], 33)
+        self.assertEqual(len(petite.captured_queries), len(grande.captured_queries))
+
+
+class ImportNotesTests(DonneesClasseMixin, APITestCase):
+    ENTETE = "matricule,matiere,type_evaluation,note,date_evaluation,commentaire\n"
+
+    def setUp(self):
+        from academic.models import Classe
+
+        self.creer_donnees(nb_eleves=3)
+        self.autre_classe = Classe.objects.create(
+            niveau='cm1', section='A', annee_scolaire=self.annee, ecole=self.ecole
+        )
+        self.autre_eleve = self.creer_eleve(50, classe=self.autre_classe)
+        self.connecter()
+
+    def importer(self, lignes, nom='notes.csv', entete=ENTETE):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        fichier = SimpleUploadedFile(nom, (entete + '\n'.join(lignes)).encode('utf-8'))
+        return self.client.post(
+            reverse('note-import-notes'), {'file': fichier, 'periode_id': self.periode.id}, format='multipart'
+        )
+
+    def test_import_et_rapport(self):
+        from .models import Note, MoyenneEleve, MoyenneGenerale
+
+        r = self.importer([
+            'EL00001,Mathématiques,Devoir,7.75,2024-10-15,Très bon travail',
+            'EL00001,MATH,Composition,"6,5",2024-11-15,',
+            'EL00002,francais,Devoir,8,2024-10-15,Bien',
+            'EL00002,Français,Devoir,9,2024-10-16,Corrigée',
+            'EL00003,Anglais,Devoir,7,2024-10-15,',
+            'EL00003,Mathématiques,Contrôle,7,2024-10-15,',
+            'EL00003,Mathématiques,Devoir,12,2024-10-15,',
+            'EL00003,Mathématiques,Devoir,5,2025-03-01,',
+            'EL00050,Mathématiques,Devoir,5,2024-10-15,',
+            'EL99999,Mathématiques,Devoir,5,2024-10-15,',
+        ])
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['lignes'], 10)
+        self.assertEqual(r.data['imported'], 3)
+        self.assertEqual(r.data['moyennes_recalculees'], 2)
+        self.assertIn('lignes_par_seconde', r.data)
+        self.assertEqual(len(r.data['errors']), 6)
+        statuts = [ligne['statut'] for ligne in r.data['rapport']]
+        self.assertEqual(statuts[:4], ['importee', 'importee', 'ignoree', 'importee'])
+
+        e1, e2, _ = self.eleves
+        self.assertEqual(Note.objects.filter(periode=self.periode).count(), 3)
+        self.assertEqual(Note.objects.get(eleve=e2).valeur, Decimal('9'))
+        self.assertEqual(Note.objects.get(eleve=e2).professeur, self.prof)
+        # (7.75 * 1 + 6.5 * 2) / 3
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1, matiere=self.maths).moyenne, Decimal('6.92'))
+        self.assertEqual(MoyenneGenerale.objects.get(eleve=e2, periode=self.periode).rang, 1)
+        self.assertFalse(Note.objects.filter(eleve=self.autre_eleve).exists())
+
+    def test_fichier_et_periode_invalides(self):
+        r = self.importer(['EL00001,Mathématiques,Devoir,7,2024-10-15,'], nom='notes.txt')
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+        r = self.importer(['EL00001,7'], entete="eleve,note\n")
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.periode.est_cloturee = True
+        self.periode.save()
+        r = self.importer(['EL00001,Mathématiques,Devoir,7,2024-10-15,'])
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_budget_requetes_independant_du_nombre_de_lignes(self):
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+
+        self.eleves += [self.creer_eleve(i) for i in range(10, 40)]
+
+        def lignes(eleves):
+            return [f'{e.matricule},MATH,Devoir,6,2024-10-15,' for e in eleves]
+
+        self.prechauffer_referentiel()
+        self.prechauffer_principal()
+        with CaptureQueriesContext(connection) as petite:
+            self.importer(lignes(self.eleves[:1]))
+        with CaptureQueriesContext(connection) as grande:
+            r = self.importer(lignes(self.eleves))
+        self.assertEqual(r.data['imported'], 33)
+        self.assertEqual(len(petite.captured_queries), len(grande.captured_queries))
+
+    def test_commande(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import Note
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as fichier:
+            fichier.write(self.ENTETE + 'EL00001,Mathématiques,Devoir,7,2024-10-15,\nEL00050,FR,Devoir,8,2024-10-15,\n')
+        self.addCleanup(os.remove, fichier.name)
+
+        sortie = StringIO()
+        call_command('importer_notes', fichier.name, '--periode', str(self.periode.id), stdout=sortie)
+        self.assertIn('Notes importées: 2', sortie.getvalue())
+        self.assertIsNone(Note.objects.get(eleve=self.autre_eleve).professeur)
+
+
+class CalculMoyenneTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from .models import TypeEvaluation
+
+        self.creer_donnees(nb_eleves=2)
+        self.controle = TypeEvaluation.objects.create(nom='controle', coefficient=Decimal('1'))
+
+    def test_precision_decimale(self):
+        from .models import MoyenneEleve
+
+        e1 = self.eleves[0]
+        self.noter(e1, self.maths, '10.01')
+        self.noter(e1, self.maths, '10.00', type_evaluation=self.controle)
+
+        # 20.01 / 2 = 10.005 : arrondi au centième supérieur (10.0 en float)
+        moyenne = MoyenneEleve.calculer_moyenne(e1, self.maths, self.periode)
+        self.assertEqual(moyenne.moyenne, Decimal('10.01'))
+        self.assertEqual(moyenne.total_points, Decimal('20.01'))
+        self.assertEqual(moyenne.nombre_notes, 2)
+        self.assertIsNone(MoyenneEleve.calculer_moyenne(e1, self.francais, self.periode))
+
+    def test_calcul_groupe_en_une_requete(self):
+        from .models import MoyenneEleve
+
+        e1, e2 = self.eleves
+        self.noter(e1, self.maths, 12)
+        self.noter(e1, self.maths, 15, type_evaluation=self.composition)
+        self.noter(e2, self.maths, 9)
+        self.noter(e2, self.francais, 11)
+
+        cles = {(e1.id, self.maths.id), (e2.id, self.maths.id), (e1.id, self.francais.id)}
+        with self.assertNumQueries(1):
+            resultats = MoyenneEleve.calculer_moyennes(self.periode, cles)
+
+        self.assertEqual(resultats, {
+            (e1.id, self.maths.id): (Decimal('14.00'), 2, Decimal('42.00')),
+            (e2.id, self.maths.id): (Decimal('9.00'), 1, Decimal('9.00')),
+        })
+
+
+class CommandeCalculerMoyennesTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from .models import MoyenneEleve
+
+        self.creer_donnees(nb_eleves=2)
+        e1, e2 = self.eleves
+        self.noter(e1, self.maths, 12)
+        self.noter(e2, self.maths, 8)
+        self.noter(e2, self.francais, 14)
+        # Moyennes désynchronisées : une erronée, une absente
+        MoyenneEleve.objects.filter(eleve=e1).update(moyenne=Decimal('3'))
+        MoyenneEleve.objects.filter(eleve=e2, matiere=self.francais).delete()
+
+    def appeler(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        sortie = StringIO()
+        call_command('calculer_moyennes', *args, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_simulation_sans_ecriture(self):
+        from .models import MoyenneEleve
+
+        sortie = self.appeler('--dry-run', '--ecole', str(self.ecole.id))
+        self.assertIn('Nouvelles (à créer): 1', sortie)
+        self.assertIn('Modifiées (à mettre à jour): 1', sortie)
+        self.assertIn('Inchangées: 1', sortie)
+        self.assertEqual(MoyenneEleve.objects.get(eleve=self.eleves[0]).moyenne, 3)
+
+    def test_recalcul(self):
+        from .models import MoyenneEleve
+
+        self.appeler('--workers', '2')
+        self.assertEqual(MoyenneEleve.objects.get(eleve=self.eleves[0]).moyenne, 12)
+        self.assertEqual(
+            MoyenneEleve.objects.get(eleve=self.eleves[1], matiere=self.francais).moyenne, 14
+        )
+        self.assertIn('Inchangées: 3', self.appeler('--dry-run'))
+
+
+class RecalculDiffereTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from .recalcul import reinitialiser_statistiques
+
+        self.creer_donnees(nb_eleves=2)
+        reinitialiser_statistiques()
+
+    def test_recalculs_fusionnes_dans_une_portee(self):
+        from .models import MoyenneEleve
+        from .recalcul import differer, statistiques
+
+        e1, e2 = self.eleves
+        with differer():
+            self.noter(e1, self.maths, 4)
+            self.noter(e1, self.maths, 8, type_evaluation=self.composition)
+            self.noter(e2, self.maths, 6)
+            self.assertFalse(MoyenneEleve.objects.exists())
+
+        # (4*1 + 8*2) / 3
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1).moyenne, Decimal('6.67'))
+        compteurs = statistiques()
+        self.assertEqual(compteurs['planifies'], 3)
+        self.assertEqual(compteurs['fusionnes'], 1)
+        self.assertEqual(compteurs['recalcules'], 2)
+
+    def test_recalcul_au_commit(self):
+        from .models import MoyenneEleve, Note
+
+        e1 = self.eleves[0]
+        note = self.noter(e1, self.maths, 4)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            note.valeur = 9
+            note.save()
+            note.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1).moyenne, 4)
+
+    def test_recalculs_conserves_si_le_bloc_echoue(self):
+        from .models import MoyenneEleve
+        from .recalcul import differer
+
+        e1 = self.eleves[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError):
+                with differer():
+                    self.noter(e1, self.maths, 4)
+                    raise ValueError
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1).moyenne, 4)
+
+    def test_echec_du_recalcul_en_fin_de_requete(self):
+        from unittest import mock
+        from .models import MoyenneEleve, Note, RecalculEnAttente
+        from .recalcul import traiter_file
+
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from core.middleware import RecalculDiffereMiddleware
+
+        e1 = self.eleves[0]
+        note = self.noter(e1, self.maths, 4)
+
+        def vue(request):
+            note.valeur = 5
+            note.save()
+            return HttpResponse(status=200)
+
+        # La note est enregistrée : l'échec du recalcul ne fait pas de la réponse une erreur 500
+        with mock.patch('grades.recalcul.recalculer', side_effect=RuntimeError), \
+                self.assertLogs('grades.recalcul', level='ERROR'):
+            reponse = RecalculDiffereMiddleware(vue)(RequestFactory().post('/'))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(Note.objects.get(pk=note.pk).valeur, 5)
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1).moyenne, 4)
+
+        # Clé mise en file : le worker traiter_recalculs la reprend
+        self.assertEqual(
+            list(RecalculEnAttente.objects.values_list('eleve_id', 'matiere_id')), [(e1.id, self.maths.id)]
+        )
+        self.assertEqual(traiter_file(), 1)
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1).moyenne, 5)
+
+    def test_derniere_note_supprimee(self):
+        from .models import MoyenneEleve, MoyenneGenerale
+
+        e1, e2 = self.eleves
+        note = self.noter(e1, self.maths, 4)
+        self.noter(e1, self.francais, 8)
+        self.noter(e2, self.maths, 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            note.delete()
+        self.assertEqual(
+            set(MoyenneEleve.objects.filter(eleve=e1).values_list('matiere_id', flat=True)), {self.francais.id}
+        )
+        self.assertEqual(MoyenneGenerale.objects.get(eleve=e1, periode=self.periode).moyenne, 8)
+
+    def test_mode_file(self):
+        from django.test import override_settings
+        from .models import MoyenneEleve, RecalculEnAttente
+        from .recalcul import traiter_file
+
+        e1, e2 = self.eleves
+        with override_settings(RECALCUL_MOYENNES_MODE='file'):
+            self.noter(e1, self.maths, 4)
+            self.noter(e1, self.maths, 7, type_evaluation=self.composition)
+            self.noter(e2, self.francais, 7)
+        self.assertEqual(RecalculEnAttente.objects.count(), 2)
+        self.assertFalse(MoyenneEleve.objects.exists())
+
+        self.assertEqual(traiter_file(), 2)
+        self.assertEqual(RecalculEnAttente.objects.count(), 0)
+        # (4*1 + 7*2) / 3
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e1).moyenne, 6)
+        self.assertEqual(MoyenneEleve.objects.get(eleve=e2).moyenne, 7)
+
+
+class TacheRecalculTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from .models import MoyenneEleve
+
+        self.creer_donnees(nb_eleves=3)
+        for i, eleve in enumerate(self.eleves):
+            self.noter(eleve, self.maths, 10 + i)
+            self.noter(eleve, self.francais, 12)
+        MoyenneEleve.objects.all().delete()
+        User.objects.create_user(username='admin', password='StrongPass123!', role='admin', ecole=self.ecole)
+        self.connecter('admin')
+
+    def test_recalcul_asynchrone_et_suivi(self):
+        from .models import MoyenneEleve
+        from .taches import traiter_prochaine
+
+        url = reverse('moyenne-recalculer')
+        r = self.client.post(url, {'periode_id': self.periode.id}, format='json')
+        self.assertEqual(r.status_code, status.HTTP_202_ACCEPTED)
+        tache_id = r.data['tache']['id']
+        self.assertEqual(r.data['tache']['statut'], 'en_attente')
+        self.assertFalse(MoyenneEleve.objects.exists())
+
+        # Re-soumission idempotente tant que la tâche est active
+        r = self.client.post(url, {'periode_id': self.periode.id}, format='json')
+        self.assertEqual(r.data['tache']['id'], tache_id)
+
+        self.assertEqual(traiter_prochaine().statut, 'terminee')
+        self.assertIsNone(traiter_prochaine())
+        self.assertEqual(MoyenneEleve.objects.count(), 6)
+
+        r = self.client.get(reverse('tache-detail', args=[tache_id]))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual((r.data['traites'], r.data['total']), (6, 6))
+        self.assertEqual(r.data['progression'], 100.0)
+        self.assertEqual(r.data['resultat']['moyennes'], 6)
+        self.assertEqual(r.data['erreurs'], [])
+
+        # Tâche terminée : une nouvelle demande crée une nouvelle tâche
+        r = self.client.post(url, {'periode_id': self.periode.id}, format='json')
+        self.assertNotEqual(r.data['tache']['id'], tache_id)
+
+    def test_tache_en_echec(self):
+        from .taches import soumettre, traiter_prochaine
+
+        soumettre('recalcul_moyennes', {'periode_id': 0}, cle='recalcul_moyennes:0', ecole=self.ecole)
+        tache = traiter_prochaine()
+        self.assertEqual(tache.statut, 'echouee')
+        self.assertEqual(len(tache.erreurs), 1)
+
+
+class TacheImportTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        self.depot = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.depot, ignore_errors=True)
+        reglages = override_settings(IMPORTS_DIR=self.depot)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        self.creer_donnees(nb_eleves=5)
+        self.connecter()
+
+    def deposer(self, contenu):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return self.client.post(reverse('note-import-notes'), {
+            'file': SimpleUploadedFile('notes.csv', contenu.encode('utf-8')),
+            'periode_id': self.periode.id,
+            'asynchrone': True,
+        }, format='multipart')
+
+    def contenu(self):
+        lignes = [f'{e.matricule},MATH,Devoir,{5 + i},2024-10-15,' for i, e in enumerate(self.eleves)]
+        return ImportNotesTests.ENTETE + '\n'.join(lignes + ['EL99999,MATH,Devoir,5,2024-10-15,'])
+
+    def test_import_asynchrone_avec_reprise(self):
+        import os
+        from unittest import mock
+        from .imports import ImportNotes
+        from .models import Note, MoyenneEleve, Tache
+        from .taches import traiter_prochaine
+
+        r = self.deposer(self.contenu())
+        self.assertEqual(r.status_code, status.HTTP_202_ACCEPTED)
+        tache_id = r.data['tache']['id']
+        self.assertFalse(Note.objects.exists())
+        # Nouvel envoi du même fichier (connexion coupée) : même tâche
+        self.assertEqual(self.deposer(self.contenu()).data['tache']['id'], tache_id)
+        Tache.objects.filter(pk=tache_id).update(parametres={
+            **Tache.objects.get(pk=tache_id).parametres, 'taille_lot': 2
+        })
+
+        # Le worker échoue au deuxième lot : le premier reste enregistré
+        importer_lot = ImportNotes.importer_lot
+        appels = []
+
+        def importer_lot_fragile(import_notes, lot):
+            appels.append(lot)
+            if len(appels) == 2:
+                raise RuntimeError('connexion perdue')
+            return importer_lot(import_notes, lot)
+
+        with mock.patch.object(ImportNotes, 'importer_lot', importer_lot_fragile):
+            tache = traiter_prochaine()
+        self.assertEqual(tache.statut, 'echouee')
+        self.assertEqual((tache.traites, tache.total, tache.point_reprise), (2, 6, 3))
+        self.assertEqual(Note.objects.count(), 2)
+        self.assertEqual(MoyenneEleve.objects.count(), 2)
+        self.assertTrue(os.path.exists(tache.fichier))
+
+        # Relance : reprise après la ligne 3, sans ré-importer le premier lot
+        r = self.client.post(reverse('tache-relancer', args=[tache_id]))
+        self.assertEqual(r.status_code, status.HTTP_202_ACCEPTED)
+        appels.clear()
+        with mock.patch.object(ImportNotes, 'importer_lot', lambda i, lot: appels.append(lot) or importer_lot(i, lot)):
+            tache = traiter_prochaine()
+        self.assertEqual(tache.statut, 'terminee')
+        self.assertEqual([numero for lot in appels for numero, _ in lot], [4, 5, 6, 7])
+        self.assertEqual(Note.objects.count(), 5)
+        self.assertEqual(MoyenneEleve.objects.count(), 5)
+        self.assertFalse(os.path.exists(tache.fichier))
+
+        r = self.client.get(reverse('tache-detail', args=[tache_id]))
+        self.assertEqual((r.data['traites'], r.data['total'], r.data['point_reprise']), (6, 6, 7))
+        self.assertEqual(r.data['resultat']['importees'], 5)
+        self.assertEqual(len(r.data['erreurs']), 2)
+        self.assertIsNotNone(r.data['debit'])
+
+        # Seule une tâche échouée peut être relancée
+        r = self.client.post(reverse('tache-relancer', args=[tache_id]))
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reprise_des_taches_interrompues(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import Note
+        from .taches import reserver
+
+        self.deposer(self.contenu())
+        reserver()  # worker arrêté après avoir pris la tâche
+
+        sortie = StringIO()
+        call_command('traiter_taches', stdout=sortie)
+        self.assertFalse(Note.objects.exists())
+        call_command('traiter_taches', '--reprendre', stdout=sortie)
+        self.assertIn('1 tâche(s) interrompue(s)', sortie.getvalue())
+        self.assertEqual(Note.objects.count(), 5)
+
+    def test_debit_depuis_le_premier_demarrage(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Tache
+        from .taches import reserver, reprendre_interrompues
+
+        self.deposer(self.contenu())
+        debut = timezone.now() - timedelta(seconds=60)
+        Tache.objects.update(statut='en_cours', demarree_le=debut, traites=3)  # worker arrêté en cours de route
+        reprendre_interrompues()
+
+        # La reprise ne remet pas le chronomètre à zéro : traites cumule tous les passages
+        tache = reserver()
+        self.assertEqual(tache.demarree_le, debut)
+        self.assertLessEqual(tache.debit, 0.1)
+
+
+class ReferentielCacheTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from . import referentiel
+
+        self.creer_donnees(nb_eleves=2)
+        referentiel.reinitialiser_statistiques()
+        self.connecter()
+
+    def saisir(self):
+        return self.client.post(reverse('note-saisie-rapide'), {
+            'matiere_id': self.maths.id,
+            'periode_id': self.periode.id,
+            'type_evaluation_id': self.devoir.id,
+            'date_evaluation': '2024-10-15',
+            'notes': [{'eleve_id': self.eleves[0].id, 'valeur': '6'}],
+        }, format='json')
+
+    def test_saisie_sans_relecture_du_referentiel(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import referentiel
+
+        self.assertEqual(self.saisir().status_code, status.HTTP_200_OK)
+        self.assertEqual(referentiel.statistiques()['misses'], 3)
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(self.saisir().status_code, status.HTTP_200_OK)
+        self.assertEqual(referentiel.statistiques()['hits'], 3)
+        tables = ' '.join(q['sql'] for q in requetes.captured_queries)
+        for table in ('"academic_matiere"', '"grades_periode"', '"grades_typeevaluation"'):
+            self.assertNotIn(f'FROM {table}', tables)
+
+    def test_invalidation_par_les_signaux(self):
+        from academic.models import Ecole, AnneeScolaire
+        from . import referentiel
+        from .models import Periode
+
+        self.prechauffer_referentiel()
+        self.periode.est_cloturee = True
+        self.periode.save()
+        r = self.saisir()
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('clôturée', str(r.data['periode_id']))
+
+        self.maths.delete()
+        self.assertIsNone(referentiel.matiere(self.ecole.id, self.maths.id))
+        self.devoir.coefficient = Decimal('3')
+        self.devoir.save()
+        self.assertEqual(referentiel.type_evaluation(self.devoir.id).coefficient, 3)
+
+        # Référentiels cloisonnés par école
+        autre = Ecole.objects.create(
+            nom='Autre', code='AUTRE', directrice='Mme X', adresse='Thiès', telephone='1', email='a@b.sn'
+        )
+        annee = AnneeScolaire.objects.create(
+            libelle='2024-2025', date_debut=self.annee.date_debut, date_fin=self.annee.date_fin, ecole=autre
+        )
+        Periode.objects.create(
+            nom='trimestre1', annee_scolaire=annee, date_debut=self.periode.date_debut, date_fin=self.periode.date_fin
+        )
+        self.assertEqual(list(referentiel.periodes(self.ecole.id)), [self.periode.id])
+
+    def test_liste_des_periodes_depuis_le_cache(self):
+        from .models import Periode
+
+        Periode.objects.create(
+            nom='trimestre2', annee_scolaire=self.annee,
+            date_debut=self.periode.date_fin, date_fin=self.annee.date_fin, est_cloturee=True
+        )
+        r = self.client.get(reverse('periode-list'))
+        self.assertEqual([p['nom'] for p in r.data['results']], ['trimestre1', 'trimestre2'])
+        with self.assertNumQueries(0):  # utilisateur du jeton en cache
+            r = self.client.get(reverse('periode-list'), {'non_cloturees': 'true'})
+        self.assertEqual([p['nom'] for p in r.data['results']], ['trimestre1'])
+
+
+class CacheVuesTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        self.creer_donnees(nb_eleves=2)
+        self.admin_user = User.objects.create_user(
+            username='admin', password='StrongPass123!', role='admin', ecole=self.ecole
+        )
+        self.connecter()
+
+    def test_liste_des_classes_en_cache(self):
+        r = self.client.get(reverse('classe-list'))
+        self.assertEqual(r['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):  # validateurs ETag (utilisateur et profil en cache)
+            r = self.client.get(reverse('classe-list'))
+        self.assertEqual(r['X-Cache'], 'HIT')
+        self.assertEqual(r.data['results'][0]['effectif_actuel'], 2)
+
+        # Nouvel élève : effectif périmé
+        self.creer_eleve(3)
+        r = self.client.get(reverse('classe-list'))
+        self.assertEqual(r['X-Cache'], 'MISS')
+        self.assertEqual(r.data['results'][0]['effectif_actuel'], 3)
+
+        # Paramètres et objet demandé font partie de la clé
+        self.assertEqual(self.client.get(reverse('classe-list'), {'page': 1})['X-Cache'], 'MISS')
+        r = self.client.get(reverse('classe-detail', args=[self.classe.id]))
+        self.assertEqual((r.status_code, r['X-Cache']), (status.HTTP_200_OK, 'MISS'))
+        self.assertEqual(self.client.get(reverse('classe-detail', args=[self.classe.id]))['X-Cache'], 'HIT')
+
+    def test_cle_par_role_et_professeur(self):
+        from users.models import Professeur
+
+        self.client.get(reverse('classe-list'))
+        autre = User.objects.create_user(
+            username='prof2', password='StrongPass123!', role='professeur', ecole=self.ecole
+        )
+        Professeur.objects.create(user=autre, matricule='PR002', ecole=self.ecole)
+        self.connecter('prof2')
+        r = self.client.get(reverse('classe-list'))
+        self.assertEqual((r['X-Cache'], r.data['count']), ('MISS', 0))
+
+        self.connecter('admin')
+        r = self.client.get(reverse('classe-list'))
+        self.assertEqual((r['X-Cache'], r.data['count']), ('MISS', 1))
+
+    def test_invalidation_des_matieres_et_periodes(self):
+        self.client.get(reverse('matiere-list'))
+        self.client.get(reverse('periode-list'))
+        self.maths.nom = 'Maths'
+        self.maths.save()
+        r = self.client.get(reverse('matiere-list'))
+        self.assertEqual(r['X-Cache'], 'MISS')
+        self.assertIn('Maths', [m['nom'] for m in r.data['results']])
+        self.assertEqual(self.client.get(reverse('periode-list'))['X-Cache'], 'HIT')
+
+        self.periode.est_cloturee = True
+        self.periode.save()
+        r = self.client.get(reverse('periode-list'))
+        self.assertEqual(r['X-Cache'], 'MISS')
+        self.assertTrue(r.data['results'][0]['est_cloturee'])
+
+    def test_moyennes_apres_recalcul_groupe(self):
+        self.noter(self.eleves[0], self.maths, 6)
+        params = {'periode': self.periode.id}
+        r = self.client.get(reverse('moyenne-list'), params)
+        self.assertEqual([float(m['moyenne']) for m in r.data], [6.0])
+        self.assertEqual(self.client.get(reverse('moyenne-list'), params)['X-Cache'], 'HIT')
+
+        # Upsert groupé des moyennes (sans signal) : invalidation explicite
+        self.noter(self.eleves[0], self.maths, 8, type_evaluation=self.composition)
+        r = self.client.get(reverse('moyenne-list'), params)
+        self.assertEqual(r['X-Cache'], 'MISS')
+        self.assertNotEqual([float(m['moyenne']) for m in r.data], [6.0])
+
+    def test_moyennes_apres_retrait_de_la_classe(self):
+        self.noter(self.eleves[0], self.maths, 6)
+        params = {'periode': self.periode.id}
+        self.assertEqual(len(self.client.get(reverse('moyenne-list'), params).data), 1)
+        self.assertEqual(self.client.get(reverse('moyenne-list'), params)['X-Cache'], 'HIT')
+
+        # L'enseignant n'est plus titulaire : la réponse en cache ne doit plus être servie
+        self.classe.professeur_principal = None
+        self.classe.save()
+        r = self.client.get(reverse('moyenne-list'), params)
+        self.assertEqual((r['X-Cache'], r.data), ('MISS', []))
+
+
+class RequetesConditionnellesTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        self.creer_donnees(nb_eleves=2)
+        self.connecter()
+
+    def test_etag_et_304(self):
+        r = self.client.get(reverse('eleve-list'), {'classe': self.classe.id})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        etag = r['ETag']
+        self.assertIn('private', r['Cache-Control'])
+
+        with self.assertNumQueries(1):  # validateurs uniquement ; pas de sérialisation
+            r = self.client.get(reverse('eleve-list'), {'classe': self.classe.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(r.content, b'')
+
+        # Ajout, suppression et modification d'une donnée imbriquée changent l'ETag
+        eleve = self.creer_eleve(3)
+        r = self.client.get(reverse('eleve-list'), {'classe': self.classe.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        etag = r['ETag']
+        eleve.delete()
+        r = self.client.get(reverse('eleve-list'), {'classe': self.classe.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        etag = r['ETag']
+        self.classe.effectif_max = 30
+        self.classe.save()
+        r = self.client.get(reverse('eleve-list'), {'classe': self.classe.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        # ETag propre à l'URL
+        r = self.client.get(reverse('eleve-list'), HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        r = self.client.get(reverse('matiere-detail', args=[self.maths.id]))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        r = self.client.get(
+            reverse('matiere-detail', args=[self.maths.id]), HTTP_IF_MODIFIED_SINCE=r['Last-Modified']
+        )
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(
+            self.client.get(reverse('matiere-detail', args=[0]), HTTP_IF_MODIFIED_SINCE=r['Last-Modified']).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_moyennes(self):
+        self.noter(self.eleves[0], self.maths, 6)
+        params = {'periode': self.periode.id}
+        etag = self.client.get(reverse('moyenne-list'), params)['ETag']
+        r = self.client.get(reverse('moyenne-list'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.noter(self.eleves[0], self.maths, 8, type_evaluation=self.composition)
+        r = self.client.get(reverse('moyenne-list'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+
+class ContexteAccesTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        from academic.models import Classe, MatiereClasse
+        from users.models import Professeur
+
+        self.creer_donnees(nb_eleves=2)
+        self.autre_user = User.objects.create_user(
+            username='prof2', password='StrongPass123!', role='professeur', ecole=self.ecole
+        )
+        self.autre_prof = Professeur.objects.create(user=self.autre_user, matricule='PR002', ecole=self.ecole)
+        self.autre_classe = Classe.objects.create(
+            niveau='cm1', section='A', annee_scolaire=self.annee, professeur_principal=self.autre_prof, ecole=self.ecole
+        )
+        MatiereClasse.objects.create(
+            classe=self.autre_classe, matiere=self.maths, professeur=self.prof, ecole=self.ecole
+        )
+        self.autre_eleve = self.creer_eleve(50, classe=self.autre_classe)
+        self.noter(self.autre_eleve, self.maths, 7)
+        self.connecter()
+        self.prechauffer_principal()
+
+    def test_droits_sans_requete_de_profil(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        params = {'classe': self.autre_classe.id, 'periode': self.periode.id}
+        with CaptureQueriesContext(connection) as requetes:
+            # Enseigne dans la classe sans en être titulaire : moyennes visibles, bulletins non
+            self.assertEqual(self.client.get(reverse('moyenne-classe-moyennes'), params).status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                self.client.get(reverse('moyenne-bulletins-classe'), params).status_code, status.HTTP_403_FORBIDDEN
+            )
+            r = self.client.get(reverse('moyenne-moyenne-generale'), {'eleve': self.autre_eleve.id, 'periode': self.periode.id})
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+        tables = ' '.join(q['sql'] for q in requetes.captured_queries)
+        for table in ('"users_professeur"', '"academic_matiereclasse"'):
+            self.assertNotIn(f'FROM {table}', tables)
+
+        self.assertEqual(
+            {c['id'] for c in self.client.get(reverse('classe-list')).data['results']},
+            {self.classe.id, self.autre_classe.id}
+        )
+
+    def test_saisie_hors_de_sa_classe(self):
+        r = self.client.post(reverse('note-list'), {
+            'eleve_id': self.autre_eleve.id, 'matiere_id': self.maths.id, 'periode_id': self.periode.id,
+            'type_evaluation_id': self.composition.id, 'valeur': '5', 'date_evaluation': '2024-10-15',
+        }, format='json')
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('note-list')).data['count'], 0)
+
+
+class EcoleDenormaliseeTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        self.creer_donnees(nb_eleves=2)
+        self.connecter()
+
+    def test_ecole_renseignee_et_reprise(self):
+        import importlib
+        from django.apps import apps
+        from .models import Note, MoyenneEleve
+
+        self.noter(self.eleves[0], self.maths, 6)
+        r = self.client.post(reverse('note-saisie-rapide'), {
+            'matiere_id': self.francais.id, 'periode_id': self.periode.id, 'type_evaluation_id': self.devoir.id,
+            'date_evaluation': '2024-10-15', 'notes': [{'eleve_id': e.id, 'valeur': '7'} for e in self.eleves],
+        }, format='json')
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(Note.objects.filter(ecole=self.ecole).count(), 3)
+        self.assertEqual(MoyenneEleve.objects.filter(ecole=self.ecole).count(), 3)
+
+        # Données antérieures à la colonne : reprise par la migration
+        Note.objects.update(ecole=None)
+        MoyenneEleve.objects.update(ecole=None)
+        migration = importlib.import_module('grades.migrations.0007_note_moyenne_ecole')
+        migration.renseigner_ecole(apps, None)
+        self.assertFalse(Note.objects.filter(ecole__isnull=True).exists())
+        self.assertFalse(MoyenneEleve.objects.filter(ecole__isnull=True).exists())
+
+    def test_cloisonnement_sans_jointure(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.noter(self.eleves[0], self.maths, 6)
+        with CaptureQueriesContext(connection) as requetes:
+            r = self.client.get(reverse('note-list'), {'periode': self.periode.id})
+        self.assertEqual(r.data['count'], 1)
+        comptage = next(q['sql'] for q in requetes.captured_queries if q['sql'].startswith('SELECT COUNT'))
+        self.assertIn('"grades_note"."ecole_id" = ', comptage)
+        for table in ('grades_periode', 'academic_matiere', 'academic_anneescolaire'):
+            self.assertNotIn(table, comptage)
+
+
+class ExpliquerRequetesTests(DonneesClasseMixin, APITestCase):
+    def test_aucun_parcours_complet(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        self.creer_donnees(nb_eleves=3)
+        self.noter(self.eleves[0], self.maths, 6)
+        sortie = StringIO()
+        call_command('expliquer_requetes', '--strict', verbosity=2, stdout=sortie)
+        self.assertIn('Aucun parcours complet', sortie.getvalue())
+
+    def test_detection(self):
+        from .management.commands.expliquer_requetes import parcours_complets
+
+        self.assertEqual(parcours_complets('SCAN grades_note\nSEARCH academic_eleve USING INDEX x (id=?)'), ['grades_note'])
+        self.assertEqual(parcours_complets('SCAN academic_eleve USING INDEX eleve_classe_statut_nom'), [])
+        self.assertEqual(parcours_complets('Seq Scan on grades_periode\nSeq Scan on "grades_note"'), ['grades_note'])
+
+
+class GrilleNotesTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        self.creer_donnees(nb_eleves=3)
+        e1, e2, _ = self.eleves
+        self.noter(e1, self.maths, 8)
+        self.noter(e1, self.maths, 6, type_evaluation=self.composition)
+        self.noter(e2, self.francais, 7)
+        self.url = reverse('note-grille')
+        self.connecter()
+
+    def test_grille_en_colonnes(self):
+        self.prechauffer_referentiel()
+        self.prechauffer_principal()
+        # Classe, élèves, notes : une requête chacun
+        with self.assertNumQueries(3):
+            r = self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['eleves']['matricule'], ['EL00001', 'EL00002', 'EL00003'])
+        self.assertEqual(r.data['matieres']['code'], ['FR', 'MATH'])
+        self.assertEqual(r.data['types']['nom'], ['Devoir', 'Composition'])
+        self.assertEqual(r.data['dimensions'], [3, 2, 2])
+
+        # valeurs[(e * M + m) * T + t]
+        self.assertEqual(r.data['valeurs'], [
+            None, None, 8.0, 6.0,
+            7.0, None, None, None,
+            None, None, None, None,
+        ])
+        self.assertIn(b'"valeurs":[null,null,8.0,6.0,', r.content)
+        # Nombres JSON, pas de chaînes décimales
+        self.assertIn(b'"coefficient":[1.0,2.0]', r.content)
+
+        r = self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id, 'matiere': self.maths.id})
+        self.assertEqual(r.data['dimensions'], [3, 1, 2])
+        self.assertEqual(r.data['valeurs'][:2], [8.0, 6.0])
+
+    def test_matiere_invalide(self):
+        r = self.client.get(self.url, {'classe': self.classe.id, 'periode': self.periode.id, 'matiere': 'abc'})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_droits(self):
+        from academic.models import Classe
+
+        autre_classe = Classe.objects.create(niveau='cm1', section='A', annee_scolaire=self.annee, ecole=self.ecole)
+        r = self.client.get(self.url, {'classe': autre_classe.id, 'periode': self.periode.id})
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+        r = self.client.get(self.url, {'classe': self.classe.id})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ListesNotesRequetesTests(DonneesClasseMixin, APITestCase):
+    def setUp(self):
+        self.creer_donnees(nb_eleves=2)
+        self.connecter()
+
+    def test_nombre_de_requetes_independant_du_nombre_de_notes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def requetes():
+            nombres = []
+            for url in (reverse('note-list'), reverse('moyenne-list')):
+                with CaptureQueriesContext(connection) as capture:
+                    r = self.client.get(url, {'periode': self.periode.id, 'non_cache': len(nombres)})
+                self.assertEqual(r.status_code, status.HTTP_200_OK)
+                nombres.append(len(capture))
+            return nombres
+
+        self.noter(self.eleves[0], self.maths, 6)
+        self.prechauffer_principal()
+        avant = requetes()
+        for eleve in self.eleves + [self.creer_eleve(i) for i in range(10, 15)]:
+            self.noter(eleve, self.francais, 7, type_evaluation=self.composition)
+        self.prechauffer_principal()
+        self.assertEqual(requetes(), avant)
+
+
+
+
+class BudgetRequetesTests(APITestCase):
+    """
+    Garde-fou contre les requêtes N+1 : sur un jeu de données réaliste
+    (plusieurs écoles, 6 niveaux, 40 à 60 élèves par classe, notes des
+    3 trimestres), chaque point d'accès reste sous un nombre maximal de
+    requêtes. Les caches sont vidés avant chaque test : les budgets sont
+    ceux d'un premier appel (utilisateur, référentiel et réponses rechargés).
+    """
+    ECOLES = 2
+    NIVEAUX = ['ci', 'cp', 'ce1', 'ce2', 'cm1', 'cm2']
+
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import date, timedelta
+        from academic.models import Ecole, AnneeScolaire, Classe, Matiere, MatiereClasse, Eleve
+        from users.models import Professeur
+        from .models import Periode, TypeEvaluation, Note, MoyenneEleve, MoyenneGenerale
+
+        types = [
+            TypeEvaluation.objects.create(nom=nom, coefficient=Decimal(coefficient))
+            for nom, coefficient in (('devoir', '1'), ('controle', '1'), ('composition', '2'))
+        ]
+        cls.ecoles = []
+        for e in range(cls.ECOLES):
+            ecole = Ecole.objects.create(
+                nom=f'École {e}', code=f'EC{e}', directrice='Mme Test',
+                adresse='Dakar', telephone='770000000', email=f'ecole{e}@test.sn'
+            )
+            annee = AnneeScolaire.objects.create(
+                libelle='2024-2025', date_debut=date(2024, 10, 1), date_fin=date(2025, 7, 31),
+                active=True, ecole=ecole
+            )
+            periodes = [
+                Periode.objects.create(
+                    nom=f'trimestre{t + 1}', annee_scolaire=annee,
+                    date_debut=date(2024, 10, 1) + timedelta(days=90 * t),
+                    date_fin=date(2024, 10, 1) + timedelta(days=90 * t + 80),
+                )
+                for t in range(3)
+            ]
+            matieres = [
+                Matiere.objects.create(nom=nom, code=nom[:4].upper(), coefficient=Decimal(c), ecole=ecole)
+                for nom, c in (('Calcul', '2'), ('Lecture', '2'), ('Sciences', '1'), ('Histoire', '1'))
+            ]
+            admin = User.objects.create_user(
+                username=f'admin{e}', password='StrongPass123!', role='admin', ecole=ecole
+            )
+            classes, professeurs = [], []
+            for n, niveau in enumerate(cls.NIVEAUX):
+                user = User.objects.create_user(
+                    username=f'prof{e}{n}', password='StrongPass123!', role='professeur', ecole=ecole
+                )
+                professeur = Professeur.objects.create(user=user, matricule=f'PR{e}{n}', ecole=ecole)
+                classe = Classe.objects.create(
+                    niveau=niveau, section='A', annee_scolaire=annee, professeur_principal=professeur, ecole=ecole
+                )
+                MatiereClasse.objects.bulk_create([
+                    MatiereClasse(classe=classe, matiere=matiere, professeur=professeur, ecole=ecole)
+                    for matiere in matieres
+                ])
+                Eleve.objects.bulk_create([
+                    Eleve(
+                        matricule=f'EL{e}{n}{i:03d}', nom=f'NOM{i:03d}', prenom='Prenom', sexe='MF'[i % 2],
+                        date_naissance=date(2013, 1, 1), lieu_naissance='Dakar', adresse='Dakar',
+                        classe=classe, ecole=ecole
+                    )
+                    for i in range(40 + 4 * n)  # 40 à 60 élèves
+                ])
+                classes.append(classe)
+                professeurs.append(professeur)
+
+            eleves = list(Eleve.objects.filter(ecole=ecole).values_list('id', 'classe_id'))
+            titulaires = {classe.id: professeur for classe, professeur in zip(classes, professeurs)}
+            for periode in periodes:
+                Note.objects.bulk_create([
+                    Note(
+                        eleve_id=eleve_id, matiere=matiere, periode=periode, ecole=ecole, type_evaluation=type_evaluation,
+                        valeur=Decimal((eleve_id * 7 + m * 3 + t) % 11), date_evaluation=periode.date_debut,
+                        professeur=titulaires[classe_id],
+                    )
+                    for eleve_id, classe_id in eleves
+                    for m, matiere in enumerate(matieres)
+                    for t, type_evaluation in enumerate(types)
+                ], batch_size=2000)
+                MoyenneEleve.recalculer_moyennes(
+                    periode, [(eleve_id, matiere.id) for eleve_id, _ in eleves for matiere in matieres]
+                )
+                for classe in classes:
+                    MoyenneGenerale.actualiser_classe(classe, periode)
+            cls.ecoles.append({
+                'ecole': ecole, 'admin': admin, 'classes': classes, 'professeurs': professeurs,
+                'periodes': periodes, 'matieres': matieres, 'types': types,
+            })
+
+    def setUp(self):
+        from django.core.cache import caches
+        from users import cache_principaux
+
+        for cache in caches.all():
+            cache.clear()
+        cache_principaux.vider()
+        self.donnees = self.ecoles[0]
+        self.classe = self.donnees['classes'][-1]  # CM2 : 60 élèves
+        self.periode = self.donnees['periodes'][0]
+
+    def connecter(self, user):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def verifier_budget(self, budget, url, methode='get', statut=status.HTTP_200_OK, **kwargs):
+        """Appelle l'API ; échoue si le nombre de requêtes dépasse le budget"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as requetes:
+            r = getattr(self.client, methode)(url, **kwargs)
+            if getattr(r, 'streaming', False):
+                # Fichiers envoyés au fil de l'eau : les requêtes ont lieu pendant la lecture
+                r.contenu = b''.join(r.streaming_content)
+        self.assertEqual(r.status_code, statut, getattr(r, 'data', None))
+        self.assertLessEqual(
+            len(requetes), budget,
+            f"{url} : {len(requetes)} requêtes (budget {budget})\n"
+            + '\n'.join(q['sql'][:150] for q in requetes.captured_queries)
+        )
+        return r
+
+    def test_listes_et_details_admin(self):
+        self.connecter(self.donnees['admin'])
+        eleve = self.classe.eleves.first()
+        note = eleve.notes.first()
+        for budget, url, params in (
+            (4, reverse('annee-scolaire-list'), {}),
+            (5, reverse('classe-list'), {}),
+            (4, reverse('classe-detail', args=[self.classe.id]), {}),
+            (4, reverse('classe-eleves', args=[self.classe.id]), {}),
+            (3, reverse('matiere-list'), {}),
+            (2, reverse('matiere-detail', args=[self.donnees['matieres'][0].id]), {}),
+            (2, reverse('matiere-classe-list'), {}),
+            (3, reverse('eleve-list'), {'classe': self.classe.id}),
+            (9, reverse('eleve-detail', args=[eleve.id]), {}),
+            (1, reverse('periode-list'), {}),
+            (2, reverse('type-evaluation-list'), {}),
+            (2, reverse('note-list'), {'classe': self.classe.id, 'periode': self.periode.id}),
+            (1, reverse('note-detail', args=[note.id]), {}),
+            (2, reverse('moyenne-list'), {'classe': self.classe.id, 'periode': self.periode.id}),
+            (2, reverse('moyenne-detail', args=[eleve.moyennes.first().id]), {}),
+            (2, reverse('professeur-list'), {}),
+            (1, reverse('professeur-detail', args=[self.donnees['professeurs'][0].id]), {}),
+        ):
+            self.verifier_budget(budget, url, data=params)
+
+    def test_actions_moyennes_et_bulletins(self):
+        self.connecter(self.donnees['admin'])
+        eleve = self.classe.eleves.first()
+        params = {'classe': self.classe.id, 'periode': self.periode.id}
+        r = self.verifier_budget(8, reverse('moyenne-classe-moyennes'), data=params)
+        self.assertEqual(r.data['effectif_classe'], 60)
+        r = self.verifier_budget(5, reverse('moyenne-bulletins-classe'), data=params)
+        self.assertEqual(len(r.data['bulletins']), 60)
+        self.verifier_budget(
+            7, reverse('moyenne-moyenne-generale'), data={'eleve': eleve.id, 'periode': self.periode.id}
+        )
+        r = self.verifier_budget(5, reverse('note-grille'), data=params)
+        self.assertEqual(r.data['dimensions'], [60, 4, 3])
+
+    def test_actions_enseignant(self):
+        professeur = self.donnees['professeurs'][-1]
+        self.connecter(professeur.user)
+        eleves = list(self.classe.eleves.values_list('id', flat=True))
+        self.verifier_budget(10, reverse('professeur-profil-complet'))
+        self.verifier_budget(
+            7, reverse('moyenne-classe-moyennes'), data={'classe': self.classe.id, 'periode': self.periode.id}
+        )
+        r = self.verifier_budget(18, reverse('note-saisie-rapide'), methode='post', format='json', data={
+            'matiere_id': self.donnees['matieres'][0].id, 'periode_id': self.periode.id,
+            'type_evaluation_id': self.donnees['types'][0].id, 'date_evaluation': self.periode.date_debut.isoformat(),
+            'notes': [{'eleve_id': eleve_id, 'valeur': '9'} for eleve_id in eleves],
+        })
+        self.assertEqual(r.data['created_count'], 60)
+        # Élève admis : sorti du classement, la classe est re-classée pour chaque période
+        self.verifier_budget(
+            31, reverse('eleve-proposer-passage', args=[eleves[0]]), methode='patch', format='json',
+            data={'statut': 'admis'}
+        )
+
+    def test_import_notes_enseignant(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        professeur = self.donnees['professeurs'][-1]
+        self.connecter(professeur.user)
+        matricules = self.classe.eleves.order_by('matricule').values_list('matricule', flat=True)
+        contenu = 'matricule,matiere,type_evaluation,note,date_evaluation,commentaire\n' + ''.join(
+            f'{matricule},{matiere.nom},Devoir,8,{self.periode.date_debut.isoformat()},\n'
+            for matricule in matricules for matiere in self.donnees['matieres']
+        )
+        r = self.verifier_budget(
+            26, reverse('note-import-notes'), methode='post', format='multipart',
+            data={'file': SimpleUploadedFile('notes.csv', contenu.encode('utf-8')), 'periode_id': self.periode.id}
+        )
+        self.assertEqual((r.data['errors'], r.data['imported']), ([], 240))
+
+    def test_exports_et_bulletins_pdf(self):
+        import tempfile
+        from django.test import override_settings
+
+        self.connecter(self.donnees['admin'])
+        params = {'classe': self.classe.id, 'periode': self.periode.id}
+        r = self.verifier_budget(9, reverse('moyenne-export-notes'), data=params)
+        self.assertEqual(r.contenu.count(b'\n'), 61)
+        self.verifier_budget(5, reverse('moyenne-export-notes'), data={**params, 'type': 'xlsx'})
+        # Toute l'école : lue classe par classe, un nombre fixe de requêtes par classe
+        self.verifier_budget(26, reverse('moyenne-export-notes'), data={'periode': self.periode.id})
+        with tempfile.TemporaryDirectory() as dossier, override_settings(BULLETINS_CACHE_DIR=dossier):
+            r = self.verifier_budget(4, reverse('moyenne-bulletins-pdf'), data=params)
+            self.assertTrue(r.contenu.startswith(b'%PDF'))
+            self.verifier_budget(4, reverse('moyenne-bulletins-pdf'), data=params)  # PDF servi depuis le cache
+
+    def test_recalcul_et_taches(self):
+        self.connecter(self.donnees['admin'])
+        r = self.verifier_budget(
+            7, reverse('moyenne-recalculer'), methode='post', format='json',
+            data={'periode_id': self.periode.id}, statut=status.HTTP_202_ACCEPTED
+        )
+        tache_id = r.data['tache']['id']
+        self.verifier_budget(2, reverse('tache-list'))
+        self.verifier_budget(1, reverse('tache-detail', args=[tache_id]))
+
+    def test_comptes_utilisateurs(self):
+        self.connecter(self.donnees['admin'])
+        for budget, url in (
+            (3, reverse('user-list')),
+            (0, reverse('user-me')),
+            (1, reverse('user_profile')),
+            (1, reverse('admin-list')),
+        ):
+            self.verifier_budget(budget, url)
+
+    def test_import_et_passage_admin(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import MoyenneGenerale
+
+        self.connecter(self.donnees['admin'])
+        contenu = 'matricule,nom,prenom,sexe,date_naissance,lieu_naissance,adresse\n' + ''.join(
+            f'NV{i:04d},Nouveau,Eleve,F,2013-05-0{1 + i % 9},Dakar,Dakar\n' for i in range(200)
+        )
+        r = self.verifier_budget(
+            13, reverse('eleve-import-csv'), methode='post', format='multipart',
+            data={'file': SimpleUploadedFile('eleves.csv', contenu.encode('utf-8')), 'classe_id': self.classe.id}
+        )
+        self.assertEqual(r.data['imported'], 200)
+
+        ancienne, nouvelle = self.donnees['classes'][-2], self.donnees['classes'][-1]
+        eleves = list(ancienne.eleves.values_list('id', flat=True))
+        # Une mise à jour groupée, puis re-classement de chaque (classe, période) touchée
+        r = self.verifier_budget(48, reverse('eleve-passage-classe'), methode='post', format='json', data={
+            'eleves': eleves, 'nouvelle_classe': nouvelle.id, 'statut': 'actif',
+        })
+        self.assertEqual(r.data['eleves_mis_a_jour'], len(eleves))
+        self.assertFalse(MoyenneGenerale.objects.filter(classe=ancienne).exists())
+        self.assertEqual(
+            MoyenneGenerale.objects.filter(classe=nouvelle, periode=self.periode).count(), len(eleves) + 60
+        )
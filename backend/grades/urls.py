@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PeriodeViewSet, TypeEvaluationViewSet, NoteViewSet, MoyenneViewSet
+from .views import PeriodeViewSet, TypeEvaluationViewSet, NoteViewSet, MoyenneViewSet, TacheViewSet
 
 router = DefaultRouter()
 router.register(r'periodes', PeriodeViewSet, basename='periode')
 router.register(r'types-evaluation', TypeEvaluationViewSet, basename='type-evaluation')
 router.register(r'notes', NoteViewSet, basename='note')
 router.register(r'moyennes', MoyenneViewSet, basename='moyenne')
+router.register(r'taches', TacheViewSet, basename='tache')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,25 +1,34 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Q, Avg
 from datetime import date
 
-from .models import Periode, TypeEvaluation, Note, MoyenneEleve
+from .models import Periode, TypeEvaluation, Note, MoyenneEleve, MoyenneGenerale, Tache
+from .classement import arrondir, attribuer_rangs, classement_materialise
+from .bulletins import assembler_bulletins_classe
+from .saisie import saisir_notes
+from . import referentiel
+from .imports import ImportNotes
 from .serializers import (
     PeriodeSerializer, TypeEvaluationSerializer, NoteSerializer,
-    NoteSimpleSerializer, NoteBulkCreateSerializer, MoyenneEleveSerializer,
-    MoyenneGeneraleSerializer
+    NoteSimpleSerializer, NoteBulkCreateSerializer, NoteImportSerializer,
+    MoyenneEleveSerializer, MoyenneGeneraleSerializer, TacheSerializer
 )
+from academic.imports import lire_lignes, LigneInvalide
 from academic.models import Eleve, Classe, Matiere
-from users.models import Professeur
+from users.acces import contexte_acces
 from users.permissions import IsAdminUser, IsTeacherOrAdmin, IsReadOnlyOrAdmin
+from core.cache_vues import CacheVueMixin, en_cache, CLASSES, MOYENNES, PERIODES
+from core.conditionnel import ConditionnelMixin
 
 
-class PeriodeViewSet(viewsets.ModelViewSet):
+class PeriodeViewSet(CacheVueMixin, viewsets.ModelViewSet):
     """ViewSet pour les périodes - Admin peut créer/modifier, Enseignants peuvent lire"""
     queryset = Periode.objects.all()
     serializer_class = PeriodeSerializer
     permission_classes = [IsReadOnlyOrAdmin]
+    cache_groupes = (PERIODES,)
     
     def get_queryset(self):
         queryset = Periode.objects.all()
@@ -40,6 +49,25 @@ class PeriodeViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    @en_cache
+    def list(self, request, *args, **kwargs):
+        """Périodes de l'école servies depuis le référentiel en cache (mêmes filtres)"""
+        ecole_id = getattr(request.user, 'ecole_id', None)
+        if not ecole_id:
+            return super().list(request, *args, **kwargs)
+        
+        periodes = list(referentiel.periodes(ecole_id).values())
+        annee_id = request.query_params.get('annee_scolaire')
+        if annee_id:
+            periodes = [p for p in periodes if str(p.annee_scolaire_id) == annee_id]
+        if request.query_params.get('non_cloturees') == 'true':
+            periodes = [p for p in periodes if not p.est_cloturee]
+        
+        page = self.paginate_queryset(periodes)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(periodes, many=True).data)
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
     def cloturer(self, request, pk=None):
         """Clôturer une période (Admin uniquement)"""
@@ -59,7 +87,54 @@ class TypeEvaluationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsReadOnlyOrAdmin]
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class ClassePeriodeMixin:
+    """Contrôle des paramètres classe et periode des actions portant sur une classe"""
+    
+    def _classe_periode_autorisees(self, request):
+        """
+        Classe et période des paramètres 'classe' et 'periode', après contrôle
+        du cloisonnement et des droits. Retourne (classe, periode, réponse d'erreur).
+        """
+        classe_id = request.query_params.get('classe')
+        periode_id = request.query_params.get('periode')
+        
+        if not classe_id or not periode_id:
+            return None, None, Response(
+                {'error': 'Paramètres classe et periode requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            classe = Classe.objects.select_related('ecole').get(id=classe_id)
+        except (Classe.DoesNotExist, ValueError):
+            classe = None
+        # Périodes de l'école de l'utilisateur, lues dans le référentiel en cache
+        periode = referentiel.periode(getattr(request.user, 'ecole_id', None), periode_id)
+        if classe is None or (periode is None and not Periode.objects.filter(id=periode_id).exists()):
+            return None, None, Response(
+                {'error': 'Classe ou période introuvable'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        # Vérifier cloisonnement par école
+        if not getattr(request.user, 'ecole', None) or (
+            getattr(classe, 'ecole', None) != request.user.ecole or periode is None
+        ):
+            return None, None, Response({'error': 'Non autorisé'}, status=status.HTTP_403_FORBIDDEN)
+        
+        # Vérifier les permissions
+        acces = contexte_acces(request)
+        if acces.est_professeur:
+            if not acces.est_titulaire(classe.id):
+                return None, None, Response(
+                    {'error': 'Non autorisé'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        
+        return classe, periode, None
+
+
+class NoteViewSet(ClassePeriodeMixin, viewsets.ModelViewSet):
     """
     ViewSet pour les notes
     - Enseignant : Peut saisir/modifier/supprimer des notes pour SES élèves uniquement
@@ -70,7 +145,7 @@ class NoteViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Permissions dynamiques selon l'action"""
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'saisie_rapide']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'saisie_rapide', 'import_notes']:
             # SEULS les professeurs peuvent créer/modifier/supprimer des notes
             from users.permissions import IsTeacherOnly
             permission_classes = [IsTeacherOnly]
@@ -83,13 +158,9 @@ class NoteViewSet(viewsets.ModelViewSet):
         user = self.request.user
         queryset = Note.objects.all()
         
-        # Cloisonnement par école
-        if getattr(user, 'is_authenticated', False) and getattr(user, 'ecole', None):
-            queryset = queryset.filter(
-                eleve__ecole=user.ecole,
-                matiere__ecole=user.ecole,
-                periode__annee_scolaire__ecole=user.ecole,
-            )
+        # Cloisonnement par école (école dénormalisée sur la note : pas de jointure)
+        if getattr(user, 'is_authenticated', False) and getattr(user, 'ecole_id', None):
+            queryset = queryset.filter(ecole_id=user.ecole_id)
         else:
             return Note.objects.none()
         
@@ -110,106 +181,69 @@ class NoteViewSet(viewsets.ModelViewSet):
         if periode_id:
             queryset = queryset.filter(periode_id=periode_id)
         
-        # Pour les enseignants : uniquement les notes de LEUR classe
-        if user.is_professeur() and not user.is_admin():
-            try:
-                prof = Professeur.objects.get(user=user)
-                # L'enseignant ne voit que les notes des élèves de sa classe (titulaire)
-                queryset = queryset.filter(eleve__classe__professeur_principal=prof)
-            except Professeur.DoesNotExist:
-                queryset = queryset.none()
+        # Pour les enseignants : uniquement les notes de LEUR classe (titulaire)
+        acces = contexte_acces(self.request)
+        if acces.est_professeur:
+            queryset = queryset.filter(eleve__classe_id__in=acces.classes_titulaires)
         
+        # Relations imbriquées par NoteSerializer (classe de l'élève, année de la période, nom du professeur)
         return queryset.select_related(
-            'eleve', 'matiere', 'periode', 'type_evaluation', 'professeur'
+            'eleve__classe', 'matiere', 'periode__annee_scolaire', 'type_evaluation', 'professeur__user'
         )
     
     def perform_create(self, serializer):
         """Ajouter automatiquement le professeur lors de la création"""
-        user = self.request.user
+        acces = contexte_acces(self.request)
         
         # Seul un professeur peut créer une note (déjà vérifié par IsTeacherOnly)
         eleve = serializer.validated_data.get('eleve')
-        try:
-            prof = Professeur.objects.get(user=user)
-            if eleve.classe.professeur_principal != prof:
-                raise serializers.ValidationError(
-                    "Vous ne pouvez saisir des notes que pour les élèves de votre classe"
-                )
-            serializer.save(professeur=prof)
-        except Professeur.DoesNotExist:
+        if acces.professeur is None:
             raise serializers.ValidationError("Profil enseignant introuvable")
+        if not acces.est_titulaire(eleve.classe_id):
+            raise serializers.ValidationError(
+                "Vous ne pouvez saisir des notes que pour les élèves de votre classe"
+            )
+        serializer.save(professeur=acces.professeur)
     
     def perform_update(self, serializer):
         """Vérifier les permissions avant mise à jour"""
-        user = self.request.user
-        instance = self.get_object()
+        acces = contexte_acces(self.request)
+        instance = serializer.instance
         
         # Seul un professeur peut modifier (déjà vérifié par IsTeacherOnly)
-        try:
-            prof = Professeur.objects.get(user=user)
-            if instance.eleve.classe.professeur_principal != prof:
-                raise serializers.ValidationError(
-                    "Vous ne pouvez modifier que les notes de votre classe"
-                )
-            serializer.save()
-        except Professeur.DoesNotExist:
+        if acces.professeur is None:
             raise serializers.ValidationError("Profil enseignant introuvable")
+        if not acces.est_titulaire(instance.eleve.classe_id):
+            raise serializers.ValidationError(
+                "Vous ne pouvez modifier que les notes de votre classe"
+            )
+        serializer.save()
     
     @action(detail=False, methods=['post'])
     def saisie_rapide(self, request):
         """Saisir plusieurs notes en une fois pour une classe"""
-        serializer = NoteBulkCreateSerializer(data=request.data)
+        serializer = NoteBulkCreateSerializer(data=request.data, context={'request': request})
         
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         data = serializer.validated_data
-        user = request.user
         
-        # Récupérer les objets
-        matiere = Matiere.objects.get(id=data['matiere_id'])
-        periode = Periode.objects.get(id=data['periode_id'])
-        type_eval = TypeEvaluation.objects.get(id=data['type_evaluation_id'])
+        # Matière, période et type validés depuis le référentiel en cache de l'école
+        matiere = data['matiere']
+        periode = data['periode']
+        type_eval = data['type_evaluation']
         date_eval = data['date_evaluation']
         
-        # Récupérer le profil professeur (seuls les profs peuvent utiliser cette action)
-        prof = Professeur.objects.get(user=user)
-        
-        created_notes = []
-        errors = []
+        # Profil professeur (seuls les profs peuvent utiliser cette action)
+        prof = contexte_acces(request).professeur
+        if prof is None:
+            return Response({'error': 'Profil enseignant introuvable'}, status=status.HTTP_403_FORBIDDEN)
         
-        for note_data in data['notes']:
-            try:
-                eleve = Eleve.objects.get(id=note_data['eleve_id'])
-                
-                # Vérifier que l'enseignant a le droit
-                if eleve.classe.professeur_principal != prof:
-                    errors.append(f"Élève {eleve.nom_complet}: pas autorisé")
-                    continue
-                
-                # Créer ou mettre à jour la note
-                note, created = Note.objects.update_or_create(
-                    eleve=eleve,
-                    matiere=matiere,
-                    periode=periode,
-                    type_evaluation=type_eval,
-                    defaults={
-                        'valeur': note_data['valeur'],
-                        'date_evaluation': date_eval,
-                        'professeur': prof,
-                        'commentaire': note_data.get('commentaire', '')
-                    }
-                )
-                
-                created_notes.append(note)
-                
-                # Recalculer la moyenne
-                MoyenneEleve.calculer_moyenne(eleve, matiere, periode)
-                
-            except Eleve.DoesNotExist:
-                errors.append(f"Élève ID {note_data['eleve_id']}: introuvable")
-            except Exception as e:
-                errors.append(f"Élève ID {note_data['eleve_id']}: {str(e)}")
+        # Élèves chargés en une requête, notes upsertées et moyennes recalculées en bloc
+        created_notes, errors = saisir_notes(
+            prof, matiere, periode, type_eval, date_eval, data['notes']
+        )
         
         return Response({
             'success': True,
@@ -218,6 +252,79 @@ class NoteViewSet(viewsets.ModelViewSet):
             'errors': errors
         })
     
+    @action(detail=False, methods=['post'])
+    def import_notes(self, request):
+        """Importer des notes depuis un fichier CSV ou Excel (format exemple_import_notes.csv)"""
+        serializer = NoteImportSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Période de l'école de l'utilisateur (référentiel en cache)
+        periode = serializer.validated_data['periode']
+        user = request.user
+        
+        # Seules les notes des élèves de la classe de l'enseignant sont acceptées
+        prof = contexte_acces(request).professeur
+        if prof is None:
+            return Response({'error': 'Profil enseignant introuvable'}, status=status.HTTP_403_FORBIDDEN)
+        fichier = serializer.validated_data['file']
+        
+        if serializer.validated_data['asynchrone']:
+            # Fichier stocké puis traité par lots par le worker (reprise possible après coupure)
+            from .taches import soumettre, stocker_fichier
+            chemin, empreinte = stocker_fichier(fichier, user.ecole.id)
+            tache, creee = soumettre(
+                'import_notes',
+                {'periode_id': periode.id, 'professeur_id': prof.id},
+                cle=f'import_notes:{periode.id}:{prof.id}:{empreinte}',
+                ecole=user.ecole,
+                utilisateur=user,
+                fichier=chemin,
+            )
+            return Response({
+                'success': True,
+                'message': 'Import programmé' if creee else 'Ce fichier est déjà en cours d\'import',
+                'tache': TacheSerializer(tache).data
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        try:
+            import_notes = ImportNotes(periode, user.ecole, professeur=prof).importer(
+                lire_lignes(fichier, colonne_requise='matricule')
+            )
+        except LigneInvalide as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            **import_notes.resume(),
+            'errors': import_notes.erreurs,
+            'rapport': import_notes.rapport,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def grille(self, request):
+        """
+        Grille des notes d'une classe pour une période (format en colonnes, voir grades.grille)
+        - classe=<id>, periode=<id> : obligatoires
+        - matiere=<id> : une seule matière (optionnel)
+        """
+        from .grille import grille_notes
+
+        matiere_id = request.query_params.get('matiere') or None
+        if matiere_id is not None:
+            try:
+                matiere_id = int(matiere_id)
+            except ValueError:
+                return Response(
+                    {'error': 'Paramètre matiere invalide (identifiant attendu)'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        classe, periode, erreur = self._classe_periode_autorisees(request)
+        if erreur:
+            return erreur
+        return Response(grille_notes(classe, periode, matiere_id))
+
     @action(detail=False, methods=['get'])
     def liste_simple(self, request):
         """Liste simplifiée des notes"""
@@ -226,7 +333,7 @@ class NoteViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
+class MoyenneViewSet(ConditionnelMixin, CacheVueMixin, ClassePeriodeMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet pour consulter les moyennes
     - Enseignant : Moyennes de ses élèves uniquement
@@ -235,10 +342,16 @@ class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = MoyenneEleveSerializer
     permission_classes = [IsTeacherOrAdmin]
     pagination_class = None  # Désactiver la pagination pour toutes les actions
+    # Moyennes visibles selon les classes tenues (titulaire, MatiereClasse) : CLASSES en fait partie
+    cache_groupes = (CLASSES, MOYENNES)
+    champ_modification = 'calculated_at'
     
     def get_queryset(self):
-        user = self.request.user
-        queryset = MoyenneEleve.objects.all()
+        # Cloisonnement par école (école dénormalisée sur la moyenne)
+        ecole_id = getattr(self.request.user, 'ecole_id', None)
+        if not ecole_id:
+            return MoyenneEleve.objects.none()
+        queryset = MoyenneEleve.objects.filter(ecole_id=ecole_id)
         
         # Filtres
         eleve_id = self.request.query_params.get('eleve')
@@ -254,14 +367,11 @@ class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(eleve__classe_id=classe_id)
         
         # Pour les enseignants : uniquement leur classe
-        if user.is_professeur() and not user.is_admin():
-            try:
-                prof = Professeur.objects.get(user=user)
-                queryset = queryset.filter(eleve__classe__professeur_principal=prof)
-            except Professeur.DoesNotExist:
-                queryset = queryset.none()
+        acces = contexte_acces(self.request)
+        if acces.est_professeur:
+            queryset = queryset.filter(eleve__classe_id__in=acces.classes_titulaires)
         
-        return queryset.select_related('eleve', 'matiere', 'periode')
+        return queryset.select_related('eleve__classe', 'matiere', 'periode__annee_scolaire')
     
     @action(detail=False, methods=['get'])
     def moyenne_generale(self, request):
@@ -292,62 +402,53 @@ class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'error': 'Non autorisé'}, status=status.HTTP_403_FORBIDDEN)
         
         # Vérifier les permissions
-        user = request.user
-        if user.is_professeur() and not user.is_admin():
+        acces = contexte_acces(request)
+        if acces.est_professeur:
             # Un professeur peut voir si c'est sa classe principale OU s'il enseigne dans la classe
-            prof = Professeur.objects.get(user=user)
             # Protéger le cas où l'élève n'a pas de classe
-            if not getattr(eleve, 'classe', None):
+            if not eleve.classe_id:
                 return Response(
                     {'error': "L'élève n'est rattaché à aucune classe"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            enseigne_dans_classe = False
-            try:
-                from academic.models import MatiereClasse
-                enseigne_dans_classe = MatiereClasse.objects.filter(
-                    classe=eleve.classe, professeur=prof
-                ).exists()
-            except Exception:
-                enseigne_dans_classe = False
-            if (eleve.classe.professeur_principal != prof) and (not enseigne_dans_classe):
+            if not acces.peut_voir_classe(eleve.classe_id):
                 return Response(
                     {'error': 'Non autorisé'},
                     status=status.HTTP_403_FORBIDDEN
                 )
         
-        # Calculer la moyenne générale
-        moyenne_gen = MoyenneEleve.calculer_moyenne_generale(eleve, periode)
-        moyennes = MoyenneEleve.objects.filter(eleve=eleve, periode=periode)
-        
-        if moyenne_gen is None:
-            return Response(
-                {'message': 'Aucune note disponible pour cet élève'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        # Moyenne générale, rang et moyenne annuelle matérialisés (MoyenneGenerale)
+        generale = MoyenneGenerale.pour_eleve(eleve, periode)
+        moyennes = MoyenneEleve.objects.filter(
+            eleve=eleve, periode=periode
+        ).select_related('eleve__classe', 'matiere', 'periode__annee_scolaire')
         
-        # Calculer le rang et la moyenne de classe
-        eleves_classe = Eleve.objects.filter(
-            classe=eleve.classe, 
-            statut='actif'
-        ).exclude(id=eleve.id)
-        
-        # Calculer les moyennes générales de tous les élèves de la classe
-        moyennes_classe = []
-        for e in eleves_classe:
-            moy_e = MoyenneEleve.calculer_moyenne_generale(e, periode)
-            if moy_e is not None:
-                moyennes_classe.append(moy_e)
-        
-        # Ajouter la moyenne de l'élève actuel
-        moyennes_classe.append(moyenne_gen)
-        
-        # Calculer le rang (combien d'élèves ont une meilleure moyenne)
-        rang = 1 + sum(1 for m in moyennes_classe if m > moyenne_gen)
-        total_eleves = len(moyennes_classe)
-        
-        # Calculer la moyenne de classe
-        moyenne_classe = round(sum(moyennes_classe) / len(moyennes_classe), 2) if moyennes_classe else None
+        moyenne_annuelle = None
+        nombre_trimestres = 0
+        if generale is not None:
+            moyenne_gen = float(generale.moyenne)
+            rang = generale.rang
+            total_eleves = generale.effectif_classe
+            moyenne_classe = float(generale.moyenne_classe) if generale.moyenne_classe is not None else None
+            if generale.moyenne_annuelle is not None:
+                moyenne_annuelle = float(generale.moyenne_annuelle)
+                nombre_trimestres = generale.nombre_trimestres
+        else:
+            # Élève non classé (statut non actif) : calcul à la volée face aux élèves classés
+            moyenne_gen = MoyenneEleve.calculer_moyenne_generale(eleve, periode)
+            if moyenne_gen is None:
+                return Response(
+                    {'message': 'Aucune note disponible pour cet élève'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            lignes = [
+                {'eleve_id': g.eleve_id, 'moyenne_generale': float(g.moyenne)}
+                for g in MoyenneGenerale.pour_classe(eleve.classe, periode)
+            ] + [{'eleve_id': eleve.id, 'moyenne_generale': moyenne_gen}]
+            attribuer_rangs(lignes)
+            rang = next(ligne['rang'] for ligne in lignes if ligne['eleve_id'] == eleve.id)
+            total_eleves = len(lignes)
+            moyenne_classe = arrondir(sum(ligne['moyenne_generale'] for ligne in lignes) / len(lignes))
         
         # Récupérer les informations de l'école via l'utilisateur (protéger champs optionnels)
         ecole_info = None
@@ -360,25 +461,6 @@ class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
                 'email': getattr(ecole, 'email', None),
             }
         
-        # Calculer la moyenne annuelle si c'est le 3ème trimestre
-        moyenne_annuelle = None
-        nombre_trimestres = 0
-        
-        if periode.nom == 'trimestre3':
-            periodes_annee = Periode.objects.filter(
-                annee_scolaire=periode.annee_scolaire
-            ).order_by('nom')
-            
-            moyennes_trimestres = []
-            for p in periodes_annee:
-                moy = MoyenneEleve.calculer_moyenne_generale(eleve, p)
-                if moy is not None:
-                    moyennes_trimestres.append(moy)
-            
-            if moyennes_trimestres:
-                moyenne_annuelle = sum(moyennes_trimestres) / len(moyennes_trimestres)
-                nombre_trimestres = len(moyennes_trimestres)
-        
         data = {
             'eleve_id': eleve.id,
             'eleve_nom': eleve.nom_complet,
@@ -389,7 +471,7 @@ class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
             'moyenne_generale': moyenne_gen,
             'moyenne_annuelle': moyenne_annuelle,
             'nombre_trimestres': nombre_trimestres,
-            'nombre_matieres': moyennes.count(),
+            'nombre_matieres': len(moyennes),
             'moyennes_par_matiere': MoyenneEleveSerializer(moyennes, many=True).data,
             'rang': rang,
             'total_eleves': total_eleves,
@@ -429,211 +511,164 @@ class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'error': 'Non autorisé'}, status=status.HTTP_403_FORBIDDEN)
         
         # Vérifier les permissions (prof titulaire OU prof qui enseigne dans la classe)
-        user = request.user
-        if user.is_professeur() and not user.is_admin():
-            prof = Professeur.objects.get(user=user)
-            enseigne_dans_classe = False
-            try:
-                from academic.models import MatiereClasse
-                enseigne_dans_classe = MatiereClasse.objects.filter(
-                    classe=classe, professeur=prof
-                ).exists()
-            except Exception:
-                enseigne_dans_classe = False
-            if (classe.professeur_principal != prof) and (not enseigne_dans_classe):
-                return Response(
-                    {'error': 'Non autorisé'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-        
-        # Récupérer tous les élèves de la classe
-        eleves = Eleve.objects.filter(classe=classe, statut='actif')
-        
-        # Calculer les moyennes pour chaque élève
-        resultats = []
-        for eleve in eleves:
-            # Compter les notes
-            notes_count = Note.objects.filter(
-                eleve=eleve,
-                periode=periode
-            ).count()
-            
-            # Calculer la moyenne générale
-            moyenne_gen = MoyenneEleve.calculer_moyenne_generale(eleve, periode)
-            
-            # Récupérer les moyennes par matière
-            moyennes = MoyenneEleve.objects.filter(eleve=eleve, periode=periode)
-            
-            resultats.append({
-                'eleve_id': eleve.id,
-                'matricule': eleve.matricule,
-                'nom': eleve.nom,
-                'prenom': eleve.prenom,
-                'nom_complet': eleve.nom_complet,
-                'notes_count': notes_count,
-                'moyenne_generale': moyenne_gen,
-                'nombre_matieres': moyennes.count(),
-                'has_notes': notes_count > 0
-            })
-        
-        # Calculer les rangs avec gestion des ex-aequo
-        # Trier par moyenne décroissante
-        resultats_tries = sorted(
-            resultats, 
-            key=lambda x: x['moyenne_generale'] if x['moyenne_generale'] is not None else -1,
-            reverse=True
-        )
+        if not contexte_acces(request).peut_voir_classe(classe.id):
+            return Response(
+                {'error': 'Non autorisé'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        # Attribuer les rangs de manière plus simple et correcte
-        rang_actuel = 0
-        moyenne_precedente = None
-        
-        for i, eleve in enumerate(resultats_tries):
-            if eleve['moyenne_generale'] is None:
-                eleve['rang'] = None
-            else:
-                # Si la moyenne est différente de la précédente, nouveau rang = position + 1
-                if i == 0 or eleve['moyenne_generale'] != moyenne_precedente:
-                    rang_actuel = i + 1  # Le rang = position dans le classement (1-indexed)
-                
-                eleve['rang'] = rang_actuel
-                moyenne_precedente = eleve['moyenne_generale']
+        # Moyennes générales et rangs matérialisés de toute la classe
+        resultats_tries = classement_materialise(classe, periode)
         
         return Response({
             'classe_id': classe.id,
             'classe_nom': classe.nom,
             'periode_id': periode.id,
             'periode_nom': periode.get_nom_display(),
-            'effectif_classe': eleves.count(),  # Nombre total d'élèves dans la classe
+            'effectif_classe': len(resultats_tries),  # Nombre total d'élèves dans la classe
             'eleves': resultats_tries  # Retourner la liste triée avec rangs
         })
     
     @action(detail=False, methods=['get'])
     def bulletins_classe(self, request):
         """Obtenir toutes les données nécessaires pour les bulletins d'une classe (optimisé)"""
-        classe_id = request.query_params.get('classe')
-        periode_id = request.query_params.get('periode')
+        classe, periode, erreur = self._classe_periode_autorisees(request)
+        if erreur:
+            return erreur
         
-        if not classe_id or not periode_id:
+        # Toutes les moyennes de l'année chargées en une requête, assemblées en mémoire
+        return Response(assembler_bulletins_classe(classe, periode))
+    
+    @action(detail=False, methods=['get'])
+    def bulletins_pdf(self, request):
+        """
+        Bulletins PDF d'une classe (rendu serveur)
+        - mode=classe (défaut) : un seul PDF, une page par élève (au plus pdf.PAGES_MAX)
+        - mode=eleves : archive zip d'un PDF par élève
+        - eleve=<id> : PDF du seul élève indiqué
+        Les PDF rendus sont conservés dans le cache disque (grades.cache_bulletins).
+        """
+        from django.http import FileResponse
+        from .cache_bulletins import bulletin_pdf_en_cache, bulletins_pdf
+        from .pdf import PAGES_MAX
+        
+        classe, periode, erreur = self._classe_periode_autorisees(request)
+        if erreur:
+            return erreur
+        
+        mode = request.query_params.get('mode', 'classe')
+        if mode not in ('classe', 'eleves'):
             return Response(
-                {'error': 'Paramètres classe et periode requis'},
+                {'error': "mode doit valoir 'classe' ou 'eleves'"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            from academic.models import Classe
-            classe = Classe.objects.get(id=classe_id)
-            periode = Periode.objects.get(id=periode_id)
-        except (Classe.DoesNotExist, Periode.DoesNotExist):
+        base = f"bulletins_{classe.nom}_{periode.nom}".replace(' ', '_')
+        eleve_id = request.query_params.get('eleve')
+        if eleve_id:
+            matricule = Eleve.objects.filter(id=eleve_id, classe=classe).values_list('matricule', flat=True).first()
+            if matricule is None:
+                return Response({'error': 'Élève introuvable dans cette classe'}, status=status.HTTP_404_NOT_FOUND)
+            mode = 'eleve'
+            base = f"bulletin_{matricule}_{periode.nom}"
+        
+        # Période clôturée : les notes ne changent plus, le PDF en cache est servi tel quel
+        fichier = bulletin_pdf_en_cache(classe, periode, mode, eleve_id)
+        if fichier is None:
+            donnees = assembler_bulletins_classe(classe, periode)
+            if eleve_id:
+                donnees['bulletins'] = [b for b in donnees['bulletins'] if str(b['eleve']['id']) == eleve_id]
+            if not donnees['bulletins']:
+                return Response(
+                    {'error': 'Aucun bulletin à imprimer (aucune note pour cette période)'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if mode == 'classe' and len(donnees['bulletins']) > PAGES_MAX:
+                return Response(
+                    {'error': f"Plus de {PAGES_MAX} bulletins : utilisez mode=eleves (un PDF par élève)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            fichier = bulletins_pdf(classe, periode, donnees, mode)
+        
+        # Fichier envoyé par morceaux (fermé en fin de réponse)
+        if mode == 'eleves':
+            return FileResponse(fichier, as_attachment=True, filename=f'{base}.zip', content_type='application/zip')
+        return FileResponse(fichier, as_attachment=True, filename=f'{base}.pdf', content_type='application/pdf')
+    
+    @action(detail=False, methods=['get'])
+    def export_notes(self, request):
+        """
+        Feuille de notes d'une période : notes par matière et type d'évaluation,
+        moyennes par matière, moyenne générale et rang
+        - classe=<id> : une classe (obligatoire pour un enseignant)
+        - sans classe : toute l'école (Admin uniquement)
+        - type=csv (défaut, envoyé ligne à ligne) ou type=xlsx
+        """
+        from django.http import FileResponse, StreamingHttpResponse
+        from .exports import classeur_xlsx, colonnes_referentiel, entete, flux_csv, lignes_feuille
+        
+        type_fichier = request.query_params.get('type', 'csv')
+        if type_fichier not in ('csv', 'xlsx'):
             return Response(
-                {'error': 'Classe ou période introuvable'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': "type doit valoir 'csv' ou 'xlsx'"},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier cloisonnement par école
-        if not getattr(request.user, 'ecole', None) or (
-            getattr(classe, 'ecole', None) != request.user.ecole or
-            getattr(periode.annee_scolaire, 'ecole', None) != request.user.ecole
-        ):
-            return Response({'error': 'Non autorisé'}, status=status.HTTP_403_FORBIDDEN)
-        
-        # Vérifier les permissions
         user = request.user
-        if user.is_professeur() and not user.is_admin():
-            prof = Professeur.objects.get(user=user)
-            if classe.professeur_principal != prof:
+        if request.query_params.get('classe') or not user.is_admin():
+            classe, periode, erreur = self._classe_periode_autorisees(request)
+            if erreur:
+                return erreur
+            classes = [classe]
+            base = f"notes_{classe.nom}_{periode.nom}"
+        else:
+            try:
+                periode = Periode.objects.get(
+                    id=request.query_params.get('periode'), annee_scolaire__ecole=user.ecole
+                )
+            except (Periode.DoesNotExist, ValueError):
                 return Response(
-                    {'error': 'Non autorisé'},
-                    status=status.HTTP_403_FORBIDDEN
+                    {'error': 'Paramètre periode requis (période de votre école)'},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
+            classes = Classe.objects.filter(
+                ecole=user.ecole, annee_scolaire_id=periode.annee_scolaire_id
+            )
+            base = f"notes_{user.ecole.code}_{periode.nom}"
+        base = base.replace(' ', '_')
+        
+        matieres, types = colonnes_referentiel(user.ecole)
+        colonnes = entete(matieres, types)
+        lignes = lignes_feuille(periode, classes, matieres, types)
+        
+        if type_fichier == 'xlsx':
+            return FileResponse(
+                classeur_xlsx(colonnes, lignes, periode.get_nom_display()),
+                as_attachment=True,
+                filename=f'{base}.xlsx',
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            )
         
-        # Récupérer tous les élèves avec notes
-        eleves = Eleve.objects.filter(classe=classe, statut='actif')
-        
-        bulletins_data = []
-        for eleve in eleves:
-            notes_count = Note.objects.filter(eleve=eleve, periode=periode).count()
-            if notes_count == 0:
-                continue
-            
-            # Calculer la moyenne générale
-            moyenne_gen = MoyenneEleve.calculer_moyenne_generale(eleve, periode)
-            if moyenne_gen is None:
-                continue
-            
-            # Récupérer les moyennes par matière
-            moyennes = MoyenneEleve.objects.filter(
-                eleve=eleve,
-                periode=periode
-            ).select_related('matiere')
-            
-            bulletins_data.append({
-                'eleve': {
-                    'id': eleve.id,
-                    'matricule': eleve.matricule,
-                    'nom': eleve.nom,
-                    'prenom': eleve.prenom,
-                    'sexe': eleve.sexe,
-                    'classe_nom': classe.nom
-                },
-                'moyenne_generale': moyenne_gen,
-                'moyennes_par_matiere': MoyenneEleveSerializer(moyennes, many=True).data
-            })
-        
-        # Calculer les rangs
-        bulletins_data.sort(key=lambda x: x['moyenne_generale'], reverse=True)
-        rang_actuel = 0
-        moyenne_precedente = None
-        
-        for i, bulletin in enumerate(bulletins_data):
-            if i == 0 or bulletin['moyenne_generale'] != moyenne_precedente:
-                rang_actuel = i + 1
-            bulletin['rang'] = rang_actuel
-            moyenne_precedente = bulletin['moyenne_generale']
-        
-        # Détecter les ex-aequo
-        rangs_count = {}
-        for bulletin in bulletins_data:
-            rang = bulletin['rang']
-            rangs_count[rang] = rangs_count.get(rang, 0) + 1
-        
-        for bulletin in bulletins_data:
-            bulletin['isExaequo'] = rangs_count[bulletin['rang']] > 1
-            bulletin['effectif_classe'] = len(bulletins_data)
-            
-            # Si c'est le 3ème trimestre, calculer la moyenne annuelle
-            if periode.nom == 'trimestre3':
-                eleve_id = bulletin['eleve']['id']
-                eleve_obj = Eleve.objects.get(id=eleve_id)
-                
-                # Récupérer toutes les périodes de l'année scolaire
-                periodes_annee = Periode.objects.filter(
-                    annee_scolaire=periode.annee_scolaire
-                ).order_by('nom')
-                
-                moyennes_trimestres = []
-                for p in periodes_annee:
-                    moy = MoyenneEleve.calculer_moyenne_generale(eleve_obj, p)
-                    if moy is not None:
-                        moyennes_trimestres.append(moy)
-                
-                if moyennes_trimestres:
-                    bulletin['moyenne_annuelle'] = sum(moyennes_trimestres) / len(moyennes_trimestres)
-                    bulletin['nombre_trimestres'] = len(moyennes_trimestres)
-                else:
-                    bulletin['moyenne_annuelle'] = None
-                    bulletin['nombre_trimestres'] = 0
-            else:
-                bulletin['moyenne_annuelle'] = None
-                bulletin['nombre_trimestres'] = 0
+        response = StreamingHttpResponse(flux_csv(colonnes, lignes), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{base}.csv"'
+        return response
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def statistiques_recalcul(self, request):
+        """Compteurs du recalcul différé des moyennes (processus courant)"""
+        from .models import RecalculEnAttente
+        from .recalcul import statistiques
         
         return Response({
-            'classe_nom': classe.nom,
-            'periode_nom': periode.get_nom_display(),
-            'periode_code': periode.nom,  # Pour détecter le trimestre
-            'bulletins': bulletins_data
+            **statistiques(),
+            'en_attente': RecalculEnAttente.objects.count(),
         })
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def statistiques_cache(self, request):
+        """Compteurs du cache du référentiel (processus courant)"""
+        return Response(referentiel.statistiques())
+    
     @action(detail=False, methods=['post'])
     def recalculer(self, request):
         """Recalculer toutes les moyennes (Admin uniquement)"""
@@ -662,17 +697,60 @@ class MoyenneViewSet(viewsets.ReadOnlyModelViewSet):
         if not getattr(request.user, 'ecole', None) or getattr(periode.annee_scolaire, 'ecole', None) != request.user.ecole:
             return Response({'error': 'Non autorisé'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Recalculer toutes les moyennes pour cette période
-        notes = Note.objects.filter(periode=periode).values('eleve', 'matiere').distinct()
-        
-        count = 0
-        for note_info in notes:
-            eleve = Eleve.objects.get(id=note_info['eleve'])
-            matiere = Matiere.objects.get(id=note_info['matiere'])
-            MoyenneEleve.calculer_moyenne(eleve, matiere, periode)
-            count += 1
+        # Recalcul confié au worker (commande traiter_taches) : une seule tâche active par période
+        from .taches import soumettre
+        tache, creee = soumettre(
+            'recalcul_moyennes',
+            {'periode_id': periode.id},
+            cle=f'recalcul_moyennes:{periode.id}',
+            ecole=request.user.ecole,
+            utilisateur=request.user,
+        )
         
         return Response({
             'success': True,
-            'message': f'{count} moyennes recalculées pour {periode.get_nom_display()}'
-        })
+            'message': (
+                f'Recalcul des moyennes de {periode.get_nom_display()} programmé'
+                if creee else
+                f'Un recalcul de {periode.get_nom_display()} est déjà en cours'
+            ),
+            'tache': TacheSerializer(tache).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class TacheViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Suivi des tâches de fond (avancement, débit, erreurs)
+    - Admin : toutes les tâches de son école
+    - Enseignant : uniquement les tâches qu'il a soumises
+    """
+    serializer_class = TacheSerializer
+    permission_classes = [IsTeacherOrAdmin]
+    
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Tache.objects.filter(ecole=user.ecole)
+        if not user.is_admin():
+            queryset = queryset.filter(cree_par=user)
+        return queryset
+    
+    @action(detail=True, methods=['post'])
+    def relancer(self, request, pk=None):
+        """Relancer une tâche échouée (un import reprend après la dernière ligne enregistrée)"""
+        from django.db import IntegrityError
+        from .taches import relancer
+        
+        tache = self.get_object()
+        if tache.statut != 'echouee':
+            return Response(
+                {'error': 'Seule une tâche échouée peut être relancée'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            relancer(tache)
+        except IntegrityError:
+            return Response(
+                {'error': 'Une tâche identique est déjà en cours'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(TacheSerializer(tache).data, status=status.HTTP_202_ACCEPTED)
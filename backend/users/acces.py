@@ -0,0 +1,62 @@
+"""
+Contexte d'accès d'une requête : profil professeur, classes dont il est
+titulaire (professeur principal) et couples (classe, matière) qu'il enseigne.
+
+Calculé une fois par requête (contexte_acces) puis consulté en mémoire par
+les contrôles des vues, au lieu de relire Professeur et MatiereClasse à
+chaque vérification. Pour un utilisateur authentifié par JWT, ces données
+viennent du cache des principaux (users.cache_principaux) : aucune requête.
+"""
+
+
+class ContexteAcces:
+    def __init__(self, user):
+        self.user = user
+        self.est_admin = bool(getattr(user, 'is_authenticated', False) and user.is_admin())
+        self.est_professeur = bool(
+            getattr(user, 'is_authenticated', False) and user.is_professeur() and not self.est_admin
+        )
+        self.professeur = None
+        self.classes_titulaires = frozenset()
+        self.enseignements = frozenset()
+        if self.est_professeur:
+            self.professeur, self.classes_titulaires, self.enseignements = droits_professeur(user)
+        self.classes_enseignees = frozenset(classe_id for classe_id, _ in self.enseignements)
+
+    def est_titulaire(self, classe_id):
+        """Professeur principal de la classe (les admins n'en sont jamais titulaires)"""
+        return classe_id in self.classes_titulaires
+
+    def peut_voir_classe(self, classe_id):
+        """Admin, ou professeur titulaire de la classe ou y enseignant une matière"""
+        return self.est_admin or classe_id in self.classes_titulaires or classe_id in self.classes_enseignees
+
+
+def droits_professeur(user):
+    """
+    (professeur ou None, classes titulaires, couples (classe, matière) enseignés),
+    depuis les attributs du principal en cache ou, à défaut, en deux requêtes
+    """
+    from academic.models import Classe, MatiereClasse
+    from .models import Professeur
+
+    if hasattr(user, 'classes_titulaires') and hasattr(user, 'enseignements'):
+        return getattr(user, 'professeur_profile', None), user.classes_titulaires, user.enseignements
+    try:
+        professeur = user.professeur_profile
+    except Professeur.DoesNotExist:
+        return None, frozenset(), frozenset()
+    return professeur, frozenset(
+        Classe.objects.filter(professeur_principal=professeur).values_list('id', flat=True)
+    ), frozenset(
+        MatiereClasse.objects.filter(professeur=professeur).values_list('classe_id', 'matiere_id')
+    )
+
+
+def contexte_acces(request):
+    """Contexte d'accès de la requête, calculé au premier appel"""
+    contexte = getattr(request, '_contexte_acces', None)
+    if contexte is None or contexte.user is not request.user:
+        contexte = ContexteAcces(request.user)
+        request._contexte_acces = contexte
+    return contexte
@@ -2,28 +2,35 @@
 Custom JWT Authentication avec chargement automatique de l'école
 """
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from django.conf import settings
 
+from . import cache_principaux
+
 
 class CustomJWTAuthentication(JWTAuthentication):
     """
     JWT Authentication personnalisé qui charge automatiquement
-    la relation 'ecole' de l'utilisateur
+    la relation 'ecole' et le profil professeur de l'utilisateur
     """
     
     def get_user(self, validated_token):
         """
-        Surcharge pour charger l'utilisateur avec select_related('ecole')
+        Utilisateur avec son école et son profil professeur, depuis le cache
+        des principaux (users.cache_principaux) : aucune requête tant qu'il est à jour
         """
         try:
             user_id = validated_token[settings.SIMPLE_JWT['USER_ID_CLAIM']]
         except KeyError:
             return None
         
-        # Charger l'utilisateur avec l'école en une seule requête
         User = self.user_model
         try:
-            user = User.objects.select_related('ecole').get(pk=user_id)
-            return user
+            user = cache_principaux.principal(User, user_id)
         except User.DoesNotExist:
             return None
+        
+        # Comme JWTAuthentication : un compte désactivé n'est plus authentifié
+        if not user.is_active:
+            raise AuthenticationFailed('Compte désactivé', code='user_inactive')
+        return user
@@ -0,0 +1,131 @@
+"""
+Cache des utilisateurs authentifiés (principaux) par processus.
+
+CustomJWTAuthentication rechargeait l'utilisateur et son école à chaque
+appel, puis les vues relisaient le profil professeur. Le principal chargé
+une fois (utilisateur, école, profil professeur, classes dont il est
+professeur principal, matières enseignées par classe) est conservé quelques secondes (PRINCIPAUX_CACHE_TTL)
+dans un dictionnaire LRU borné (PRINCIPAUX_CACHE_TAILLE).
+
+Une entrée n'est valable que pour la version courante de l'utilisateur et
+celle de son école, tenues dans le cache Django (partagé entre processus
+avec CACHE_BACKEND=fichier ou redis) et incrémentées par les signaux :
+utilisateur ou profil modifié, école modifiée, classe ou affectation
+(MatiereClasse) créée, modifiée ou supprimée. Chaque requête reçoit une copie de
+l'utilisateur, de son école et de son profil professeur : les modifications
+faites par une vue ne fuient pas.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+_verrou = threading.Lock()
+_entrees = OrderedDict()  # user_id -> (versions, expire_le, user)
+
+
+def _cache():
+    return caches[settings.PRINCIPAUX_CACHE]
+
+
+def _cle_version(portee, identifiant):
+    return f'principaux:version:{portee}:{identifiant}'
+
+
+def _versions(user_id, ecole_id):
+    cache = _cache()
+    cles = [_cle_version('user', user_id), _cle_version('ecole', ecole_id)]
+    versions = cache.get_many(cles)
+    for cle in cles:
+        if cle not in versions:
+            cache.add(cle, time.time_ns(), timeout=None)
+            versions[cle] = cache.get(cle)
+    return versions[cles[0]], versions[cles[1]]
+
+
+def _incrementer_version(portee, identifiant):
+    cache = _cache()
+    cle = _cle_version(portee, identifiant)
+    cache.set(cle, max(time.time_ns(), (cache.get(cle) or 0) + 1), timeout=None)
+
+
+def invalider(user_id=None, ecole_id=None):
+    """Périme le principal d'un utilisateur et/ou ceux de tous les utilisateurs d'une école (immédiatement et au commit)"""
+    portees = [(portee, identifiant) for portee, identifiant in (('user', user_id), ('ecole', ecole_id))
+               if identifiant is not None]
+    for portee, identifiant in portees:
+        _incrementer_version(portee, identifiant)
+    transaction.on_commit(lambda: [_incrementer_version(*portee) for portee in portees])
+
+
+def vider():
+    with _verrou:
+        _entrees.clear()
+
+
+def _charger(user_model, user_id):
+    """
+    Utilisateur, école et profil professeur en une requête ; pour un
+    professeur, classes titulaires et enseignements (users.acces) en deux autres
+    """
+    from .acces import droits_professeur
+
+    user = user_model.objects.select_related('ecole', 'professeur_profile').get(pk=user_id)
+    if user.is_professeur():
+        _, user.classes_titulaires, user.enseignements = droits_professeur(user)
+    else:
+        user.classes_titulaires = user.enseignements = frozenset()
+    return user
+
+
+def _copie(user):
+    """
+    Copie de l'utilisateur en cache et de ses instances liées (école, profil
+    professeur) : une vue qui les modifie n'altère ni l'entrée ni les autres requêtes
+    """
+    copie = copy.copy(user)  # Relations en cache : dictionnaire copié, instances partagées
+    relations = copie._state.fields_cache
+    if relations.get('ecole') is not None:
+        relations['ecole'] = copy.copy(relations['ecole'])
+    if relations.get('professeur_profile') is not None:
+        professeur = relations['professeur_profile'] = copy.copy(relations['professeur_profile'])
+        professeur._state.fields_cache['user'] = copie
+    return copie
+
+
+def principal(user_model, user_id):
+    """
+    Copie de l'utilisateur user_id (école et profil professeur chargés,
+    attributs classes_titulaires et enseignements), depuis le cache si ses versions sont à jour.
+    Lève user_model.DoesNotExist.
+    """
+    maintenant = time.monotonic()
+    with _verrou:
+        entree = _entrees.get(user_id)
+    ecole_id = None
+    if entree is not None:
+        versions, expire_le, user = entree
+        ecole_id = user.ecole_id
+        actuelles = _versions(user_id, ecole_id)
+        if expire_le > maintenant and versions == actuelles:
+            with _verrou:
+                if user_id in _entrees:
+                    _entrees.move_to_end(user_id)
+            return _copie(user)
+
+    # Versions lues avant le chargement : une invalidation concurrente force un
+    # rechargement au prochain appel (changement d'école : relues après, fenêtre bornée par le TTL)
+    versions = _versions(user_id, ecole_id)
+    user = _charger(user_model, user_id)
+    if user.ecole_id != ecole_id:
+        versions = (versions[0], _versions(user_id, user.ecole_id)[1])
+    with _verrou:
+        _entrees[user_id] = (versions, maintenant + settings.PRINCIPAUX_CACHE_TTL, user)
+        _entrees.move_to_end(user_id)
+        while len(_entrees) > settings.PRINCIPAUX_CACHE_TAILLE:
+            _entrees.popitem(last=False)
+    return _copie(user)
@@ -66,3 +66,44 @@ class Professeur(models.Model):
     
     def __str__(self):
         return f"Prof. {self.user.get_full_name()} - {self.matricule}"
+
+
+# Cache des utilisateurs authentifiés (users.cache_principaux)
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalider_principal_user(sender, instance, **kwargs):
+    from .cache_principaux import invalider
+    invalider(user_id=instance.pk)
+
+
+@receiver(post_save, sender=Professeur)
+@receiver(post_delete, sender=Professeur)
+def invalider_principal_professeur(sender, instance, **kwargs):
+    from .cache_principaux import invalider
+    invalider(user_id=instance.user_id)
+
+
+@receiver(post_save, sender='academic.Ecole')
+@receiver(post_save, sender='academic.Classe')
+@receiver(post_delete, sender='academic.Classe')
+@receiver(post_save, sender='academic.MatiereClasse')
+@receiver(post_delete, sender='academic.MatiereClasse')
+def invalider_principaux_ecole(sender, instance, **kwargs):
+    """École modifiée, ou classes titulaires et enseignements de ses professeurs"""
+    from .cache_principaux import invalider
+    invalider(ecole_id=instance.pk if sender._meta.model_name == 'ecole' else instance.ecole_id)
+
+
+# Cache des réponses de lecture de l'API (core.cache_vues)
+@receiver(post_save, sender=Professeur)
+@receiver(post_save, sender=User)
+def invalider_vues_professeur(sender, instance, **kwargs):
+    """Identité du professeur principal imbriquée dans les classes"""
+    from core import cache_vues
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        return
+    cache_vues.invalider(instance.ecole_id, cache_vues.CLASSES)
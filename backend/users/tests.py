@@ -80,3 +80,118 @@ class AuthTests(APITestCase):
         # try to patch password via users/<id>/ should be blocked
         resp = self.client.patch(reverse('user-detail', args=[user_id]), {"password": "BlockMe123!"}, format='json')
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CachePrincipauxTests(APITestCase):
+    def setUp(self):
+        from datetime import date
+        from academic.models import Ecole, AnneeScolaire
+        from .models import Professeur
+
+        self.ecole = Ecole.objects.create(
+            nom='École Test', code='TEST', directrice='Mme Test',
+            adresse='Dakar', telephone='770000000', email='ecole@test.sn'
+        )
+        self.annee = AnneeScolaire.objects.create(
+            libelle='2024-2025', date_debut=date(2024, 10, 1), date_fin=date(2025, 7, 31), ecole=self.ecole
+        )
+        self.user = User.objects.create_user(
+            username='prof', password='StrongPass123!', role='professeur', ecole=self.ecole
+        )
+        self.prof = Professeur.objects.create(user=self.user, matricule='PR001', ecole=self.ecole)
+
+    def test_principal_en_cache_et_invalidation(self):
+        from academic.models import Classe
+        from .cache_principaux import principal
+
+        with self.assertNumQueries(3):  # utilisateur + école + profil, classes titulaires, enseignements
+            user = principal(User, self.user.pk)
+        self.assertEqual((user.ecole.code, user.classes_titulaires), ('TEST', frozenset()))
+        with self.assertNumQueries(0):
+            copie = principal(User, self.user.pk)
+            self.assertEqual(copie.professeur_profile.pk, self.prof.pk)
+        self.assertIsNot(copie, user)
+
+        classe = Classe.objects.create(
+            niveau='cm2', section='A', annee_scolaire=self.annee, professeur_principal=self.prof, ecole=self.ecole
+        )
+        self.assertEqual(principal(User, self.user.pk).classes_titulaires, {classe.id})
+
+        self.user.role = 'admin'
+        self.user.save()
+        self.assertTrue(principal(User, self.user.pk).is_admin())
+
+    def test_taille_bornee(self):
+        from django.test import override_settings
+        from . import cache_principaux
+
+        autre = User.objects.create_user(username='autre', password='StrongPass123!', ecole=self.ecole)
+        cache_principaux.vider()
+        with override_settings(PRINCIPAUX_CACHE_TAILLE=1):
+            cache_principaux.principal(User, self.user.pk)
+            cache_principaux.principal(User, autre.pk)
+            self.assertEqual(list(cache_principaux._entrees), [autre.pk])
+
+    def test_authentification_sans_requete(self):
+        login = self.client.post(reverse('login'), {"username": "prof", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        self.client.get(reverse('periode-list'))
+        with self.assertNumQueries(0):
+            r = self.client.get(reverse('periode-list'))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        # Utilisateur désactivé : refusé sans attendre l'expiration du cache
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('periode-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profil_complet_depuis_le_contexte_d_acces(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from academic.models import Classe
+
+        Classe.objects.create(
+            niveau='cm2', section='A', annee_scolaire=self.annee, professeur_principal=self.prof, ecole=self.ecole
+        )
+        login = self.client.post(reverse('login'), {"username": "prof", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        self.client.get(reverse('periode-list'))  # utilisateur du jeton mis en cache
+
+        with CaptureQueriesContext(connection) as requetes:
+            r = self.client.get(reverse('professeur-profil-complet'))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.data['professeur']['matricule'], 'PR001')
+        self.assertEqual(r.data['statistiques']['nombre_classes_principales'], 1)
+        # Profil et utilisateur déjà chargés : pas de relecture de users_professeur
+        self.assertFalse([q for q in requetes.captured_queries if 'FROM "users_professeur"' in q['sql']])
+
+    def test_liste_utilisateurs_sans_requete_par_ligne(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.user.role = 'admin'
+        self.user.save()
+        for i in range(5):
+            User.objects.create_user(username=f'user{i}', password='StrongPass123!', ecole=self.ecole)
+        login = self.client.post(reverse('login'), {"username": "prof", "password": "StrongPass123!"}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        self.client.get(reverse('periode-list'))  # utilisateur du jeton mis en cache
+
+        with CaptureQueriesContext(connection) as requetes:
+            r = self.client.get(reverse('user-list'))
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual({u['ecole_code'] for u in r.data['results']}, {'TEST'})
+        # École jointe à la liste : pas de relecture de academic_ecole par utilisateur
+        self.assertFalse([q for q in requetes.captured_queries if q['sql'].startswith('SELECT "academic_ecole"')])
+
+    def test_copies_independantes(self):
+        from .cache_principaux import principal
+
+        copie = principal(User, self.user.pk)
+        copie.ecole.nom = 'Modifiée'
+        copie.professeur_profile.matricule = 'MODIF'
+        self.assertIs(copie.professeur_profile.user, copie)
+
+        with self.assertNumQueries(0):
+            autre = principal(User, self.user.pk)
+            self.assertEqual((autre.ecole.nom, autre.professeur_profile.matricule), ('École Test', 'PR001'))
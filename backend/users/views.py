@@ -5,6 +5,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from .models import User, Admin, Professeur
+from .acces import contexte_acces
 from django.contrib.auth.password_validation import validate_password
 from .serializers import (
     UserSerializer, AdminSerializer, ProfesseurSerializer,
@@ -119,9 +120,11 @@ class UserViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
+        # École jointe : ecole_nom et ecole_code sans requête par utilisateur
+        queryset = User.objects.select_related('ecole')
         if user.is_admin():
-            return User.objects.all()
-        return User.objects.filter(id=user.id)
+            return queryset
+        return queryset.filter(id=user.id)
     
     def update(self, request, *args, **kwargs):
         if 'password' in request.data:
@@ -161,16 +164,20 @@ class ProfesseurViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
+        # Utilisateur et école imbriqués (ProfesseurSerializer) : joints en une requête
+        queryset = Professeur.objects.select_related('user__ecole')
         if user.is_admin():
-            return Professeur.objects.all()
-        return Professeur.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
     
     @action(detail=False, methods=['get'])
     def profil_complet(self, request):
         """Obtenir le profil complet du professeur avec ses classes et matières"""
-        try:
-            professeur = Professeur.objects.get(user=request.user)
-        except Professeur.DoesNotExist:
+        # Profil chargé avec l'utilisateur authentifié (users.acces) ; relu pour un autre rôle
+        professeur = contexte_acces(request).professeur
+        if professeur is None:
+            professeur = Professeur.objects.filter(user=request.user).first()
+        if professeur is None:
             return Response(
                 {'error': 'Profil professeur introuvable'},
                 status=status.HTTP_404_NOT_FOUND
@@ -180,28 +187,33 @@ class ProfesseurViewSet(viewsets.ModelViewSet):
         from academic.models import Classe, MatiereClasse
         from academic.serializers import ClasseSerializer, MatiereClasseSerializer
         
-        # Classes où le professeur est principal
-        classes_principales = Classe.objects.filter(professeur_principal=professeur)
+        # Classes où le professeur est principal (relations chargées en bloc)
+        classes_principales = ClasseSerializer(
+            ClasseSerializer.precharger(Classe.objects.filter(professeur_principal=professeur)), many=True
+        ).data
         
         # Matières enseignées par le professeur
         matieres_enseignees = MatiereClasse.objects.filter(
             professeur=professeur
-        ).select_related('classe', 'matiere')
+        ).select_related('classe', 'matiere', 'professeur__user__ecole')
         
         # Toutes les classes où le professeur enseigne
         classes_ids = matieres_enseignees.values_list('classe', flat=True).distinct()
-        toutes_classes = Classe.objects.filter(id__in=classes_ids)
+        toutes_classes = ClasseSerializer(
+            ClasseSerializer.precharger(Classe.objects.filter(id__in=classes_ids)), many=True
+        ).data
+        matieres_enseignees = MatiereClasseSerializer(matieres_enseignees, many=True).data
         
         data = {
             'professeur': ProfesseurSerializer(professeur).data,
             'user': UserSerializer(request.user).data,
-            'classes_principales': ClasseSerializer(classes_principales, many=True).data,
-            'matieres_enseignees': MatiereClasseSerializer(matieres_enseignees, many=True).data,
-            'toutes_classes': ClasseSerializer(toutes_classes, many=True).data,
+            'classes_principales': classes_principales,
+            'matieres_enseignees': matieres_enseignees,
+            'toutes_classes': toutes_classes,
             'statistiques': {
-                'nombre_classes_principales': classes_principales.count(),
-                'nombre_classes_enseignees': toutes_classes.count(),
-                'nombre_matieres': matieres_enseignees.count()
+                'nombre_classes_principales': len(classes_principales),
+                'nombre_classes_enseignees': len(toutes_classes),
+                'nombre_matieres': len(matieres_enseignees)
             }
         }
         
@@ -42,27 +42,9 @@ EL00003,Anglais,Composition,9,2024-10-17,Excellent`;
     window.URL.revokeObjectURL(url);
   };
 
-  const parseCSV = (text) => {
-    const lines = text.split('\n').filter(line => line.trim());
-    const headers = lines[0].split(',').map(h => h.trim());
-    
-    const data = [];
-    for (let i = 1; i < lines.length; i++) {
-      const values = lines[i].split(',').map(v => v.trim());
-      if (values.length === headers.length) {
-        const row = {};
-        headers.forEach((header, index) => {
-          row[header] = values[index];
-        });
-        data.push(row);
-      }
-    }
-    return data;
-  };
-
   const handleImport = async () => {
-    if (!file || !selectedPeriode || !selectedClasse) {
-      toast.error('Veuillez sélectionner une période, une classe et un fichier CSV');
+    if (!file || !selectedPeriode) {
+      toast.error('Veuillez sélectionner une période et un fichier CSV');
       return;
     }
 
@@ -70,113 +52,17 @@ EL00003,Anglais,Composition,9,2024-10-17,Excellent`;
     setResult(null);
 
     try {
-      const text = await file.text();
-      const parsedData = parseCSV(text);
-
-      if (parsedData.length === 0) {
-        toast.info('Le fichier CSV est vide');
-        setImporting(false);
-        return;
-      }
-
-      // Grouper les notes par matière et type d'évaluation
-      const groupedNotes = {};
-
-      for (const row of parsedData) {
-        // Trouver la matière
-        const matiere = matieres.find(m => 
-          m.nom.toLowerCase() === row.matiere.toLowerCase() ||
-          m.code.toLowerCase() === row.matiere.toLowerCase()
-        );
-
-        if (!matiere) {
-          console.warn(`Matière non trouvée: ${row.matiere}`);
-          continue;
-        }
-
-        // Trouver le type d'évaluation
-        const typeEval = typesEval.find(t => 
-          t.nom.toLowerCase() === row.type_evaluation.toLowerCase() ||
-          t.nom_display?.toLowerCase() === row.type_evaluation.toLowerCase()
-        );
-
-        if (!typeEval) {
-          console.warn(`Type d'évaluation non trouvé: ${row.type_evaluation}`);
-          continue;
-        }
-
-        const key = `${matiere.id}_${typeEval.id}_${row.date_evaluation}`;
-        
-        if (!groupedNotes[key]) {
-          groupedNotes[key] = {
-            matiere_id: matiere.id,
-            periode_id: selectedPeriode,
-            type_evaluation_id: typeEval.id,
-            date_evaluation: row.date_evaluation,
-            notes: []
-          };
-        }
-
-        groupedNotes[key].notes.push({
-          matricule: row.matricule,
-          valeur: parseFloat(row.note),
-          commentaire: row.commentaire || ''
-        });
-      }
-
-      // Convertir les matricules en IDs d'élèves
-      const { eleveService } = await import('../services/api');
-      const elevesData = await eleveService.getAll({ classe: selectedClasse });
-      const elevesMap = {};
-      (elevesData.results || elevesData).forEach(eleve => {
-        elevesMap[eleve.matricule] = eleve.id;
-      });
-
-      // Importer chaque groupe de notes
-      let totalImported = 0;
-      const errors = [];
-
-      for (const key in groupedNotes) {
-        const group = groupedNotes[key];
-        
-        // Convertir matricules en IDs
-        const notesWithIds = group.notes
-          .map(note => {
-            const eleveId = elevesMap[note.matricule];
-            if (!eleveId) {
-              errors.push(`Matricule non trouvé: ${note.matricule}`);
-              return null;
-            }
-            return {
-              eleve_id: eleveId,
-              valeur: note.valeur,
-              commentaire: note.commentaire
-            };
-          })
-          .filter(n => n !== null);
-
-        if (notesWithIds.length > 0) {
-          try {
-            await noteService.saisieRapide({
-              matiere_id: group.matiere_id,
-              periode_id: group.periode_id,
-              type_evaluation_id: group.type_evaluation_id,
-              date_evaluation: group.date_evaluation,
-              notes: notesWithIds
-            });
-            totalImported += notesWithIds.length;
-          } catch (error) {
-            console.error('Erreur import:', error);
-            errors.push(`Erreur lors de l'import d'un groupe de notes`);
-          }
-        }
-      }
+      // Lecture, correspondances et enregistrement des notes faits côté serveur
+      const formData = new FormData();
+      formData.append('file', file);
+      formData.append('periode_id', selectedPeriode);
+      const data = await noteService.importNotes(formData);
 
       setResult({
         success: true,
-        total: parsedData.length,
-        imported: totalImported,
-        errors
+        total: data.lignes,
+        imported: data.imported,
+        errors: data.errors
       });
 
       if (onImportSuccess) {
@@ -186,7 +72,7 @@ EL00003,Anglais,Composition,9,2024-10-17,Excellent`;
       console.error('Erreur:', error);
       setResult({
         success: false,
-        message: 'Erreur lors de l\'import du fichier'
+        message: error.response?.data?.error || 'Erreur lors de l\'import du fichier'
       });
     } finally {
       setImporting(false);
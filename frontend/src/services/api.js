@@ -372,10 +372,27 @@ export const noteService = {
     return response.data;
   },
 
+  // Grille en colonnes : valeurs[(e * M + m) * T + t], dimensions = [E, M, T]
+  getGrille: async (classeId, periodeId, params = {}) => {
+    const response = await api.get('/grades/notes/grille/', {
+      params: { classe: classeId, periode: periodeId, ...params }
+    });
+    return response.data;
+  },
+
   saisieRapide: async (data) => {
     const response = await api.post('/grades/notes/saisie_rapide/', data);
     return response.data;
   },
+
+  importNotes: async (formData) => {
+    const response = await api.post('/grades/notes/import_notes/', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+    return response.data;
+  },
 };
 
 export const moyenneService = {
@@ -403,6 +420,24 @@ export const moyenneService = {
     return response.data;
   },
 
+  // PDF généré côté serveur : mode 'classe' (un PDF) ou 'eleves' (zip), ou un seul élève
+  getBulletinsPdf: async (classeId, periodeId, { mode = 'classe', eleveId } = {}) => {
+    const response = await api.get('/grades/moyennes/bulletins_pdf/', {
+      params: { classe: classeId, periode: periodeId, mode, eleve: eleveId },
+      responseType: 'blob',
+    });
+    return response.data;
+  },
+
+  // Feuille de notes (CSV ou Excel) d'une classe, ou de toute l'école sans classe (admin)
+  exportNotes: async (periodeId, { classeId, type = 'csv' } = {}) => {
+    const response = await api.get('/grades/moyennes/export_notes/', {
+      params: { periode: periodeId, classe: classeId, type },
+      responseType: 'blob',
+    });
+    return response.data;
+  },
+
   recalculer: async (periodeId) => {
     const response = await api.post('/grades/moyennes/recalculer/', {
       periode_id: periodeId
@@ -411,4 +446,17 @@ export const moyenneService = {
   },
 };
 
+// Tâches de fond (recalculs, imports asynchrones) : avancement, débit, erreurs
+export const tacheService = {
+  getById: async (id) => {
+    const response = await api.get(`/grades/taches/${id}/`);
+    return response.data;
+  },
+
+  relancer: async (id) => {
+    const response = await api.post(`/grades/taches/${id}/relancer/`);
+    return response.data;
+  },
+};
+
 export default api;